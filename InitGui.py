@@ -196,11 +196,18 @@ class A2plusWorkbench(Workbench):
         import a2p_observers
 
         FreeCAD.addDocumentObserver(a2p_observers.redoUndoObserver)
+        import a2p_solversession
+
+        FreeCAD.addDocumentObserver(a2p_solversession.solverSessionObserver)
 
     def Deactivated(self):
         import a2p_observers
 
         FreeCAD.removeDocumentObserver(a2p_observers.redoUndoObserver)
+        import a2p_solversession
+
+        FreeCAD.removeDocumentObserver(a2p_solversession.solverSessionObserver)
+        a2p_solversession.clearSessions()
 
     def ContextMenu(self, recipient):
         import FreeCAD, FreeCADGui
@@ -31,6 +31,7 @@ from FreeCAD import Base
 import time
 from a2p_translateUtils import *
 import a2plib
+import a2p_muxinfo
 from PySide import QtGui
 
 from a2p_importedPart_class import Proxy_muxAssemblyObj  # for compat
@@ -106,17 +107,10 @@ def muxAssemblyWithTopoNames(doc, desiredShapeLabel=None):
         ):  # Subelement-Strings existieren schon...
             extendNames = True
             #
-            vertexNames = []
-            edgeNames = []
-            faceNames = []
-            #
-            for item in obj.muxInfo:
-                if item[0] == "V":
-                    vertexNames.append(item)
-                if item[0] == "E":
-                    edgeNames.append(item)
-                if item[0] == "F":
-                    faceNames.append(item)
+            names = a2p_muxinfo.getMuxInfo(obj).names
+            vertexNames = names["V"]
+            edgeNames = names["E"]
+            faceNames = names["F"]
 
         if a2plib.getUseTopoNaming():
             for i in range(0, len(obj.Shape.Vertexes)):
@@ -0,0 +1,275 @@
+# ***************************************************************************
+# *                                                                         *
+# *   Copyright (c) 2018 kbwbe                                              *
+# *                                                                         *
+# *   This program is free software; you can redistribute it and/or modify  *
+# *   it under the terms of the GNU Lesser General Public License (LGPL)    *
+# *   as published by the Free Software Foundation; either version 2 of     *
+# *   the License, or (at your option) any later version.                   *
+# *   for detail see the LICENCE text file.                                 *
+# *                                                                         *
+# *   This program is distributed in the hope that it will be useful,       *
+# *   but WITHOUT ANY WARRANTY; without even the implied warranty of        *
+# *   MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the         *
+# *   GNU Library General Public License for more details.                  *
+# *                                                                         *
+# *   You should have received a copy of the GNU Library General Public     *
+# *   License along with this program; if not, write to the Free Software   *
+# *   Foundation, Inc., 59 Temple Place, Suite 330, Boston, MA  02111-1307  *
+# *   USA                                                                   *
+# *                                                                         *
+# ***************************************************************************
+
+
+"""
+Search for conflicting constraints without dialogs.
+
+All constraints are loaded once into a ConflictSearchSystem. A trial
+solves a subset of them by selecting the already created dependencies
+and resetting the rigids to their initial placements, the document is
+neither read nor written during the search.
+
+A bisection over the constraint list finds the first constraint which
+can not be solved together with its predecessors. The predecessors are
+then reduced to a minimal set, which still conflicts with this
+constraint, by QuickXplain (the divide and conquer variant of delta
+debugging).
+
+Like the solver itself the search assumes, that adding constraints to
+an unsolvable set does not make it solvable.
+
+Usage from the python console:
+
+    import a2p_conflictsearch
+    search = a2p_conflictsearch.ConflictSearch(FreeCAD.activeDocument())
+    conflicting = search.run()
+"""
+
+import time
+import a2plib
+from a2plib import Msg
+import a2p_libDOF
+from a2p_solversystem import SolverSystem
+
+
+# ------------------------------------------------------------------------------
+class ConflictSearchSystem(SolverSystem):
+    """SolverSystem, which solves subsets of the once loaded constraints"""
+
+    def __init__(self, backend=None):
+        SolverSystem.__init__(self, backend)
+        self.keepSystemLoaded = True
+        self.writePlacements = False
+        self.reportResults = False
+        self.allConstraints = []
+        self.allRigids = []
+        self.allDependencies = {}  # Rigid -> all its dependencies
+        self.initialPlacements = {}  # Rigid -> Placement
+        self.brokenConstraints = []  # found by prepare()
+        self.trialCount = 0
+
+    def getSolverControlData(self):
+        # a level not requiring complete solving is never failing,
+        # so only the other levels decide about conflicts
+        solverControlData = SolverSystem.getSolverControlData(self)
+        return dict(
+            (level, control)
+            for level, control in solverControlData.items()
+            if control[2]
+        )
+
+    def removeFaultyConstraints(self, doc):
+        """the document is not changed, see prepare()"""
+        pass
+
+    def handleBrokenConstraints(self, deleteList):
+        """no dialog, they are returned by prepare()"""
+        self.brokenConstraints.extend(deleteList)
+
+    def prepare(self, doc, constraints=None):
+        """
+        load all constraints, returns False on broken constraints,
+        which are collected in self.brokenConstraints
+        """
+        if constraints is None:
+            constraints = [
+                obj for obj in doc.Objects if "ConstraintInfo" in obj.Content
+            ]
+        # constraints referencing objects which do not exist anymore
+        self.brokenConstraints = [
+            c
+            for c in constraints
+            if doc.getObject(getattr(c, "Object1", None)) is None
+            or doc.getObject(getattr(c, "Object2", None)) is None
+        ]
+        if len(self.brokenConstraints) > 0:
+            return False
+        self.loadSystem(doc, constraints)
+        if self.status == "loadingDependencyError":
+            return False
+        self.allConstraints = list(self.constraints)
+        self.allRigids = list(self.rigids)
+        for rig in self.allRigids:
+            self.allDependencies[rig] = list(rig.dependencies)
+            self.initialPlacements[rig] = rig.placement
+        return True
+
+    def loadTrial(self, constraints):
+        """set up the loaded system for a subset of the constraints"""
+        names = set(c.Name for c in constraints)
+        self.graph.clear()
+        self.rigids = []
+        self.constraints = [c for c in self.allConstraints if c.Name in names]
+        for rig in self.allRigids:
+            rig.dependencies = [
+                dep
+                for dep in self.allDependencies[rig]
+                if dep.constraint.Name in names
+            ]
+            rig.placement = self.initialPlacements[rig]
+            rig.linkedRigids = []
+            rig.linkedRigidsSet = set()
+            rig.depsPerLinkedRigids = {}
+            rig.dofPOSPerLinkedRigids = {}
+            rig.dofROTPerLinkedRigids = {}
+            rig.pointConstraints = []
+            rig.posDOF = a2p_libDOF.initPosDOF
+            rig.rotDOF = a2p_libDOF.initRotDOF
+            if len(rig.dependencies) > 0:
+                self.addRigid(rig)
+        for c in self.constraints:
+            self.graph.link(self.getRigid(c.Object1), self.getRigid(c.Object2))
+        self.convergencyCounter = 0
+        self.partialSolverCurrentStage = 0
+        for rig in self.rigids:
+            rig.rebase(self)
+        self.retrieveDOFInfo()
+        self.status = "loaded"
+
+    def isSolvable(self, constraints):
+        self.trialCount += 1
+        self.setAccuracyLevel(1)
+        self.loadTrial(constraints)
+        self.assignParentship(self.doc)
+        systemSolved = self.solveLoadedSystem(self.doc, None, 0.0, True)
+        self.pendingPlacements = {}
+        return bool(systemSolved)
+
+    def restore(self):
+        """give all dependencies back to their rigids"""
+        for rig in self.allRigids:
+            rig.dependencies = self.allDependencies[rig]
+            rig.placement = self.initialPlacements[rig]
+
+
+# ------------------------------------------------------------------------------
+class ConflictSearch:
+    """
+    run() returns a minimal list of conflicting constraints, or an empty
+    list if all constraints can be solved. After run():
+
+    firstConflictingConstraint: the constraint, which the solver could
+    not solve together with all constraints before it
+    trialCount: number of subsets solved
+    seconds: duration of the search
+    brokenConstraints: constraints which can not be loaded at all, the
+    search is not run if there are any
+    """
+
+    def __init__(self, doc, constraints=None, backend=None):
+        self.doc = doc
+        self.constraints = constraints
+        self.system = ConflictSearchSystem(backend)
+        self.conflictingConstraints = []
+        self.firstConflictingConstraint = None
+        self.brokenConstraints = []
+        self.trialCount = 0
+        self.seconds = 0.0
+
+    def fails(self, constraints):
+        return not self.system.isSolvable(constraints)
+
+    def run(self):
+        startTime = time.time()
+        self.conflictingConstraints = []
+        self.firstConflictingConstraint = None
+        if not self.system.prepare(self.doc, self.constraints):
+            self.brokenConstraints = self.system.brokenConstraints
+            if not a2plib.SIMULATION_STATE:
+                Msg(
+                    "Conflict search: {} broken constraints\n".format(
+                        len(self.brokenConstraints)
+                    )
+                )
+            return []
+        try:
+            constraints = self.system.allConstraints
+            if len(constraints) > 0 and self.fails(constraints):
+                index = self.firstFailingIndex(constraints)
+                last = constraints[index]
+                self.firstConflictingConstraint = last
+                self.conflictingConstraints = self.minimize(
+                    constraints[:index], last
+                ) + [last]
+        finally:
+            self.system.restore()
+        self.trialCount = self.system.trialCount
+        self.seconds = time.time() - startTime
+        if not a2plib.SIMULATION_STATE:
+            Msg(
+                "Conflict search: {} of {} constraints conflicting, {} trials, {:.3f} s\n".format(
+                    len(self.conflictingConstraints),
+                    len(self.system.allConstraints),
+                    self.trialCount,
+                    self.seconds,
+                )
+            )
+        return self.conflictingConstraints
+
+    def firstFailingIndex(self, constraints):
+        """
+        bisection for the first constraint, which fails together with
+        its predecessors. constraints as a whole have to fail.
+        """
+        solvable = 0  # constraints[:solvable] can be solved
+        failing = len(constraints)  # constraints[:failing] fail
+        while failing - solvable > 1:
+            middle = (solvable + failing) // 2
+            if self.fails(constraints[:middle]):
+                failing = middle
+            else:
+                solvable = middle
+        return failing - 1
+
+    def minimize(self, candidates, last):
+        """
+        reduce candidates to a minimal list, which still fails together
+        with last. candidates + [last] have to fail.
+        """
+        if self.fails([last]):
+            return []
+        return self.quickXplain([last], False, candidates)
+
+    def quickXplain(self, background, backgroundChanged, candidates):
+        """
+        divide and conquer: the minimal part of candidates, which
+        fails together with background
+        """
+        if backgroundChanged and self.fails(background):
+            return []
+        if len(candidates) == 1:
+            return candidates
+        middle = len(candidates) // 2
+        first = candidates[:middle]
+        second = candidates[middle:]
+        conflict2 = self.quickXplain(background + first, len(first) > 0, second)
+        conflict1 = self.quickXplain(
+            background + conflict2, len(conflict2) > 0, first
+        )
+        return conflict1 + conflict2
+
+
+# ------------------------------------------------------------------------------
+def searchConflicts(doc, constraints=None, backend=None):
+    """returns a minimal list of conflicting constraints of doc"""
+    return ConflictSearch(doc, constraints, backend).run()
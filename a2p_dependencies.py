@@ -22,11 +22,10 @@
 
 import random
 import math
-import FreeCAD, FreeCADGui, Part
+import FreeCAD, FreeCADGui
 from FreeCAD import Base
 from a2p_translateUtils import *
-import a2plib
-from a2plib import getObjectEdgeFromName, getObjectFaceFromName, getPos, getAxis
+from a2p_geometrycache import geometryCache
 
 from a2p_libDOF import (
     AxisAlignment,
@@ -59,6 +58,13 @@ class Dependency:
         self.axisRotationEnabled = axisRotation
         self.lockRotation = False
         self.useRefPointSpin = True
+        # offset shift of refPoint/refAxisEnd, see adjustOffset()
+        self.offsetDirection = None
+        self.offsetApplied = False
+        # refPoint/refAxisEnd in coordinates of currentRigid, see rebase()
+        self.localRefPoint = None
+        self.localRefAxisEnd = None
+        self.localOffsetDirection = None
 
         self.Type = constraint.Type
         try:
@@ -112,8 +118,8 @@ class Dependency:
             ob1 = doc.getObject(c.Object1)
             ob2 = doc.getObject(c.Object2)
 
-            vert1 = getPos(ob1, c.SubElement1)
-            vert2 = getPos(ob2, c.SubElement2)
+            vert1 = geometryCache.getPos(ob1, c.SubElement1)
+            vert2 = geometryCache.getPos(ob2, c.SubElement2)
             dep1.refPoint = vert1
             dep2.refPoint = vert2
 
@@ -124,10 +130,10 @@ class Dependency:
             ob1 = doc.getObject(c.Object1)
             ob2 = doc.getObject(c.Object2)
 
-            dep1.refPoint = getPos(ob1, c.SubElement1)
-            dep2.refPoint = getPos(ob2, c.SubElement2)
+            dep1.refPoint = geometryCache.getPos(ob1, c.SubElement1)
+            dep2.refPoint = geometryCache.getPos(ob2, c.SubElement2)
 
-            axis2 = getAxis(ob2, c.SubElement2)
+            axis2 = geometryCache.getAxis(ob2, c.SubElement2)
             dep2.refAxisEnd = dep2.refPoint.add(axis2)
 
         elif c.Type == "pointOnPlane":
@@ -137,12 +143,11 @@ class Dependency:
             ob1 = doc.getObject(c.Object1)
             ob2 = doc.getObject(c.Object2)
 
-            dep1.refPoint = getPos(ob1, c.SubElement1)
+            dep1.refPoint = geometryCache.getPos(ob1, c.SubElement1)
 
-            plane2 = getObjectFaceFromName(ob2, c.SubElement2)
-            dep2.refPoint = plane2.Faces[0].BoundBox.Center
+            dep2.refPoint = geometryCache.getFaceCenter(ob2, c.SubElement2)
 
-            normal2 = a2plib.getPlaneNormal(plane2.Surface)
+            normal2 = geometryCache.getPlaneNormal(ob2, c.SubElement2)
             # shift refPoint of plane by offset
             try:
                 offs = c.offset
@@ -161,22 +166,18 @@ class Dependency:
             ob1 = doc.getObject(c.Object1)
             ob2 = doc.getObject(c.Object2)
 
-            dep1.refPoint = getPos(ob1, c.SubElement1)
-            dep2.refPoint = getPos(ob2, c.SubElement2)
+            dep1.refPoint = geometryCache.getPos(ob1, c.SubElement1)
+            dep2.refPoint = geometryCache.getPos(ob2, c.SubElement2)
 
-            axis1 = getAxis(ob1, c.SubElement1)
-            axis2 = getAxis(ob2, c.SubElement2)
+            axis1 = geometryCache.getAxis(ob1, c.SubElement1)
+            axis2 = geometryCache.getAxis(ob2, c.SubElement2)
 
             if dep2.direction == "opposed":
                 axis2.multiply(-1.0)
             dep1.refAxisEnd = dep1.refPoint.add(axis1)
             dep2.refAxisEnd = dep2.refPoint.add(axis2)
             #
-            if abs(dep2.offset) > solver.mySOLVER_SPIN_ACCURACY * 1e-1:
-                offsetAdjustVec = Base.Vector(axis2.x, axis2.y, axis2.z)
-                offsetAdjustVec.multiply(dep2.offset)
-                dep2.refPoint = dep2.refPoint.add(offsetAdjustVec)
-                dep2.refAxisEnd = dep2.refAxisEnd.add(offsetAdjustVec)
+            dep2.adjustOffset(axis2, solver)
 
         elif c.Type == "planesParallel":
             dep1 = DependencyParallelPlanes(c, "pointNormal")
@@ -184,13 +185,11 @@ class Dependency:
 
             ob1 = doc.getObject(c.Object1)
             ob2 = doc.getObject(c.Object2)
-            plane1 = getObjectFaceFromName(ob1, c.SubElement1)
-            plane2 = getObjectFaceFromName(ob2, c.SubElement2)
-            dep1.refPoint = plane1.Faces[0].BoundBox.Center
-            dep2.refPoint = plane2.Faces[0].BoundBox.Center
+            dep1.refPoint = geometryCache.getFaceCenter(ob1, c.SubElement1)
+            dep2.refPoint = geometryCache.getFaceCenter(ob2, c.SubElement2)
 
-            normal1 = a2plib.getPlaneNormal(plane1.Surface)
-            normal2 = a2plib.getPlaneNormal(plane2.Surface)
+            normal1 = geometryCache.getPlaneNormal(ob1, c.SubElement1)
+            normal2 = geometryCache.getPlaneNormal(ob2, c.SubElement2)
 
             if dep2.direction == "opposed":
                 normal2.multiply(-1.0)
@@ -203,13 +202,11 @@ class Dependency:
 
             ob1 = doc.getObject(c.Object1)
             ob2 = doc.getObject(c.Object2)
-            plane1 = getObjectFaceFromName(ob1, c.SubElement1)
-            plane2 = getObjectFaceFromName(ob2, c.SubElement2)
-            dep1.refPoint = plane1.Faces[0].BoundBox.Center
-            dep2.refPoint = plane2.Faces[0].BoundBox.Center
+            dep1.refPoint = geometryCache.getFaceCenter(ob1, c.SubElement1)
+            dep2.refPoint = geometryCache.getFaceCenter(ob2, c.SubElement2)
 
-            normal1 = a2plib.getPlaneNormal(plane1.Surface)
-            normal2 = a2plib.getPlaneNormal(plane2.Surface)
+            normal1 = geometryCache.getPlaneNormal(ob1, c.SubElement1)
+            normal2 = geometryCache.getPlaneNormal(ob2, c.SubElement2)
             dep1.refAxisEnd = dep1.refPoint.add(normal1)
             dep2.refAxisEnd = dep2.refPoint.add(normal2)
 
@@ -219,23 +216,17 @@ class Dependency:
 
             ob1 = doc.getObject(c.Object1)
             ob2 = doc.getObject(c.Object2)
-            plane1 = getObjectFaceFromName(ob1, c.SubElement1)
-            plane2 = getObjectFaceFromName(ob2, c.SubElement2)
-            dep1.refPoint = plane1.Faces[0].BoundBox.Center
-            dep2.refPoint = plane2.Faces[0].BoundBox.Center
+            dep1.refPoint = geometryCache.getFaceCenter(ob1, c.SubElement1)
+            dep2.refPoint = geometryCache.getFaceCenter(ob2, c.SubElement2)
 
-            normal1 = a2plib.getPlaneNormal(plane1.Surface)
-            normal2 = a2plib.getPlaneNormal(plane2.Surface)
+            normal1 = geometryCache.getPlaneNormal(ob1, c.SubElement1)
+            normal2 = geometryCache.getPlaneNormal(ob2, c.SubElement2)
             if dep2.direction == "opposed":
                 normal2.multiply(-1.0)
             dep1.refAxisEnd = dep1.refPoint.add(normal1)
             dep2.refAxisEnd = dep2.refPoint.add(normal2)
             #
-            if abs(dep2.offset) > solver.mySOLVER_SPIN_ACCURACY * 1e-1:
-                offsetAdjustVec = Base.Vector(normal2.x, normal2.y, normal2.z)
-                offsetAdjustVec.multiply(dep2.offset)
-                dep2.refPoint = dep2.refPoint.add(offsetAdjustVec)
-                dep2.refAxisEnd = dep2.refAxisEnd.add(offsetAdjustVec)
+            dep2.adjustOffset(normal2, solver)
 
         elif c.Type == "axial":
             dep1 = DependencyAxial(c, "pointAxis")
@@ -243,10 +234,10 @@ class Dependency:
 
             ob1 = doc.getObject(c.Object1)
             ob2 = doc.getObject(c.Object2)
-            dep1.refPoint = getPos(ob1, c.SubElement1)
-            dep2.refPoint = getPos(ob2, c.SubElement2)
-            axis1 = getAxis(ob1, c.SubElement1)
-            axis2 = getAxis(ob2, c.SubElement2)
+            dep1.refPoint = geometryCache.getPos(ob1, c.SubElement1)
+            dep2.refPoint = geometryCache.getPos(ob2, c.SubElement2)
+            axis1 = geometryCache.getAxis(ob1, c.SubElement1)
+            axis2 = geometryCache.getAxis(ob2, c.SubElement2)
             if dep2.direction == "opposed":
                 axis2.multiply(-1.0)
 
@@ -266,10 +257,10 @@ class Dependency:
 
             ob1 = doc.getObject(c.Object1)
             ob2 = doc.getObject(c.Object2)
-            dep1.refPoint = getPos(ob1, c.SubElement1)
-            dep2.refPoint = getPos(ob2, c.SubElement2)
-            axis1 = getAxis(ob1, c.SubElement1)
-            axis2 = getAxis(ob2, c.SubElement2)
+            dep1.refPoint = geometryCache.getPos(ob1, c.SubElement1)
+            dep2.refPoint = geometryCache.getPos(ob2, c.SubElement2)
+            axis1 = geometryCache.getAxis(ob1, c.SubElement1)
+            axis2 = geometryCache.getAxis(ob2, c.SubElement2)
             if dep2.direction == "opposed":
                 axis2.multiply(-1.0)
 
@@ -282,16 +273,15 @@ class Dependency:
 
             ob1 = doc.getObject(c.Object1)
             ob2 = doc.getObject(c.Object2)
-            axis1 = getAxis(ob1, c.SubElement1)
-            plane2 = getObjectFaceFromName(ob2, c.SubElement2)
-            dep1.refPoint = getPos(ob1, c.SubElement1)
-            dep2.refPoint = plane2.Faces[0].BoundBox.Center
+            axis1 = geometryCache.getAxis(ob1, c.SubElement1)
+            dep1.refPoint = geometryCache.getPos(ob1, c.SubElement1)
+            dep2.refPoint = geometryCache.getFaceCenter(ob2, c.SubElement2)
 
             axis1Normalized = Base.Vector(axis1)
             axis1Normalized.normalize()
             dep1.refAxisEnd = dep1.refPoint.add(axis1Normalized)
 
-            normal2 = a2plib.getPlaneNormal(plane2.Surface)
+            normal2 = geometryCache.getPlaneNormal(ob2, c.SubElement2)
             dep2.refAxisEnd = dep2.refPoint.add(normal2)
 
         elif c.Type == "axisPlaneAngle":
@@ -300,16 +290,15 @@ class Dependency:
 
             ob1 = doc.getObject(c.Object1)
             ob2 = doc.getObject(c.Object2)
-            axis1 = getAxis(ob1, c.SubElement1)
-            plane2 = getObjectFaceFromName(ob2, c.SubElement2)
-            dep1.refPoint = getPos(ob1, c.SubElement1)
-            dep2.refPoint = plane2.Faces[0].BoundBox.Center
+            axis1 = geometryCache.getAxis(ob1, c.SubElement1)
+            dep1.refPoint = geometryCache.getPos(ob1, c.SubElement1)
+            dep2.refPoint = geometryCache.getFaceCenter(ob2, c.SubElement2)
 
             axis1Normalized = Base.Vector(axis1)
             axis1Normalized.normalize()
             dep1.refAxisEnd = dep1.refPoint.add(axis1Normalized)
 
-            normal2 = a2plib.getPlaneNormal(plane2.Surface)
+            normal2 = geometryCache.getPlaneNormal(ob2, c.SubElement2)
             if dep2.direction == "opposed":
                 normal2.multiply(-1.0)
             dep2.refAxisEnd = dep2.refPoint.add(normal2)
@@ -322,16 +311,15 @@ class Dependency:
 
             ob1 = doc.getObject(c.Object1)
             ob2 = doc.getObject(c.Object2)
-            axis1 = getAxis(ob1, c.SubElement1)
-            plane2 = getObjectFaceFromName(ob2, c.SubElement2)
-            dep1.refPoint = getPos(ob1, c.SubElement1)
-            dep2.refPoint = plane2.Faces[0].BoundBox.Center
+            axis1 = geometryCache.getAxis(ob1, c.SubElement1)
+            dep1.refPoint = geometryCache.getPos(ob1, c.SubElement1)
+            dep2.refPoint = geometryCache.getFaceCenter(ob2, c.SubElement2)
 
             axis1Normalized = Base.Vector(axis1)
             axis1Normalized.normalize()
             dep1.refAxisEnd = dep1.refPoint.add(axis1Normalized)
 
-            normal2 = a2plib.getPlaneNormal(plane2.Surface)
+            normal2 = geometryCache.getPlaneNormal(ob2, c.SubElement2)
             if dep2.direction == "opposed":
                 normal2.multiply(-1.0)
             dep2.refAxisEnd = dep2.refPoint.add(normal2)
@@ -343,32 +331,18 @@ class Dependency:
             ob1 = doc.getObject(c.Object1)
             ob2 = doc.getObject(c.Object2)
 
-            if c.SubElement1.startswith("Face"):
-                plane1 = getObjectFaceFromName(ob1, c.SubElement1)
-                dep1.refPoint = plane1.Faces[0].CenterOfMass
-            elif c.SubElement1.startswith("Edge"):
-                plane1 = Part.Face(Part.Wire(getObjectEdgeFromName(ob1, c.SubElement1)))
-                dep1.refPoint = plane1.CenterOfMass
-            if c.SubElement2.startswith("Face"):
-                plane2 = getObjectFaceFromName(ob2, c.SubElement2)
-                dep2.refPoint = plane2.Faces[0].CenterOfMass
-            elif c.SubElement2.startswith("Edge"):
-                plane2 = Part.Face(Part.Wire(getObjectEdgeFromName(ob2, c.SubElement2)))
-                dep2.refPoint = plane2.CenterOfMass
-
-            normal1 = a2plib.getPlaneNormal(plane1.Surface)
-            normal2 = a2plib.getPlaneNormal(plane2.Surface)
+            dep1.refPoint = geometryCache.getCenterOfMass(ob1, c.SubElement1)
+            dep2.refPoint = geometryCache.getCenterOfMass(ob2, c.SubElement2)
+
+            normal1 = geometryCache.getCenterOfMassNormal(ob1, c.SubElement1)
+            normal2 = geometryCache.getCenterOfMassNormal(ob2, c.SubElement2)
 
             if dep2.direction == "opposed":
                 normal2.multiply(-1.0)
             dep1.refAxisEnd = dep1.refPoint.add(normal1)
             dep2.refAxisEnd = dep2.refPoint.add(normal2)
             #  to be improved: toggle direction even if offset == 0.0
-            if abs(dep2.offset) > solver.mySOLVER_SPIN_ACCURACY * 1e-1:
-                offsetAdjustVec = Base.Vector(normal2.x, normal2.y, normal2.z)
-                offsetAdjustVec.multiply(dep2.offset)
-                dep2.refPoint = dep2.refPoint.add(offsetAdjustVec)
-                dep2.refAxisEnd = dep2.refAxisEnd.add(offsetAdjustVec)
+            dep2.adjustOffset(normal2, solver)
 
         else:
             raise NotImplementedError(
@@ -387,6 +361,58 @@ class Dependency:
         rigid1.dependencies.append(dep1)
         rigid2.dependencies.append(dep2)
 
+        dep1.storeLocalFrame()
+        dep2.storeLocalFrame()
+
+    def adjustOffset(self, direction, solver):
+        """
+        shift refPoint and refAxisEnd by offset along direction.
+        Small offsets are ignored at low accuracy levels.
+        """
+        self.offsetDirection = Base.Vector(direction)
+        self.offsetApplied = False
+        if abs(self.offset) > solver.mySOLVER_SPIN_ACCURACY * 1e-1:
+            offsetAdjustVec = Base.Vector(direction.x, direction.y, direction.z)
+            offsetAdjustVec.multiply(self.offset)
+            self.refPoint = self.refPoint.add(offsetAdjustVec)
+            self.refAxisEnd = self.refAxisEnd.add(offsetAdjustVec)
+            self.offsetApplied = True
+
+    def storeLocalFrame(self):
+        """
+        keep refPoint and refAxisEnd (without offset shift) in coordinates
+        of currentRigid, so they can be rebased without the shapes
+        """
+        inverse = self.currentRigid.placement.inverse()
+        refPoint = self.refPoint
+        refAxisEnd = self.refAxisEnd
+        if self.offsetApplied:
+            offsetAdjustVec = Base.Vector(self.offsetDirection)
+            offsetAdjustVec.multiply(self.offset)
+            refPoint = refPoint.sub(offsetAdjustVec)
+            refAxisEnd = refAxisEnd.sub(offsetAdjustVec)
+        self.localRefPoint = inverse.multVec(refPoint)
+        self.localRefAxisEnd = None
+        if refAxisEnd is not None:
+            self.localRefAxisEnd = inverse.multVec(refAxisEnd)
+        self.localOffsetDirection = None
+        if self.offsetDirection is not None:
+            self.localOffsetDirection = inverse.Rotation.multVec(self.offsetDirection)
+
+    def rebase(self, solver):
+        """
+        recalculate refPoint and refAxisEnd from the current placement of
+        currentRigid, same result as Dependency.Create() at this placement
+        """
+        placement = self.currentRigid.placement
+        self.refPoint = placement.multVec(self.localRefPoint)
+        if self.localRefAxisEnd is not None:
+            self.refAxisEnd = placement.multVec(self.localRefAxisEnd)
+        if self.localOffsetDirection is not None:
+            self.adjustOffset(
+                placement.Rotation.multVec(self.localOffsetDirection), solver
+            )
+
     def applyPlacement(self, placement):
         if self.refPoint != None:
             self.refPoint = placement.multVec(self.refPoint)
@@ -797,8 +823,7 @@ class DependencyAxial(Dependency):
     def adjustRefPoints(self, obj, sub, refPoint, axis):
         if sub.startswith("Edge"):
             return refPoint
-        face = getObjectFaceFromName(obj, sub)
-        bbCenter = face.BoundBox.Center
+        bbCenter = geometryCache.getFaceCenter(obj, sub)
         if bbCenter.distanceToLine(refPoint, axis) < 1.0e-12:
             return bbCenter
         v1 = bbCenter.sub(refPoint)
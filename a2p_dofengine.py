@@ -0,0 +1,250 @@
+# ***************************************************************************
+# *                                                                         *
+# *   Copyright (c) 2018 kbwbe                                              *
+# *                                                                         *
+# *   This program is free software; you can redistribute it and/or modify  *
+# *   it under the terms of the GNU Lesser General Public License (LGPL)    *
+# *   as published by the Free Software Foundation; either version 2 of     *
+# *   the License, or (at your option) any later version.                   *
+# *   for detail see the LICENCE text file.                                 *
+# *                                                                         *
+# *   This program is distributed in the hope that it will be useful,       *
+# *   but WITHOUT ANY WARRANTY; without even the implied warranty of        *
+# *   MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the         *
+# *   GNU Library General Public License for more details.                  *
+# *                                                                         *
+# *   You should have received a copy of the GNU Library General Public     *
+# *   License along with this program; if not, write to the Free Software   *
+# *   Foundation, Inc., 59 Temple Place, Suite 330, Boston, MA  02111-1307  *
+# *   USA                                                                   *
+# *                                                                         *
+# ***************************************************************************
+
+
+"""
+Degrees of freedom by the rank of the constraint Jacobian.
+
+Each dependency gives linear equations (rows) for the infinitesimal
+motion (twist) of its rigid relative to the depended rigid. A twist is
+(v, w): translation velocity v of the reference point and rotation
+velocity w. A point x of the rigid moves with v + w x (x - center).
+
+    translation row along d at point x: (d, (x - center) x d)
+    rotation row around d:              (0, d)
+
+The free motions are the null space of the stacked rows (SVD). Free
+rotation axes are the rotation parts of the null space, free
+translations are the motions without rotation. Their counts replace the
+lists of axes of a2p_libDOF, see DOFInfo.
+
+No FreeCAD objects are created, vectors only need x, y and z.
+"""
+
+import numpy
+
+DOF_RANK_TOLERANCE = 1.0e-8  # relative to the largest singular value
+DOF_PARALLEL_TOLERANCE = 1.0e-9
+
+UNIT_VECTORS = numpy.identity(3)
+
+
+# ------------------------------------------------------------------------------
+def toArray(vector):
+    return numpy.array((vector.x, vector.y, vector.z), dtype=float)
+
+
+def unit(a):
+    length = numpy.linalg.norm(a)
+    if length < DOF_PARALLEL_TOLERANCE:
+        return None
+    return a / length
+
+
+def perpendiculars(a):
+    """two unit vectors perpendicular to a and to each other"""
+    helper = UNIT_VECTORS[numpy.argmin(numpy.abs(a))]
+    p1 = unit(numpy.cross(a, helper))
+    p2 = numpy.cross(a, p1)
+    return p1, p2
+
+
+def axisOf(dep):
+    if dep.refAxisEnd is None:
+        return None
+    return unit(toArray(dep.refAxisEnd) - toArray(dep.refPoint))
+
+
+def pointSide(dep):
+    """the dependency of a point/plane or point/line pair, which holds the point"""
+    if dep.refType == "point":
+        return dep
+    return dep.foreignDependency
+
+
+def otherSide(dep):
+    if dep.refType == "point":
+        return dep.foreignDependency
+    return dep
+
+
+# ------------------------------------------------------------------------------
+class RowBuilder:
+    def __init__(self, center):
+        self.center = center
+        self.rows = []
+
+    def translation(self, direction, point):
+        self.rows.append(
+            numpy.concatenate((direction, numpy.cross(point - self.center, direction)))
+        )
+
+    def pointFixed(self, point):
+        for d in UNIT_VECTORS:
+            self.translation(d, point)
+
+    def rotation(self, direction):
+        self.rows.append(numpy.concatenate((numpy.zeros(3), direction)))
+
+    def axisAligned(self, axis):
+        if axis is None:
+            return
+        p1, p2 = perpendiculars(axis)
+        self.rotation(p1)
+        self.rotation(p2)
+
+    def angleKept(self, axis, foreignAxis):
+        """the angle between both axes is constrained"""
+        if axis is None or foreignAxis is None:
+            return
+        normal = unit(numpy.cross(axis, foreignAxis))
+        if normal is None:
+            # parallel axes, every rotation around a perpendicular changes the angle
+            self.axisAligned(axis)
+        else:
+            self.rotation(normal)
+
+    def addDependency(self, dep):
+        Type = dep.Type
+        point = toArray(dep.refPoint)
+        if Type in ("pointIdentity", "sphereCenterIdent"):
+            self.pointFixed(point)
+        elif Type == "pointOnLine":
+            lineAxis = axisOf(otherSide(dep))
+            if lineAxis is None:
+                return
+            contact = toArray(pointSide(dep).refPoint)
+            for d in perpendiculars(lineAxis):
+                self.translation(d, contact)
+        elif Type == "pointOnPlane":
+            normal = axisOf(otherSide(dep))
+            if normal is None:
+                return
+            self.translation(normal, toArray(pointSide(dep).refPoint))
+        elif Type in ("circularEdge", "CenterOfMass"):
+            axis = axisOf(dep)
+            self.pointFixed(point)
+            self.axisAligned(axis)
+            if dep.lockRotation and axis is not None:
+                self.rotation(axis)
+        elif Type == "axial":
+            axis = axisOf(dep)
+            if axis is None:
+                return
+            for d in perpendiculars(axis):
+                self.translation(d, point)
+            self.axisAligned(axis)
+            if dep.lockRotation:
+                self.rotation(axis)
+        elif Type in (
+            "axisParallel",
+            "planesParallel",
+            "axisPlaneNormal",
+            "axisPlaneVertical",
+        ):
+            self.axisAligned(axisOf(dep))
+        elif Type == "plane":
+            normal = axisOf(dep)
+            self.axisAligned(normal)
+            if normal is not None:
+                self.translation(normal, point)
+        elif Type in ("angledPlanes", "axisPlaneParallel", "axisPlaneAngle"):
+            self.angleKept(axisOf(dep), axisOf(dep.foreignDependency))
+
+
+# ------------------------------------------------------------------------------
+class DOFInfo:
+    """
+    dof: number of free motions
+    freeTranslations: unit directions of the free translations (posDOF)
+    freeRotations: unit axes of the free rotations (rotDOF)
+    """
+
+    def __init__(self, rows):
+        self.rows = rows
+        if len(rows) == 0:
+            self.freeTranslations = [tuple(d) for d in UNIT_VECTORS]
+            self.freeRotations = [tuple(d) for d in UNIT_VECTORS]
+        else:
+            J = numpy.array(rows)
+            norms = numpy.linalg.norm(J, axis=1)
+            J = J[norms > DOF_PARALLEL_TOLERANCE] / norms[
+                norms > DOF_PARALLEL_TOLERANCE, numpy.newaxis
+            ]
+            self.freeTranslations = nullSpace(J[:, :3])
+            nullMotions = nullSpace(J)
+            if len(nullMotions) == 0:
+                self.freeRotations = []
+            else:
+                self.freeRotations = rangeSpace(numpy.array(nullMotions)[:, 3:])
+        self.posDOF = len(self.freeTranslations)
+        self.rotDOF = len(self.freeRotations)
+        self.dof = self.posDOF + self.rotDOF
+
+
+def singularValueSplit(A):
+    U, s, Vt = numpy.linalg.svd(A)
+    if len(s) == 0 or s[0] == 0.0:
+        return 0, Vt
+    rank = int(numpy.sum(s > DOF_RANK_TOLERANCE * s[0]))
+    return rank, Vt
+
+
+def nullSpace(A):
+    """orthonormal basis of {x: A x = 0} as list of tuples"""
+    if len(A) == 0:
+        return [tuple(d) for d in numpy.identity(A.shape[1])]
+    rank, Vt = singularValueSplit(A)
+    return [tuple(v) for v in Vt[rank:]]
+
+
+def rangeSpace(A):
+    """orthonormal basis of the space spanned by the rows of A"""
+    rank, Vt = singularValueSplit(A)
+    return [tuple(v) for v in Vt[:rank]]
+
+
+# ------------------------------------------------------------------------------
+def dependenciesDOF(dependencies):
+    """DOFInfo of a rigid constrained by the given dependencies of it"""
+    dependencies = [dep for dep in dependencies if dep.refPoint is not None]
+    if len(dependencies) == 0:
+        return DOFInfo([])
+    # rotate around the middle of the constraints, keeps the rows well scaled
+    center = numpy.mean([toArray(dep.refPoint) for dep in dependencies], axis=0)
+    builder = RowBuilder(center)
+    for dep in dependencies:
+        builder.addDependency(dep)
+    return DOFInfo(builder.rows)
+
+
+def rigidDOF(rig, dependedRigids=None):
+    """
+    DOFInfo of rig, constrained by all its dependencies or only by those
+    to dependedRigids. A fixed rigid has no DOF.
+    """
+    if rig.fixed:
+        return DOFInfo(list(numpy.identity(6)))
+    dependencies = rig.dependencies
+    if dependedRigids is not None:
+        dependencies = [d for d in dependencies if d.dependedRigid in dependedRigids]
+    return dependenciesDOF(dependencies)
@@ -0,0 +1,139 @@
+# ***************************************************************************
+# *                                                                         *
+# *   Copyright (c) 2018 kbwbe                                              *
+# *                                                                         *
+# *   This program is free software; you can redistribute it and/or modify  *
+# *   it under the terms of the GNU Lesser General Public License (LGPL)    *
+# *   as published by the Free Software Foundation; either version 2 of     *
+# *   the License, or (at your option) any later version.                   *
+# *   for detail see the LICENCE text file.                                 *
+# *                                                                         *
+# *   This program is distributed in the hope that it will be useful,       *
+# *   but WITHOUT ANY WARRANTY; without even the implied warranty of        *
+# *   MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the         *
+# *   GNU Library General Public License for more details.                  *
+# *                                                                         *
+# *   You should have received a copy of the GNU Library General Public     *
+# *   License along with this program; if not, write to the Free Software   *
+# *   Foundation, Inc., 59 Temple Place, Suite 330, Boston, MA  02111-1307  *
+# *   USA                                                                   *
+# *                                                                         *
+# ***************************************************************************
+
+
+"""
+Interactive dragging of a part under the rule of its constraints.
+
+A DragSession loads the solver system once, when the drag starts. Each
+frame starts from the solution of the previous frame: the dragged rigid
+is put to the cursor position, all dependencies are rebased on the
+current placements (no shape or constraint access) and the system is
+solved within a time budget. A frame which runs out of time is
+continued by the next one. Only the placements of rigids which moved
+are written to the document.
+
+    session = DragSession(doc, obj)
+    session.setTarget(position)
+    session.solveFrame()
+    ...
+    session.finish()
+"""
+
+import time
+
+from FreeCAD import Base
+
+import a2plib
+import a2p_solversystem
+
+DRAG_TIME_BUDGET = 0.04  # seconds per frame, ~25 frames per second
+DRAG_WRITE_POS_TOLERANCE = 1.0e-9
+DRAG_WRITE_ROT_TOLERANCE = 1.0e-12
+
+
+class DragSession:
+    def __init__(self, doc, obj, timeBudget=DRAG_TIME_BUDGET):
+        self.doc = doc
+        self.obj = obj
+        self.timeBudget = timeBudget
+        self.target = None
+        self.writtenPlacements = {}  # objectName -> Placement in the document
+        self.frameCount = 0
+        self.lastFrameTime = 0.0
+
+        simulationState = a2plib.SIMULATION_STATE
+        a2plib.setSimulationState(True)
+        self.ss = a2p_solversystem.SolverSystem()
+        self.ss.keepSystemLoaded = True
+        self.ss.writePlacements = False
+        self.ss.setAccuracyLevel(1)
+        self.ss.loadSystem(doc)
+        self.ss.assignParentship(doc)
+        a2plib.setSimulationState(simulationState)
+        self.loaded = self.ss.status == "loaded"
+        self.rigid = self.ss.getRigid(obj.Name) if self.loaded else None
+        for rig in self.ss.rigids:
+            self.writtenPlacements[rig.objectName] = Base.Placement(rig.placement)
+
+    def setTarget(self, position):
+        """the new position of the dragged part, solved by solveFrame()"""
+        self.target = Base.Vector(position)
+
+    def solveFrame(self):
+        """
+        move the dragged part to the target and solve, starting from the
+        last frame. Returns False if the system has no solution, True if
+        it is solved or the time budget is over.
+        """
+        if self.target is None:
+            return True
+        target = self.target
+        self.target = None
+        if self.rigid is None:
+            # not constrained, nothing to solve
+            self.obj.Placement.Base = target
+            return True
+        startTime = time.time()
+        self.rigid.placement = Base.Placement(target, self.rigid.placement.Rotation)
+
+        simulationState = a2plib.SIMULATION_STATE
+        a2plib.setSimulationState(True)
+        ss = self.ss
+        ss.setAccuracyLevel(1)
+        ss.reloadSystem(self.doc)
+        ss.deadline = startTime + self.timeBudget
+        ss.deadlineReached = False
+        try:
+            systemSolved = ss.calculateChain(self.doc)
+        finally:
+            ss.deadline = None
+            a2plib.setSimulationState(simulationState)
+        self.writeMovedPlacements()
+        self.frameCount += 1
+        self.lastFrameTime = time.time() - startTime
+        return systemSolved or ss.deadlineReached
+
+    def writeMovedPlacements(self):
+        """write back the placements of the rigids, which moved since the last write"""
+        for rig in self.ss.rigids:
+            if rig.fixed:
+                continue
+            written = self.writtenPlacements[rig.objectName]
+            placement = rig.placement
+            rotationChange = max(
+                abs(a - b) for a, b in zip(placement.Rotation.Q, written.Rotation.Q)
+            )
+            if (
+                placement.Base.sub(written.Base).Length <= DRAG_WRITE_POS_TOLERANCE
+                and rotationChange <= DRAG_WRITE_ROT_TOLERANCE
+            ):
+                continue
+            self.doc.getObject(rig.objectName).Placement = placement
+            self.writtenPlacements[rig.objectName] = Base.Placement(placement)
+
+    def finish(self):
+        """solve the final position with full accuracy"""
+        if self.target is not None:
+            self.solveFrame()
+        a2plib.setSimulationState(False)
+        return a2p_solversystem.solveConstraints(self.doc, useTransaction=False)
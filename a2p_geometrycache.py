@@ -0,0 +1,157 @@
+# ***************************************************************************
+# *                                                                         *
+# *   Copyright (c) 2018 kbwbe                                              *
+# *                                                                         *
+# *   This program is free software; you can redistribute it and/or modify  *
+# *   it under the terms of the GNU Lesser General Public License (LGPL)    *
+# *   as published by the Free Software Foundation; either version 2 of     *
+# *   the License, or (at your option) any later version.                   *
+# *   for detail see the LICENCE text file.                                 *
+# *                                                                         *
+# *   This program is distributed in the hope that it will be useful,       *
+# *   but WITHOUT ANY WARRANTY; without even the implied warranty of        *
+# *   MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the         *
+# *   GNU Library General Public License for more details.                  *
+# *                                                                         *
+# *   You should have received a copy of the GNU Library General Public     *
+# *   License along with this program; if not, write to the Free Software   *
+# *   Foundation, Inc., 59 Temple Place, Suite 330, Boston, MA  02111-1307  *
+# *   USA                                                                   *
+# *                                                                         *
+# ***************************************************************************
+
+
+"""
+Cache of the constraint geometry of the parts in their local frame.
+
+Dependency.Create() needs points, axes and plane normals of the
+subelements of the constrained parts. Evaluating them is expensive for
+BSpline geometry (fit_plane_to_surface1, fit_rotation_axis_to_surface1)
+and is repeated on every loadSystem. With the preference
+useGeometryCache the values are evaluated once on the shape without its
+placement and stored per object, subelement and query. They are only
+transformed by the current placement of the shape afterwards.
+
+Entries of an object are dropped when the identity of its shape changes
+(hashCode of the shape without placement) and when updateImportedParts
+replaces the shape, see invalidate().
+"""
+
+import FreeCAD
+import Part
+from FreeCAD import Base
+
+import a2plib
+from a2plib import getObjectEdgeFromName, getObjectFaceFromName
+
+
+# ------------------------------------------------------------------------------
+class LocalShapeObject:
+    """gives a shape to the a2plib functions, which expect an object"""
+
+    def __init__(self, shape):
+        self.Shape = shape
+
+
+# ------------------------------------------------------------------------------
+def faceCenter(obj, subElementName):
+    face = getObjectFaceFromName(obj, subElementName)
+    return face.Faces[0].BoundBox.Center
+
+
+def planeNormal(obj, subElementName):
+    face = getObjectFaceFromName(obj, subElementName)
+    return a2plib.getPlaneNormal(face.Surface, face)
+
+
+def centerOfMassFace(obj, subElementName):
+    if subElementName.startswith("Face"):
+        return getObjectFaceFromName(obj, subElementName).Faces[0]
+    if subElementName.startswith("Edge"):
+        return Part.Face(Part.Wire(getObjectEdgeFromName(obj, subElementName)))
+    return None
+
+
+def centerOfMass(obj, subElementName):
+    return centerOfMassFace(obj, subElementName).CenterOfMass
+
+
+def centerOfMassNormal(obj, subElementName):
+    face = centerOfMassFace(obj, subElementName)
+    return a2plib.getPlaneNormal(face.Surface, face)
+
+
+# ------------------------------------------------------------------------------
+class GeometryCache:
+    """
+    objects: (document name, object name) ->
+        (shape identity, LocalShapeObject, {(subElementName, query): local value})
+    """
+
+    def __init__(self):
+        self.objects = {}
+        self.hits = 0
+        self.misses = 0
+
+    def clear(self):
+        self.objects = {}
+        self.hits = 0
+        self.misses = 0
+
+    def invalidate(self, obj):
+        """forget the geometry of obj, call it after replacing obj.Shape"""
+        self.objects.pop((obj.Document.Name, obj.Name), None)
+
+    def getEntry(self, obj):
+        """returns the placement of the shape and the entry of obj"""
+        shape = obj.Shape
+        placement = shape.Placement
+        shape.Placement = FreeCAD.Placement()
+        shapeKey = shape.hashCode()
+        key = (obj.Document.Name, obj.Name)
+        entry = self.objects.get(key, None)
+        if entry is None or entry[0] != shapeKey:
+            entry = (shapeKey, LocalShapeObject(shape), {})
+            self.objects[key] = entry
+        return placement, entry
+
+    def query(self, obj, subElementName, function, isPoint):
+        if not a2plib.getUseGeometryCache():
+            return function(obj, subElementName)
+        placement, (shapeKey, localObject, values) = self.getEntry(obj)
+        key = (subElementName, function.__name__)
+        if key in values:
+            self.hits += 1
+        else:
+            self.misses += 1
+            value = function(localObject, subElementName)
+            if value is not None:
+                value = Base.Vector(value)
+            values[key] = value
+        value = values[key]
+        if value is None:
+            return None
+        if isPoint:
+            return placement.multVec(value)
+        return placement.Rotation.multVec(value)
+
+    def getPos(self, obj, subElementName):
+        return self.query(obj, subElementName, a2plib.getPos, True)
+
+    def getAxis(self, obj, subElementName):
+        return self.query(obj, subElementName, a2plib.getAxis, False)
+
+    def getFaceCenter(self, obj, subElementName):
+        return self.query(obj, subElementName, faceCenter, True)
+
+    def getPlaneNormal(self, obj, subElementName):
+        return self.query(obj, subElementName, planeNormal, False)
+
+    def getCenterOfMass(self, obj, subElementName):
+        return self.query(obj, subElementName, centerOfMass, True)
+
+    def getCenterOfMassNormal(self, obj, subElementName):
+        return self.query(obj, subElementName, centerOfMassNormal, False)
+
+
+geometryCache = GeometryCache()
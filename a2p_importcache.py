@@ -0,0 +1,301 @@
+# ***************************************************************************
+# *                                                                         *
+# *   Copyright (c) 2018 kbwbe                                              *
+# *                                                                         *
+# *   This program is free software; you can redistribute it and/or modify  *
+# *   it under the terms of the GNU Lesser General Public License (LGPL)    *
+# *   as published by the Free Software Foundation; either version 2 of     *
+# *   the License, or (at your option) any later version.                   *
+# *   for detail see the LICENCE text file.                                 *
+# *                                                                         *
+# *   This program is distributed in the hope that it will be useful,       *
+# *   but WITHOUT ANY WARRANTY; without even the implied warranty of        *
+# *   MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the         *
+# *   GNU Library General Public License for more details.                  *
+# *                                                                         *
+# *   You should have received a copy of the GNU Library General Public     *
+# *   License along with this program; if not, write to the Free Software   *
+# *   Foundation, Inc., 59 Temple Place, Suite 330, Boston, MA  02111-1307  *
+# *   USA                                                                   *
+# *                                                                         *
+# ***************************************************************************
+
+
+"""
+Persistent on-disk cache of imported parts.
+
+importPartFromFile() opens the source file, creates the shape and the
+topo names (TopoMapper.createTopoNames or muxAssemblyWithTopoNames) and
+closes the file again. With the preference useImportCache the result
+is stored in the user's cache directory, so every further import or
+update of the same file version, in any assembly, is loaded from there
+without opening the source document.
+
+An entry is a directory named by a hash of the source path, its mtime
+and size, the sourcePart and the preferences which change the result
+(topo naming, solid union, import of invisible shapes). It holds the
+shape as BREP and the muxInfo, DiffuseColor, Transparency and LCS
+placements as JSON. The size of the cache is limited by the preference
+importCacheSize (MB), the least recently used entries are removed first.
+
+TopoMemo keeps the toponames created per feature by TopoMapper in the
+same directory, see TopoMapper.populateShapeDictMemoized().
+"""
+
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+
+import FreeCAD
+import Part
+
+import a2plib
+from a2p_versionmanagement import A2P_VERSION
+
+SHAPE_FILE = "shape.brep"
+INFO_FILE = "info.json"
+
+
+# ------------------------------------------------------------------------------
+class ImportData:
+    """the result of importing a part from a file"""
+
+    def __init__(self):
+        self.label = ""  # label of the source document
+        self.subassemblyImport = False
+        self.muxInfo = []
+        self.shape = None
+        self.diffuseColor = []
+        self.transparency = 0
+        self.lcsPlacements = []
+
+
+# ------------------------------------------------------------------------------
+def cacheDirectory():
+    if hasattr(FreeCAD, "getUserCachePath"):
+        base = FreeCAD.getUserCachePath()
+    else:
+        base = FreeCAD.getUserAppDataDir()
+    return os.path.join(base, "A2plus", "importcache")
+
+
+def isUsable(filename, importDocIsOpen):
+    """
+    An open document can have unsaved changes and parts, which are
+    recalculated on import, can depend on other files, so both are
+    never cached.
+    """
+    return (
+        a2plib.getUseImportCache()
+        and not importDocIsOpen
+        and not a2plib.getRecalculateImportedParts()
+        and os.path.exists(filename)
+    )
+
+
+def cacheKey(filename, sourcePart):
+    stat = os.stat(filename)
+    key = json.dumps(
+        [
+            os.path.normcase(os.path.abspath(filename)),
+            stat.st_mtime,
+            stat.st_size,
+            sourcePart or "",
+            a2plib.getUseTopoNaming(),
+            a2plib.getUseSolidUnion(),
+            a2plib.doNotImportInvisibleShapes(),
+            A2P_VERSION,
+        ]
+    )
+    return hashlib.sha1(key.encode("utf-8")).hexdigest()
+
+
+# ------------------------------------------------------------------------------
+def placementToList(pl):
+    return [pl.Base.x, pl.Base.y, pl.Base.z] + list(pl.Rotation.Q)
+
+
+def placementFromList(values):
+    return FreeCAD.Placement(
+        FreeCAD.Vector(*values[:3]), FreeCAD.Rotation(*values[3:])
+    )
+
+
+# ------------------------------------------------------------------------------
+def readEntry(entry):
+    """the ImportData of an entry directory, see writeEntry()"""
+    with open(os.path.join(entry, INFO_FILE), "r") as f:
+        info = json.load(f)
+    shape = Part.Shape()
+    shape.importBrep(os.path.join(entry, SHAPE_FILE))
+
+    data = ImportData()
+    data.label = info["label"]
+    data.subassemblyImport = info["subassemblyImport"]
+    data.muxInfo = info["muxInfo"]
+    data.shape = shape
+    data.diffuseColor = [tuple(color) for color in info["diffuseColor"]]
+    data.transparency = info["transparency"]
+    data.lcsPlacements = [placementFromList(pl) for pl in info["lcsPlacements"]]
+    return data
+
+
+def writeEntry(directory, name, data):
+    """
+    write ImportData as BREP and JSON to the directory name within
+    directory. It is written to a temporary directory first, an entry
+    is complete or does not exist.
+    """
+    entry = os.path.join(directory, name)
+    info = {
+        "label": data.label,
+        "subassemblyImport": data.subassemblyImport,
+        "muxInfo": list(data.muxInfo),
+        "diffuseColor": [list(color) for color in data.diffuseColor],
+        "transparency": data.transparency,
+        "lcsPlacements": [placementToList(pl) for pl in data.lcsPlacements],
+    }
+    if not os.path.exists(directory):
+        os.makedirs(directory)
+    tempEntry = tempfile.mkdtemp(dir=directory, prefix="tmp")
+    try:
+        data.shape.exportBrep(os.path.join(tempEntry, SHAPE_FILE))
+        with open(os.path.join(tempEntry, INFO_FILE), "w") as f:
+            json.dump(info, f)
+        if os.path.exists(entry):
+            shutil.rmtree(entry, ignore_errors=True)
+        os.rename(tempEntry, entry)
+    finally:
+        if os.path.exists(tempEntry):
+            shutil.rmtree(tempEntry, ignore_errors=True)
+    return entry
+
+
+# ------------------------------------------------------------------------------
+def contains(filename, sourcePart=None):
+    entry = os.path.join(cacheDirectory(), cacheKey(filename, sourcePart))
+    return os.path.exists(os.path.join(entry, INFO_FILE))
+
+
+def load(filename, sourcePart=None):
+    """the cached ImportData of filename or None"""
+    entry = os.path.join(cacheDirectory(), cacheKey(filename, sourcePart))
+    infoPath = os.path.join(entry, INFO_FILE)
+    if not os.path.exists(infoPath):
+        return None
+    try:
+        data = readEntry(entry)
+    except Exception as e:
+        FreeCAD.Console.PrintWarning(
+            "A2plus: unreadable import cache entry {}: {}\n".format(entry, e)
+        )
+        shutil.rmtree(entry, ignore_errors=True)
+        return None
+    os.utime(infoPath, None)  # last use, see evict()
+    return data
+
+
+def store(filename, sourcePart, data):
+    """store ImportData of filename, errors only disable caching"""
+    try:
+        entry = writeEntry(cacheDirectory(), cacheKey(filename, sourcePart), data)
+    except Exception as e:
+        FreeCAD.Console.PrintWarning(
+            "A2plus: could not write import cache entry for {}: {}\n".format(
+                filename, e
+            )
+        )
+        return
+    evict(a2plib.getImportCacheSize() * 1024 * 1024, keep=entry)
+
+
+# ------------------------------------------------------------------------------
+class TopoMemo:
+    """
+    The contributions of the features of one source document (and
+    sourcePart) to TopoMapper.shapeDict, keyed by the chain keys of the
+    features (see TopoMapper.featureKey). Stored as a cache entry
+    without shape, only the contributions used by the last import are
+    kept.
+    """
+
+    def __init__(self, filename, sourcePart=None):
+        key = json.dumps([os.path.normcase(os.path.abspath(filename)), sourcePart or ""])
+        self.entry = os.path.join(
+            cacheDirectory(),
+            "topo-" + hashlib.sha1(key.encode("utf-8")).hexdigest(),
+        )
+        self.contributions = {}
+        self.used = {}
+        infoPath = os.path.join(self.entry, INFO_FILE)
+        if os.path.exists(infoPath):
+            try:
+                with open(infoPath, "r") as f:
+                    self.contributions = json.load(f)
+            except Exception:
+                self.contributions = {}
+
+    def get(self, chainKey):
+        contribution = self.contributions.get(chainKey)
+        if contribution is not None:
+            self.used[chainKey] = contribution
+        return contribution
+
+    def put(self, chainKey, contribution):
+        self.used[chainKey] = contribution
+
+    def save(self):
+        try:
+            if not os.path.exists(self.entry):
+                os.makedirs(self.entry)
+            tempPath = os.path.join(self.entry, "tmp" + INFO_FILE)
+            with open(tempPath, "w") as f:
+                json.dump(self.used, f)
+            if os.path.exists(os.path.join(self.entry, INFO_FILE)):
+                os.remove(os.path.join(self.entry, INFO_FILE))
+            os.rename(tempPath, os.path.join(self.entry, INFO_FILE))
+        except Exception as e:
+            FreeCAD.Console.PrintWarning(
+                "A2plus: could not write toponame cache {}: {}\n".format(self.entry, e)
+            )
+            return
+        evict(a2plib.getImportCacheSize() * 1024 * 1024)
+
+
+# ------------------------------------------------------------------------------
+def entrySize(entry):
+    size = 0
+    for name in os.listdir(entry):
+        size += os.path.getsize(os.path.join(entry, name))
+    return size
+
+
+def evict(maxSize, keep=None):
+    """remove the least recently used entries until the cache fits maxSize"""
+    directory = cacheDirectory()
+    if not os.path.isdir(directory):
+        return
+    entries = []  # (last use, size, path)
+    totalSize = 0
+    for name in os.listdir(directory):
+        entry = os.path.join(directory, name)
+        infoPath = os.path.join(entry, INFO_FILE)
+        if not os.path.exists(infoPath):
+            continue  # unfinished entry of another process
+        size = entrySize(entry)
+        totalSize += size
+        entries.append((os.path.getmtime(infoPath), size, entry))
+    entries.sort()
+    for lastUse, size, entry in entries:
+        if totalSize <= maxSize:
+            break
+        if entry == keep:
+            continue
+        shutil.rmtree(entry, ignore_errors=True)
+        totalSize -= size
+
+
+def clear():
+    shutil.rmtree(cacheDirectory(), ignore_errors=True)
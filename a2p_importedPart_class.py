@@ -32,6 +32,7 @@ from FreeCAD import Base
 from PySide import QtGui
 from a2p_translateUtils import *
 import a2plib
+import a2p_muxinfo
 from a2p_versionmanagement import A2P_VERSION
 
 # ==============================================================================
@@ -83,6 +84,16 @@ class Proxy_importPart:
     def onDocumentRestored(self, obj):
         Proxy_importPart.setProperties(self, obj)
 
+    def onChanged(self, obj, prop):
+        if prop == "muxInfo":
+            self.muxInfoIndex = None
+
+    def getMuxInfo(self, obj):
+        """a2p_muxinfo.MuxInfo of obj.muxInfo, built once per muxInfo"""
+        if getattr(self, "muxInfoIndex", None) is None:
+            self.muxInfoIndex = a2p_muxinfo.MuxInfo(obj.muxInfo)
+        return self.muxInfoIndex
+
     def __getstate__(self):
         return None
 
@@ -33,6 +33,8 @@ import a2plib
 from a2p_MuxAssembly import muxAssemblyWithTopoNames
 from a2p_versionmanagement import A2P_VERSION
 import a2p_solversystem
+from a2p_geometrycache import geometryCache
+from a2p_dragsession import DragSession
 from a2plib import getRelativePathesEnabled
 import a2p_importedPart_class
 import a2p_convertPart
@@ -40,6 +42,9 @@ import a2p_convertPart
 from a2p_topomapper import TopoMapper
 
 import a2p_lcs_support
+import a2p_importcache
+import a2p_updateworkers
+import a2p_muxinfo
 from a2p_importedPart_class import Proxy_importPart, ImportedPartViewProviderProxy
 import a2p_constraintServices
 
@@ -217,49 +222,12 @@ class a2p_shapeExtractDialog(QtGui.QDialog):
 
 
 # ==============================================================================
-def importPartFromFile(
-    _doc,
-    filename,
-    extractSingleShape=False,  # load only a single user defined shape from file
-    desiredShapeLabel=None,
-    importToCache=False,
-    cacheKey="",
-):
-    doc = _doc
-    # -------------------------------------------
-    # Get the importDocument
-    # -------------------------------------------
-
-    # look only for filenames, not paths, as there are problems on WIN10 (Address-translation??)
-    importDoc = None
-    importDocIsOpen = False
-    requestedFile = os.path.split(filename)[1]
-    for d in FreeCAD.listDocuments().values():
-        recentFile = os.path.split(d.FileName)[1]
-        if requestedFile == recentFile:
-            importDoc = d  # file is already open...
-            importDocIsOpen = True
-            break
-
-    if not importDocIsOpen:
-        if filename.lower().endswith(".fcstd"):
-            importDoc = FreeCAD.openDocument(filename)
-        elif filename.lower().endswith(".stp") or filename.lower().endswith(".step"):
-            import ImportGui
-
-            fname = os.path.splitext(os.path.basename(filename))[0]
-            FreeCAD.newDocument(fname)
-            newname = FreeCAD.ActiveDocument.Name
-            FreeCAD.setActiveDocument(newname)
-            ImportGui.insert(filename, newname)
-            importDoc = FreeCAD.ActiveDocument
-        else:
-            msg = "A part can only be imported from a FreeCAD '*.FCStd' file"
-            QtGui.QMessageBox.information(
-                QtGui.QApplication.activeWindow(), "Value Error", msg
-            )
-            return
-
+def importDataFromDocument(importDoc, extractSingleShape, dc, interactive=True):
+    """
+    create shape, topo names, colors and LCS placements of importDoc,
+    returns an a2p_importcache.ImportData or None if aborted. Without
+    interactive no dialogs are shown (see a2p_updateworkers).
+    """
     # -------------------------------------------
     # recalculate imported part if requested by preferences
     # This can be useful if the imported part depends on an
@@ -281,41 +249,149 @@ def importPartFromFile(
     importableObjects = topoMapper.getTopLevelObjects(allowSketches=True)
 
     if len(importableObjects) == 0:
-        msg = "No visible Part to import found. Aborting operation"
-        QtGui.QMessageBox.information(
-            QtGui.QApplication.activeWindow(), "Import Error", msg
-        )
-        return
+        if interactive:
+            msg = "No visible Part to import found. Aborting operation"
+            QtGui.QMessageBox.information(
+                QtGui.QApplication.activeWindow(), "Import Error", msg
+            )
+        return None
 
     # -------------------------------------------
     # if only one single shape of the importdoc is wanted..
     # -------------------------------------------
     labelList = []
-    dc = DataContainer()
 
-    if extractSingleShape:
-        if desiredShapeLabel is None:  # ask for a shape label
-            for io in importableObjects:
-                labelList.append(io.Label)
-            dialog = a2p_shapeExtractDialog(
-                QtGui.QApplication.activeWindow(), labelList, dc
+    if extractSingleShape and dc.tx is None:  # ask for a shape label
+        if not interactive:
+            return None
+        for io in importableObjects:
+            labelList.append(io.Label)
+        dialog = a2p_shapeExtractDialog(
+            QtGui.QApplication.activeWindow(), labelList, dc
+        )
+        dialog.exec_()
+        if dc.tx is None:
+            msg = "Import of a shape reference aborted by user"
+            QtGui.QMessageBox.information(
+                QtGui.QApplication.activeWindow(), "Import Error", msg
             )
-            dialog.exec_()
-            if dc.tx is None:
-                msg = "Import of a shape reference aborted by user"
-                QtGui.QMessageBox.information(
-                    QtGui.QApplication.activeWindow(), "Import Error", msg
-                )
-                return
-        else:  # use existent shape label
-            dc.tx = desiredShapeLabel
+            return None
+
+    data = a2p_importcache.ImportData()
+    data.label = importDoc.Label
 
     # -------------------------------------------
     # Discover whether we are importing a subassembly or a single part
     # -------------------------------------------
-    subAssemblyImport = False
     if all(["importPart" in obj.Content for obj in importableObjects]) == 1:
-        subAssemblyImport = True
+        data.subassemblyImport = True
+
+    if data.subassemblyImport:
+        if extractSingleShape:
+            (
+                data.muxInfo,
+                data.shape,
+                data.diffuseColor,
+                data.transparency,
+            ) = muxAssemblyWithTopoNames(importDoc, desiredShapeLabel=dc.tx)
+        else:
+            (
+                data.muxInfo,
+                data.shape,
+                data.diffuseColor,
+                data.transparency,
+            ) = muxAssemblyWithTopoNames(importDoc)
+    else:
+        # TopoMapper manages import of non A2p-Files. It generates the shapes and appropriate topo names...
+        if extractSingleShape:
+            (
+                data.muxInfo,
+                data.shape,
+                data.diffuseColor,
+                data.transparency,
+            ) = topoMapper.createTopoNames(desiredShapeLabel=dc.tx)
+        else:
+            (
+                data.muxInfo,
+                data.shape,
+                data.diffuseColor,
+                data.transparency,
+            ) = topoMapper.createTopoNames()
+
+    data.lcsPlacements = a2p_lcs_support.getLCSPlacements(importDoc)
+    return data
+
+
+# ==============================================================================
+def importPartFromFile(
+    _doc,
+    filename,
+    extractSingleShape=False,  # load only a single user defined shape from file
+    desiredShapeLabel=None,
+    importToCache=False,
+    cacheKey="",
+    importData=None,  # already created, see a2p_updateworkers
+):
+    doc = _doc
+    dc = DataContainer()
+    if extractSingleShape:
+        dc.tx = desiredShapeLabel  # None: ask for a shape label
+
+    # look only for filenames, not paths, as there are problems on WIN10 (Address-translation??)
+    importDoc = None
+    importDocIsOpen = False
+    requestedFile = os.path.split(filename)[1]
+    for d in FreeCAD.listDocuments().values():
+        recentFile = os.path.split(d.FileName)[1]
+        if requestedFile == recentFile:
+            importDoc = d  # file is already open...
+            importDocIsOpen = True
+            break
+
+    # -------------------------------------------
+    # Try the persistent import cache, see a2p_importcache
+    # -------------------------------------------
+    useImportCache = (
+        importData is None
+        and a2p_importcache.isUsable(filename, importDocIsOpen)
+        and (not extractSingleShape or dc.tx is not None)
+    )
+    if useImportCache:
+        importData = a2p_importcache.load(filename, dc.tx)
+
+    if importData is None:
+        # -------------------------------------------
+        # Get the importDocument
+        # -------------------------------------------
+        if not importDocIsOpen:
+            if filename.lower().endswith(".fcstd"):
+                importDoc = FreeCAD.openDocument(filename)
+            elif filename.lower().endswith(".stp") or filename.lower().endswith(
+                ".step"
+            ):
+                import ImportGui
+
+                fname = os.path.splitext(os.path.basename(filename))[0]
+                FreeCAD.newDocument(fname)
+                newname = FreeCAD.ActiveDocument.Name
+                FreeCAD.setActiveDocument(newname)
+                ImportGui.insert(filename, newname)
+                importDoc = FreeCAD.ActiveDocument
+            else:
+                msg = "A part can only be imported from a FreeCAD '*.FCStd' file"
+                QtGui.QMessageBox.information(
+                    QtGui.QApplication.activeWindow(), "Value Error", msg
+                )
+                return
+
+        importData = importDataFromDocument(importDoc, extractSingleShape, dc)
+        if importData is None:
+            return
+
+        if not importDocIsOpen:
+            FreeCAD.closeDocument(importDoc.Name)
+        if useImportCache:
+            a2p_importcache.store(filename, dc.tx, importData)
 
     # -------------------------------------------
     # create new object
@@ -325,12 +401,12 @@ def importPartFromFile(
         newObj = doc.addObject("Part::FeaturePython", partName)
         newObj.Label = partName
     else:
-        partName = a2plib.findUnusedObjectName(importDoc.Label, document=doc)
+        partName = a2plib.findUnusedObjectName(importData.label, document=doc)
         if extractSingleShape == False:
-            partLabel = a2plib.findUnusedObjectLabel(importDoc.Label, document=doc)
+            partLabel = a2plib.findUnusedObjectLabel(importData.label, document=doc)
         else:
             partLabel = a2plib.findUnusedObjectLabel(
-                importDoc.Label, document=doc, extension=dc.tx
+                importData.label, document=doc, extension=dc.tx
             )
         if PYVERSION < 3:
             newObj = doc.addObject("Part::FeaturePython", partName.encode("utf-8"))
@@ -368,40 +444,13 @@ def importPartFromFile(
         newObj.fixedPosition = not any(
             [i.fixedPosition for i in doc.Objects if hasattr(i, "fixedPosition")]
         )
-    newObj.subassemblyImport = subAssemblyImport
+    newObj.subassemblyImport = importData.subassemblyImport
     newObj.setEditorMode("subassemblyImport", 1)
 
-    if subAssemblyImport:
-        if extractSingleShape:
-            (
-                newObj.muxInfo,
-                newObj.Shape,
-                newObj.ViewObject.DiffuseColor,
-                newObj.ViewObject.Transparency,
-            ) = muxAssemblyWithTopoNames(importDoc, desiredShapeLabel=dc.tx)
-        else:
-            (
-                newObj.muxInfo,
-                newObj.Shape,
-                newObj.ViewObject.DiffuseColor,
-                newObj.ViewObject.Transparency,
-            ) = muxAssemblyWithTopoNames(importDoc)
-    else:
-        # TopoMapper manages import of non A2p-Files. It generates the shapes and appropriate topo names...
-        if extractSingleShape:
-            (
-                newObj.muxInfo,
-                newObj.Shape,
-                newObj.ViewObject.DiffuseColor,
-                newObj.ViewObject.Transparency,
-            ) = topoMapper.createTopoNames(desiredShapeLabel=dc.tx)
-        else:
-            (
-                newObj.muxInfo,
-                newObj.Shape,
-                newObj.ViewObject.DiffuseColor,
-                newObj.ViewObject.Transparency,
-            ) = topoMapper.createTopoNames()
+    newObj.muxInfo = importData.muxInfo
+    newObj.Shape = importData.shape
+    newObj.ViewObject.DiffuseColor = importData.diffuseColor
+    newObj.ViewObject.Transparency = importData.transparency
 
     newObj.objectType = "a2pPart"
     if extractSingleShape == True:
@@ -421,10 +470,7 @@ def importPartFromFile(
                 0  # import assembly first time as non transparent.
             )
 
-    lcsList = a2p_lcs_support.getListOfLCS(doc, importDoc)
-
-    if not importDocIsOpen:
-        FreeCAD.closeDocument(importDoc.Name)
+    lcsList = a2p_lcs_support.createLCS(doc, importData.lcsPlacements)
 
     if len(lcsList) > 0:
         # =========================================
@@ -826,8 +872,62 @@ Check your settings of A2plus preferences.
 
 FreeCADGui.addCommand("a2p_ImportPart", a2p_ImportPartCommand())
 # ==============================================================================
+def isStaleImport(obj, absPath):
+    return (
+        os.path.getmtime(absPath) > obj.timeLastImport
+        or obj.a2p_Version != A2P_VERSION
+        or a2plib.getRecalculateImportedParts()  # open always all parts as they could depend on spreadsheets
+    )
+
+
+def updateCacheKey(absPath, sourcePart):
+    """key of objectCache for an update of sourcePart of absPath"""
+    if sourcePart is None or sourcePart == "":
+        sourcePart = "AllShapes"
+    return absPath + "-" + sourcePart
+
+
+def regenerateStaleParts(doc, workingSet):
+    """
+    collect the source files of all stale parts of workingSet and
+    regenerate them at once in headless worker processes (see
+    a2p_updateworkers). The results are added to objectCache, so
+    updateImportedParts() only has to assign them.
+    """
+    assemblyPath = os.path.normpath(os.path.split(doc.FileName)[0])
+    tasks = {}  # cacheKey: (absPath, sourcePart)
+    for obj in workingSet:
+        if not hasattr(obj, "sourceFile") or a2plib.to_str(
+            obj.sourceFile
+        ) == a2plib.to_str("converted"):
+            continue
+        absPath = a2plib.findSourceFileInProject(obj.sourceFile, assemblyPath)
+        if absPath is None or not os.path.exists(absPath):
+            continue
+        if not isStaleImport(obj, absPath):
+            continue
+        cacheKey = updateCacheKey(absPath, obj.sourcePart)
+        if cacheKey in tasks or objectCache.isCached(cacheKey):
+            continue
+        tasks[cacheKey] = (absPath, obj.sourcePart or None)
+
+    results = a2p_updateworkers.regenerate(tasks)
+    for cacheKey, importData in results.items():
+        absPath, sourcePart = tasks[cacheKey]
+        if a2p_importcache.isUsable(absPath, False):
+            a2p_importcache.store(absPath, sourcePart, importData)
+        importPartFromFile(
+            doc,
+            absPath,
+            importToCache=True,
+            cacheKey=cacheKey,
+            extractSingleShape=sourcePart is not None,
+            desiredShapeLabel=sourcePart,
+            importData=importData,
+        )
 
 
+# ==============================================================================
 def updateImportedParts(doc, partial=False):
     if doc is None:
         QtGui.QMessageBox.information(
@@ -868,6 +968,9 @@ def updateImportedParts(doc, partial=False):
     else:
         workingSet = doc.Objects
 
+    if a2p_updateworkers.isEnabled():
+        regenerateStaleParts(doc, workingSet)
+
     for obj in workingSet:
         if hasattr(obj, "sourceFile") and a2plib.to_str(
             obj.sourceFile
@@ -878,6 +981,7 @@ def updateImportedParts(doc, partial=False):
                 and obj.localSourceObject != ""
             ):
                 a2p_convertPart.updateConvertedPart(doc, obj)
+                geometryCache.invalidate(obj)
             continue
 
         if hasattr(obj, "sourceFile") and a2plib.to_str(
@@ -904,18 +1008,8 @@ def updateImportedParts(doc, partial=False):
                 )
             if absPath != None and os.path.exists(absPath):
                 newPartCreationTime = os.path.getmtime(absPath)
-                if (
-                    newPartCreationTime > obj.timeLastImport
-                    or obj.a2p_Version != A2P_VERSION
-                    or a2plib.getRecalculateImportedParts()  # open always all parts as they could depend on spreadsheets
-                ):
-                    cacheKeyExtension = obj.sourcePart
-                    if cacheKeyExtension is None:
-                        cacheKeyExtension = "AllShapes"
-                    elif cacheKeyExtension == "":
-                        cacheKeyExtension = "AllShapes"
-                    cacheKeyExtension = "-" + cacheKeyExtension
-                    cacheKey = absPath + cacheKeyExtension
+                if isStaleImport(obj, absPath):
+                    cacheKey = updateCacheKey(absPath, obj.sourcePart)
 
                     if not objectCache.isCached(
                         cacheKey
@@ -946,6 +1040,7 @@ def updateImportedParts(doc, partial=False):
                     # save Placement because following newObject.Shape.copy() isn't resetting it to zeroes...
                     savedPlacement = obj.Placement
                     obj.Shape = newObject.Shape.copy()
+                    geometryCache.invalidate(obj)
                     if a2plib.isA2pSketch(obj):
                         pass
                     else:
@@ -961,6 +1056,7 @@ def updateImportedParts(doc, partial=False):
     if sub != None:
         sub.showMaximized()
     objectCache.cleanUp(doc)
+    a2plib.clear_surface_fit_cache()  # drop the fits of the replaced shapes
     a2p_solversystem.autoSolveConstraints(
         doc, useTransaction=False, callingFuncName="updateImportedParts"
     )  # transaction is already open...
@@ -1389,6 +1485,8 @@ class ConstrainedPartsMover:
             "SoKeyboardEvent", self.KeyboardEvent
         )
         self.motionActivated = False
+        self.dragSession = None
+        self.framePending = False
 
     def setPreselection(self, doc, obj, sub):
         if not self.motionActivated:
@@ -1407,22 +1505,27 @@ class ConstrainedPartsMover:
     def onMouseMove(self, info):
         if self.obj is None:
             return
-        if self.motionActivated:
+        if self.motionActivated and self.dragSession is not None:
             newPos = self.view.getPoint(*info["Position"])
-            self.obj.Placement.Base = newPos
-            a2plib.setSimulationState(True)
-            systemSolved = a2p_solversystem.solveConstraints(
-                self.doc, useTransaction=False
+            self.dragSession.setTarget(newPos)
+            # mouse events arriving until the timer fires only update the target
+            if not self.framePending:
+                self.framePending = True
+                QtCore.QTimer.singleShot(0, self.solveFrame)
+
+    def solveFrame(self):
+        self.framePending = False
+        if self.dragSession is None:
+            return
+        if self.dragSession.solveFrame() == False:
+            self.dragSession = None
+            self.doc.commitTransaction()
+            QtGui.QMessageBox.information(
+                QtGui.QApplication.activeWindow(),
+                "Animation problem detected",
+                "Use system undo if necessary.",
             )
-            a2plib.setSimulationState(False)
-            if systemSolved == False:
-                self.doc.commitTransaction()
-                QtGui.QMessageBox.information(
-                    QtGui.QApplication.activeWindow(),
-                    "Animation problem detected",
-                    "Use system undo if necessary.",
-                )
-                self.removeCallbacks()
+            self.removeCallbacks()
 
     def removeCallbacks(self):
         self.view.removeEventCallback("SoLocation2Event", self.callbackMove)
@@ -1446,16 +1549,18 @@ class ConstrainedPartsMover:
                 self.motionActivated = not self.motionActivated
                 if self.motionActivated == True:
                     self.doc.openTransaction("drag constrained parts")
+                    self.dragSession = DragSession(self.doc, self.obj)
                 if self.motionActivated == False:
                     # Solve last time with high accuracy to finish
-                    a2plib.setSimulationState(False)
-                    a2p_solversystem.solveConstraints(self.doc, useTransaction=False)
+                    self.dragSession.finish()
+                    self.dragSession = None
                     self.doc.commitTransaction()
                     self.removeCallbacks()
 
     def KeyboardEvent(self, info):
         doc = FreeCAD.activeDocument()
         if info["State"] == "UP" and info["Key"] == "ESCAPE":
+            self.dragSession = None
             doc.commitTransaction()
             self.removeCallbacks()
 
@@ -2275,28 +2380,8 @@ def importUpdateConstraintSubobjects(doc, oldObject, newObject):
     deletionList = []  # for broken constraints
     if hasattr(oldObject, "muxInfo"):
         if hasattr(newObject, "muxInfo"):
-            #
-            oldVertexNames = []
-            oldEdgeNames = []
-            oldFaceNames = []
-            for item in oldObject.muxInfo:
-                if item[:1] == "V":
-                    oldVertexNames.append(item)
-                if item[:1] == "E":
-                    oldEdgeNames.append(item)
-                if item[:1] == "F":
-                    oldFaceNames.append(item)
-            #
-            newVertexNames = []
-            newEdgeNames = []
-            newFaceNames = []
-            for item in newObject.muxInfo:
-                if item[:1] == "V":
-                    newVertexNames.append(item)
-                if item[:1] == "E":
-                    newEdgeNames.append(item)
-                if item[:1] == "F":
-                    newFaceNames.append(item)
+            oldMuxInfo = a2p_muxinfo.getMuxInfo(oldObject)
+            newMuxInfo = a2p_muxinfo.getMuxInfo(newObject)
             #
             partName = oldObject.Name
             for c in doc.Objects:
@@ -2311,39 +2396,18 @@ def importUpdateConstraintSubobjects(doc, oldObject, newObject):
                     if SubElement:  # same as subElement <> None
 
                         subElementName = getattr(c, SubElement)
-                        if subElementName[:4] == "Face":
-                            try:
-                                oldIndex = int(subElementName[4:]) - 1
-                                oldConstraintString = oldFaceNames[oldIndex]
-                                newIndex = newFaceNames.index(oldConstraintString)
-                                newSubElementName = "Face" + str(newIndex + 1)
-                            except:
-                                newIndex = -1
-                                newSubElementName = "INVALID"
-
-                        elif subElementName[:4] == "Edge":
-                            try:
-                                oldIndex = int(subElementName[4:]) - 1
-                                oldConstraintString = oldEdgeNames[oldIndex]
-                                newIndex = newEdgeNames.index(oldConstraintString)
-                                newSubElementName = "Edge" + str(newIndex + 1)
-                            except:
-                                newIndex = -1
-                                newSubElementName = "INVALID"
-
-                        elif subElementName[:6] == "Vertex":
-                            try:
-                                oldIndex = int(subElementName[6:]) - 1
-                                oldConstraintString = oldVertexNames[oldIndex]
-                                newIndex = newVertexNames.index(oldConstraintString)
-                                newSubElementName = "Vertex" + str(newIndex + 1)
-                            except:
-                                newIndex = -1
-                                newSubElementName = "INVALID"
-
-                        else:
+                        kind, oldIndex = a2p_muxinfo.splitSubElementName(
+                            subElementName
+                        )
+                        oldConstraintString = oldMuxInfo.getName(kind, oldIndex)
+                        newIndex = newMuxInfo.getIndex(kind, oldConstraintString)
+                        if newIndex is None:
                             newIndex = -1
                             newSubElementName = "INVALID"
+                        else:
+                            newSubElementName = a2p_muxinfo.makeSubElementName(
+                                kind, newIndex
+                            )
 
                         if newIndex >= 0:
                             setattr(c, SubElement, newSubElementName)
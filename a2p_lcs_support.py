@@ -95,8 +95,9 @@ class VP_LCS_Group(object):
 
 
 # ==============================================================================
-def getListOfLCS(targetDoc, sourceDoc):
-    lcsOut = []
+def getLCSPlacements(sourceDoc):
+    """global placements of the coordinate systems of sourceDoc"""
+    placements = []
     for sourceOb in sourceDoc.Objects:
         if (
             sourceOb.Name.startswith("Local_CS")
@@ -104,9 +105,21 @@ def getListOfLCS(targetDoc, sourceDoc):
             or sourceOb.Name.startswith("a2pLCS")
             or sourceOb.Name.startswith("PartDesign__CoordinateSystem")
         ):
-            newLCS = targetDoc.addObject("PartDesign::CoordinateSystem", "a2pLCS")
-            pl = sourceOb.getGlobalPlacement()
-            newLCS.Placement = pl
-            newLCS.setEditorMode("Placement", 1)  # read-only # KBWBE: does not work...
-            lcsOut.append(newLCS)
+            placements.append(sourceOb.getGlobalPlacement())
+    return placements
+
+
+# ==============================================================================
+def createLCS(targetDoc, placements):
+    lcsOut = []
+    for pl in placements:
+        newLCS = targetDoc.addObject("PartDesign::CoordinateSystem", "a2pLCS")
+        newLCS.Placement = pl
+        newLCS.setEditorMode("Placement", 1)  # read-only # KBWBE: does not work...
+        lcsOut.append(newLCS)
     return lcsOut
+
+
+# ==============================================================================
+def getListOfLCS(targetDoc, sourceDoc):
+    return createLCS(targetDoc, getLCSPlacements(sourceDoc))
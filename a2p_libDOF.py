@@ -22,11 +22,12 @@
 # *                                                                         *
 # ***************************************************************************
 
-import FreeCAD, FreeCADGui, Part
+import FreeCAD, FreeCADGui
 from FreeCAD import Base
 from PySide import QtGui, QtCore
 
 from a2p_translateUtils import *
+from a2p_mathcore import planeDirections
 
 
 """
@@ -130,11 +131,12 @@ def make_planeNormal(axisa, dbg=False):
     """
     axis1 = copynorm_AxisToOrigin(axisa)
 
-    planenormal = Part.makePlane(1.0, 1.0, axis1.Base, axis1.Direction)
+    # only the plane spanned by both axes is used, see normal_2Axis()
+    xDir, yDir = planeDirections(axis1.Direction)
     freeAx1 = FreeCAD.Axis()
     freeAx2 = FreeCAD.Axis()
-    freeAx1.Direction = FreeCAD.Vector(planenormal.Vertexes[2].Point)
-    freeAx2.Direction = FreeCAD.Vector(planenormal.Vertexes[1].Point)
+    freeAx1.Direction = FreeCAD.Vector(xDir.x, xDir.y, xDir.z)
+    freeAx2.Direction = FreeCAD.Vector(yDir.x, yDir.y, yDir.z)
     return [copynorm_AxisToOrigin(freeAx1), copynorm_AxisToOrigin(freeAx2)]
 
 
@@ -0,0 +1,324 @@
+# ***************************************************************************
+# *                                                                         *
+# *   Copyright (c) 2018 kbwbe                                              *
+# *                                                                         *
+# *   This program is free software; you can redistribute it and/or modify  *
+# *   it under the terms of the GNU Lesser General Public License (LGPL)    *
+# *   as published by the Free Software Foundation; either version 2 of     *
+# *   the License, or (at your option) any later version.                   *
+# *   for detail see the LICENCE text file.                                 *
+# *                                                                         *
+# *   This program is distributed in the hope that it will be useful,       *
+# *   but WITHOUT ANY WARRANTY; without even the implied warranty of        *
+# *   MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the         *
+# *   GNU Library General Public License for more details.                  *
+# *                                                                         *
+# *   You should have received a copy of the GNU Library General Public     *
+# *   License along with this program; if not, write to the Free Software   *
+# *   Foundation, Inc., 59 Temple Place, Suite 330, Boston, MA  02111-1307  *
+# *   USA                                                                   *
+# *                                                                         *
+# ***************************************************************************
+
+
+"""
+FreeCAD-free vector, rotation, placement and axis types.
+
+Only the operations used by the solver are implemented, with the same
+semantics as FreeCAD.Vector, FreeCAD.Rotation, FreeCAD.Placement and
+FreeCAD.Axis (angles of constructors in degrees, Rotation.Angle in
+radians, Vector.multiply/normalize working in place). This allows to
+run the solver on a serialized problem without importing FreeCAD,
+see a2p_solverproblem.
+"""
+
+import math
+
+VECTOR_EPSILON = 2.220446049250313e-16
+
+
+# ------------------------------------------------------------------------------
+class Vector(object):
+    __slots__ = ("x", "y", "z")
+
+    def __init__(self, x=0.0, y=0.0, z=0.0):
+        if isinstance(x, (tuple, list)):
+            x, y, z = x
+        elif hasattr(x, "x"):
+            x, y, z = x.x, x.y, x.z
+        self.x = float(x)
+        self.y = float(y)
+        self.z = float(z)
+
+    def __repr__(self):
+        return "Vector ({}, {}, {})".format(self.x, self.y, self.z)
+
+    def __eq__(self, other):
+        return (
+            isinstance(other, Vector)
+            and self.x == other.x
+            and self.y == other.y
+            and self.z == other.z
+        )
+
+    def __ne__(self, other):
+        return not self.__eq__(other)
+
+    __hash__ = None
+
+    def __iter__(self):
+        return iter((self.x, self.y, self.z))
+
+    def __add__(self, other):
+        return self.add(other)
+
+    def __sub__(self, other):
+        return self.sub(other)
+
+    def __neg__(self):
+        return Vector(-self.x, -self.y, -self.z)
+
+    def __mul__(self, other):
+        """Vector * Vector is the dot product, Vector * float scales"""
+        if isinstance(other, Vector):
+            return self.dot(other)
+        return Vector(self.x * other, self.y * other, self.z * other)
+
+    __rmul__ = __mul__
+
+    def add(self, other):
+        return Vector(self.x + other.x, self.y + other.y, self.z + other.z)
+
+    def sub(self, other):
+        return Vector(self.x - other.x, self.y - other.y, self.z - other.z)
+
+    def negative(self):
+        return -self
+
+    def multiply(self, factor):
+        """scale in place, returns self"""
+        self.x *= factor
+        self.y *= factor
+        self.z *= factor
+        return self
+
+    def dot(self, other):
+        return self.x * other.x + self.y * other.y + self.z * other.z
+
+    def cross(self, other):
+        return Vector(
+            self.y * other.z - self.z * other.y,
+            self.z * other.x - self.x * other.z,
+            self.x * other.y - self.y * other.x,
+        )
+
+    @property
+    def Length(self):
+        return math.sqrt(self.x * self.x + self.y * self.y + self.z * self.z)
+
+    @Length.setter
+    def Length(self, length):
+        current = self.Length
+        if current < VECTOR_EPSILON:
+            raise ValueError("Cannot set length of null vector")
+        self.multiply(length / current)
+
+    def normalize(self):
+        """normalize in place, returns self"""
+        length = self.Length
+        if length < VECTOR_EPSILON:
+            raise ValueError("Cannot normalize null vector")
+        return self.multiply(1.0 / length)
+
+    def getAngle(self, other):
+        """angle in radians"""
+        divid = self.Length * other.Length
+        if divid < 1.0e-10:
+            return 1.7976931348623157e308
+        dot = self.dot(other) / divid
+        return math.acos(max(-1.0, min(1.0, dot)))
+
+    def distanceToLine(self, base, direction):
+        d = Vector(direction)
+        d.normalize()
+        v = self.sub(base)
+        return v.cross(d).Length
+
+    def toTuple(self):
+        return (self.x, self.y, self.z)
+
+
+# ------------------------------------------------------------------------------
+class Rotation(object):
+    """unit quaternion (x, y, z, w)"""
+
+    __slots__ = ("q",)
+
+    def __init__(self, *args):
+        if len(args) == 0:
+            self.q = (0.0, 0.0, 0.0, 1.0)
+        elif len(args) == 1:
+            other = args[0]
+            if isinstance(other, Rotation):
+                self.q = other.q
+            else:
+                self.q = tuple(float(v) for v in other)  # (x, y, z, w)
+        elif len(args) == 2:
+            axis, angle = args  # angle in degrees
+            axis = Vector(axis)
+            length = axis.Length
+            if length < VECTOR_EPSILON:
+                self.q = (0.0, 0.0, 0.0, 1.0)
+                return
+            half = math.radians(angle) / 2.0
+            s = math.sin(half) / length
+            self.q = (axis.x * s, axis.y * s, axis.z * s, math.cos(half))
+        elif len(args) == 4:
+            x, y, z, w = (float(v) for v in args)
+            norm = math.sqrt(x * x + y * y + z * z + w * w)
+            self.q = (x / norm, y / norm, z / norm, w / norm)
+        else:
+            raise TypeError("Rotation() takes 0, 1, 2 or 4 arguments")
+
+    def __repr__(self):
+        return "Rotation ({}, {}, {}, {})".format(*self.q)
+
+    @property
+    def Q(self):
+        return self.q
+
+    @property
+    def Angle(self):
+        """angle in radians"""
+        w = max(-1.0, min(1.0, self.q[3]))
+        return 2.0 * math.acos(w)
+
+    @property
+    def Axis(self):
+        x, y, z, w = self.q
+        s = math.sqrt(x * x + y * y + z * z)
+        if s < VECTOR_EPSILON:
+            return Vector(0.0, 0.0, 1.0)
+        return Vector(x / s, y / s, z / s)
+
+    def multVec(self, v):
+        x, y, z, w = self.q
+        # v' = v + 2w(q x v) + 2 q x (q x v)
+        tx = 2.0 * (y * v.z - z * v.y)
+        ty = 2.0 * (z * v.x - x * v.z)
+        tz = 2.0 * (x * v.y - y * v.x)
+        return Vector(
+            v.x + w * tx + (y * tz - z * ty),
+            v.y + w * ty + (z * tx - x * tz),
+            v.z + w * tz + (x * ty - y * tx),
+        )
+
+    def multiply(self, other):
+        """self * other, other is applied first"""
+        x1, y1, z1, w1 = self.q
+        x2, y2, z2, w2 = other.q
+        return Rotation(
+            w1 * x2 + x1 * w2 + y1 * z2 - z1 * y2,
+            w1 * y2 - x1 * z2 + y1 * w2 + z1 * x2,
+            w1 * z2 + x1 * y2 - y1 * x2 + z1 * w2,
+            w1 * w2 - x1 * x2 - y1 * y2 - z1 * z2,
+        )
+
+    def inverted(self):
+        x, y, z, w = self.q
+        return Rotation(-x, -y, -z, w)
+
+    def inverse(self):
+        return self.inverted()
+
+
+# ------------------------------------------------------------------------------
+class Placement(object):
+    """x' = Rotation * (x - center) + center + Base"""
+
+    __slots__ = ("Base", "Rotation")
+
+    def __init__(self, base=None, rotation=None, center=None):
+        if isinstance(base, Placement):
+            rotation = base.Rotation
+            base = base.Base
+        self.Base = Vector(base) if base is not None else Vector()
+        self.Rotation = Rotation(rotation) if rotation is not None else Rotation()
+        if center is not None:
+            center = Vector(center)
+            self.Base = self.Base.add(center.sub(self.Rotation.multVec(center)))
+
+    def __repr__(self):
+        return "Placement [Pos={}, Rotation={}]".format(self.Base, self.Rotation)
+
+    def multVec(self, v):
+        return self.Rotation.multVec(v).add(self.Base)
+
+    def multiply(self, other):
+        """self * other, other is applied first"""
+        return Placement(
+            self.multVec(other.Base), self.Rotation.multiply(other.Rotation)
+        )
+
+    def inverse(self):
+        rotation = self.Rotation.inverted()
+        return Placement(-rotation.multVec(self.Base), rotation)
+
+    def copy(self):
+        return Placement(self)
+
+    def toTuple(self):
+        """(x, y, z, qx, qy, qz, qw)"""
+        return self.Base.toTuple() + self.Rotation.q
+
+    @staticmethod
+    def fromTuple(values):
+        return Placement(Vector(values[:3]), Rotation(*values[3:7]))
+
+
+# ------------------------------------------------------------------------------
+class Axis(object):
+    __slots__ = ("Base", "Direction")
+
+    def __init__(self, axis=None):
+        if axis is None:
+            self.Base = Vector()
+            self.Direction = Vector(0.0, 0.0, 1.0)
+        else:
+            self.Base = Vector(axis.Base)
+            self.Direction = Vector(axis.Direction)
+
+    def __repr__(self):
+        return "Axis [Base={}, Direction={}]".format(self.Base, self.Direction)
+
+    def move(self, vector):
+        self.Base = self.Base.add(vector)
+
+
+# ------------------------------------------------------------------------------
+def planeDirections(normal):
+    """
+    two orthonormal directions within the plane normal to normal.
+    The first one is the X direction OpenCascade chooses for gp_Ax3(P, normal).
+    """
+    n = Vector(normal)
+    n.normalize()
+    a, b, c = abs(n.x), abs(n.y), abs(n.z)
+    if b <= a and b <= c:
+        if a > c:
+            xDir = Vector(-n.z, 0.0, n.x)
+        else:
+            xDir = Vector(n.z, 0.0, -n.x)
+    elif a <= b and a <= c:
+        if b > c:
+            xDir = Vector(0.0, -n.z, n.y)
+        else:
+            xDir = Vector(0.0, n.z, -n.y)
+    else:
+        if a > b:
+            xDir = Vector(-n.y, n.x, 0.0)
+        else:
+            xDir = Vector(n.y, -n.x, 0.0)
+    xDir.normalize()
+    yDir = n.cross(xDir)
+    return xDir, yDir
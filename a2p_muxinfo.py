@@ -0,0 +1,107 @@
+# ***************************************************************************
+# *                                                                         *
+# *   Copyright (c) 2018 kbwbe                                              *
+# *                                                                         *
+# *   This program is free software; you can redistribute it and/or modify  *
+# *   it under the terms of the GNU Lesser General Public License (LGPL)    *
+# *   as published by the Free Software Foundation; either version 2 of     *
+# *   the License, or (at your option) any later version.                   *
+# *   for detail see the LICENCE text file.                                 *
+# *                                                                         *
+# *   This program is distributed in the hope that it will be useful,       *
+# *   but WITHOUT ANY WARRANTY; without even the implied warranty of        *
+# *   MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the         *
+# *   GNU Library General Public License for more details.                  *
+# *                                                                         *
+# *   You should have received a copy of the GNU Library General Public     *
+# *   License along with this program; if not, write to the Free Software   *
+# *   Foundation, Inc., 59 Temple Place, Suite 330, Boston, MA  02111-1307  *
+# *   USA                                                                   *
+# *                                                                         *
+# ***************************************************************************
+
+
+"""
+Indexed access to the muxInfo of a2p objects.
+
+The property muxInfo is a flat list of toponames ("V;...", "E;...",
+"F;...", optionally separated by "[VERTEXES]", "[EDGES]" and "[FACES]").
+MuxInfo splits it once into a list of names per kind of subelement and
+builds the reverse lookup name -> index on first use, so mapping a
+subelement name of an old shape to the new one is O(1).
+
+getMuxInfo() keeps the MuxInfo of an importPart in its Proxy until the
+property muxInfo changes.
+"""
+
+# kind of toponame (first char) per subelement prefix
+SUBELEMENT_KINDS = (("Vertex", "V"), ("Edge", "E"), ("Face", "F"))
+
+
+# ------------------------------------------------------------------------------
+class MuxInfo(object):
+    def __init__(self, items=()):
+        self.items = list(items)  # in property format
+        self.names = {"V": [], "E": [], "F": []}
+        for item in self.items:
+            names = self.names.get(item[:1])
+            if names is not None:
+                names.append(item)
+        self.indexes = None  # kind: {name: index}, built by getIndex()
+
+    def __len__(self):
+        return len(self.items)
+
+    def toList(self):
+        """muxInfo in property format"""
+        return list(self.items)
+
+    def getName(self, kind, index):
+        """toponame of subelement index (zero based) of kind, or None"""
+        names = self.names.get(kind)
+        if names is None or index < 0 or index >= len(names):
+            return None
+        return names[index]
+
+    def getIndex(self, kind, name):
+        """zero based index of the first subelement named name, or None"""
+        if self.indexes is None:
+            self.indexes = {}
+            for k, names in self.names.items():
+                index = {}
+                for i, n in enumerate(names):
+                    index.setdefault(n, i)
+                self.indexes[k] = index
+        return self.indexes.get(kind, {}).get(name)
+
+
+# ------------------------------------------------------------------------------
+def splitSubElementName(subElementName):
+    """'Face12' -> ('F', 11), (None, -1) if it is no valid subelement name"""
+    for prefix, kind in SUBELEMENT_KINDS:
+        if subElementName.startswith(prefix):
+            try:
+                return kind, int(subElementName[len(prefix) :]) - 1
+            except ValueError:
+                return None, -1
+    return None, -1
+
+
+def makeSubElementName(kind, index):
+    """('F', 11) -> 'Face12'"""
+    for prefix, k in SUBELEMENT_KINDS:
+        if k == kind:
+            return prefix + str(index + 1)
+    return None
+
+
+# ------------------------------------------------------------------------------
+def getMuxInfo(obj):
+    """
+    MuxInfo of obj.muxInfo, cached by the Proxy of importParts
+    (see Proxy_importPart.getMuxInfo)
+    """
+    proxy = getattr(obj, "Proxy", None)
+    if hasattr(proxy, "getMuxInfo"):
+        return proxy.getMuxInfo(obj)
+    return MuxInfo(obj.muxInfo)
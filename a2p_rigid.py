@@ -49,6 +49,7 @@ from a2plib import (
     PARTIAL_SOLVE_STAGE1,
 )
 import a2p_libDOF
+import a2p_dofengine
 
 from a2p_libDOF import SystemOrigin, SystemXAxis, SystemYAxis, SystemZAxis
 import os, sys
@@ -73,9 +74,11 @@ class Rigid:
         self.placement = placement
         self.debugMode = debugMode
         self.savedPlacement = placement
+        self.index = None  # index within the SolverGraph
         self.dependencies = []
+        self.activeDependencies = None  # see collectActiveDependencies()
         self.linkedRigids = []
-        self.hierarchyLinkedRigids = []
+        self.linkedRigidsSet = set()  # same as linkedRigids, for fast lookups
         self.depsPerLinkedRigids = {}  # dict for each linked obj as key, the value
         # is an array with all dep related to it
         self.dofPOSPerLinkedRigids = (
@@ -109,9 +112,31 @@ class Rigid:
 
     def prepareRestart(self):
         self.tempfixed = self.fixed
+        self.activeDependencies = None
         for d in self.dependencies:
             d.disable()
 
+    def rebase(self, solver):
+        """
+        reset the state of an accuracy level, as a freshly loaded Rigid
+        at the current placement would have, without any document access
+        """
+        self.tempfixed = self.fixed
+        self.moved = False
+        self.savedPlacement = self.placement
+        self.spin = None
+        self.moveVectorSum = None
+        self.maxPosError = 0.0
+        self.maxAxisError = 0.0
+        self.maxSingleAxisError = 0.0
+        self.countSpinVectors = 0
+        self.activeDependencies = None
+        for dep in self.dependencies:
+            dep.disable()
+            dep.rebase(solver)
+        self.calcSpinCenter()
+        self.calcRefPointsBoundBoxSize()
+
     def countDependencies(self):
         return len(self.dependencies)
 
@@ -119,37 +144,12 @@ class Rigid:
         for dep in self.dependencies:
             dep.enable(workList)
 
-    # The function only sets parentship for childrens that are distant+1 from fixed rigid
-    # The function should be called in a loop with increased distance until it return False
-    def assignParentship(self, distance):
-        # Current rigid was already set, pass the call to childrens
-        if self.disatanceFromFixed < distance:
-            haveMore = False
-            for rig in self.childRigids:
-                if rig.assignParentship(distance):
-                    haveMore = True
-            return haveMore
-        elif self.disatanceFromFixed == distance:
-            while len(self.hierarchyLinkedRigids) > 0:
-                rig = self.hierarchyLinkedRigids[0]
-                # Got to a new rigid, set current as it's father
-                if rig.disatanceFromFixed is None:
-                    rig.parentRigids.append(self)
-                    self.childRigids.append(rig)
-                    rig.hierarchyLinkedRigids.remove(self)
-                    self.hierarchyLinkedRigids.remove(rig)
-                    rig.disatanceFromFixed = distance + 1
-                # That child was already assigned by another (and closer to fixed) father
-                # Leave only child relationship, but don't add current as a father
-                else:
-                    self.childRigids.append(rig)
-                    rig.hierarchyLinkedRigids.remove(self)
-                    self.hierarchyLinkedRigids.remove(rig)
-
-            if len(self.childRigids) + len(self.hierarchyLinkedRigids) > 0:
-                return True
-            else:
-                return False
+    def collectActiveDependencies(self):
+        """
+        keep the enabled dependencies, calcMoveData() only evaluates
+        these. Disabled dependencies do not cause any movement.
+        """
+        self.activeDependencies = [dep for dep in self.dependencies if dep.Enabled]
 
     def printHierarchy(self, level):
         Msg((level * 3) * " ")
@@ -197,11 +197,16 @@ class Rigid:
         for d in self.dependencies:
             d.clear()
         self.dependencies = []
+        self.activeDependencies = None
         self.superRigid = None
 
     def applySolution(self, doc, solver):
         if self.tempfixed or self.fixed:
             return
+        if not solver.writePlacements:
+            # written later at once, see SolverSystem.writePendingPlacements()
+            solver.pendingPlacements[self.objectName] = Base.Placement(self.placement)
+            return
 
         # Update FreeCAD's placements if deltaPlacement above Tolerances
         base1 = self.placement.Base
@@ -343,8 +348,11 @@ class Rigid:
         self.countSpinVectors = 0
         self.moveVectorSum = Base.Vector(0, 0, 0)
         self.spin = None
+        dependencies = self.activeDependencies
+        if dependencies is None:
+            dependencies = self.dependencies
 
-        for dep in self.dependencies:
+        for dep in dependencies:
             refPoint, moveVector = dep.getMovement()
             if refPoint is None or moveVector is None:
                 continue  # Should not happen
@@ -414,7 +422,7 @@ class Rigid:
             if self.spin == None:
                 self.spin = Base.Vector(0, 0, 0)
 
-            for dep in self.dependencies:
+            for dep in dependencies:
                 rotation = dep.getRotation(solver)
                 if rotation is None:
                     continue  # No rotation for that dep
@@ -479,6 +487,12 @@ class Rigid:
         update whole DOF of the rigid (useful for animation and get the number
         useful to determine if an object is fully constrained
         """
+        if a2plib.getUseAnalyticDOF():
+            info = a2p_dofengine.rigidDOF(self)
+            self.posDOF = info.freeTranslations
+            self.rotDOF = info.freeRotations
+            self.currentDOFCount = info.dof
+            return self.currentDOFCount
         self.pointConstraints = []
         _dofPos = a2p_libDOF.initPosDOF
         _dofRot = a2p_libDOF.initRotDOF
@@ -497,7 +511,7 @@ class Rigid:
         return self.currentDOFCount
 
     def isFullyConstrainedByRigid(self, rig):
-        if rig not in self.linkedRigids:
+        if rig not in self.linkedRigidsSet:
             return False
         dofPOS = self.dofPOSPerLinkedRigids[rig]
         dofROT = self.dofROTPerLinkedRigids[rig]
@@ -506,6 +520,15 @@ class Rigid:
         return False
 
     def isFullyConstrainedByFixedRigids(self):
+        if a2plib.getUseAnalyticDOF():
+            if len(self.dependencies) == 0:
+                return False
+            fixedRigids = set(
+                dep.dependedRigid
+                for dep in self.dependencies
+                if dep.dependedRigid.tempfixed
+            )
+            return a2p_dofengine.rigidDOF(self, fixedRigids).dof == 0
         _dofPos = a2p_libDOF.initPosDOF
         _dofRot = a2p_libDOF.initRotDOF
         self.reorderDependencies()
@@ -523,6 +546,15 @@ class Rigid:
             return True
 
     def linkedTempFixedDOF(self):
+        if a2plib.getUseAnalyticDOF():
+            if self.tempfixed:
+                return 0
+            fixedRigids = set(
+                dep.dependedRigid
+                for dep in self.dependencies
+                if dep.dependedRigid.tempfixed
+            )
+            return a2p_dofengine.rigidDOF(self, fixedRigids).dof
         # pointConstraints = []
         _dofPos = a2p_libDOF.initPosDOF
         _dofRot = a2p_libDOF.initRotDOF
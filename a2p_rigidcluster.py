@@ -0,0 +1,239 @@
+# ***************************************************************************
+# *                                                                         *
+# *   Copyright (c) 2018 kbwbe                                              *
+# *                                                                         *
+# *   This program is free software; you can redistribute it and/or modify  *
+# *   it under the terms of the GNU Lesser General Public License (LGPL)    *
+# *   as published by the Free Software Foundation; either version 2 of     *
+# *   the License, or (at your option) any later version.                   *
+# *   for detail see the LICENCE text file.                                 *
+# *                                                                         *
+# *   This program is distributed in the hope that it will be useful,       *
+# *   but WITHOUT ANY WARRANTY; without even the implied warranty of        *
+# *   MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the         *
+# *   GNU Library General Public License for more details.                  *
+# *                                                                         *
+# *   You should have received a copy of the GNU Library General Public     *
+# *   License along with this program; if not, write to the Free Software   *
+# *   Foundation, Inc., 59 Temple Place, Suite 330, Boston, MA  02111-1307  *
+# *   USA                                                                   *
+# *                                                                         *
+# ***************************************************************************
+
+
+"""
+Collapsing of rigid clusters.
+
+Rigids which fully constrain each other (no relative DOF, see
+Rigid.isFullyConstrainedByRigid, confirmed by the rank of their
+dependencies, see a2p_dofengine) form a cluster. Each cluster with more
+than one rigid is replaced in the SolverSystem by a SuperRigid, which
+carries the dependencies of the members to rigids outside the cluster.
+Dependencies inside the cluster are not solved anymore. After solving,
+the members get their placements back from the SuperRigid.
+
+Before collapsing, every member is placed relative to its cluster
+neighbour in closed form (a2p_snapsolver). A pair which can not be
+placed so, is not part of a cluster, and a cluster whose inner
+dependencies are not fulfilled afterwards is not collapsed.
+"""
+
+from collections import deque
+from a2p_rigid import Rigid
+import a2p_dofengine
+import a2p_snapsolver
+
+
+# ------------------------------------------------------------------------------
+class SuperRigid(Rigid):
+    """
+    A Rigid standing for the rigids of a cluster. It has objectName and
+    label of its root member, the fixed member if there is one.
+    """
+
+    def __init__(self, root, members):
+        Rigid.__init__(
+            self, root.objectName, root.label, root.fixed, root.placement, root.debugMode
+        )
+        self.members = members
+        memberSet = set(members)
+        inverse = root.placement.inverse()
+        # placement of each member relative to the SuperRigid
+        self.relativePlacements = {}
+        for member in members:
+            relative = inverse.multiply(member.placement)
+            self.relativePlacements[member] = relative
+            member.superRigid = self
+            for dep in member.dependencies:
+                if dep.dependedRigid in memberSet:
+                    continue
+                dep.currentRigid = self
+                dep.foreignDependency.dependedRigid = self
+                # local frame of the member -> local frame of the SuperRigid
+                dep.localRefPoint = relative.multVec(dep.localRefPoint)
+                if dep.localRefAxisEnd is not None:
+                    dep.localRefAxisEnd = relative.multVec(dep.localRefAxisEnd)
+                if dep.localOffsetDirection is not None:
+                    dep.localOffsetDirection = relative.Rotation.multVec(
+                        dep.localOffsetDirection
+                    )
+                self.dependencies.append(dep)
+        self.spinCenter = root.spinCenter
+
+    def expand(self):
+        """set the placements of the members from the SuperRigid"""
+        for member in self.members:
+            member.placement = self.placement.multiply(
+                self.relativePlacements[member]
+            )
+
+    def applySolution(self, doc, solver):
+        # the members of a fixed SuperRigid can have been moved by
+        # findClusters(), see collapseClusters()
+        if self.tempfixed and not self.fixed:
+            return
+        self.expand()
+        for member in self.members:
+            member.applySolution(doc, solver)
+
+    def clear(self):
+        for member in self.members:
+            member.clear()
+        self.dependencies = []
+        self.activeDependencies = None
+        self.superRigid = None
+
+
+# ------------------------------------------------------------------------------
+def pairDependencies(rig, neighbour):
+    return [dep for dep in rig.dependencies if dep.dependedRigid is neighbour]
+
+
+def isRigidPair(rig, neighbour):
+    """
+    the counted DOF of isFullyConstrainedByRigid() are an estimate, a
+    cluster needs the exact rank of the dependencies of the pair
+    """
+    if not (
+        rig.isFullyConstrainedByRigid(neighbour)
+        or neighbour.isFullyConstrainedByRigid(rig)
+    ):
+        return False
+    return a2p_dofengine.rigidDOF(neighbour, {rig}).dof == 0
+
+
+def findClusters(rigids):
+    """
+    lists of rigids, each fully constrained by a neighbour of the same
+    list, placed by a2p_snapsolver relative to it. The first rigid of a
+    list is its root. Clusters grow from fixed rigids first.
+    """
+    clustered = set()
+    clusters = []
+    seeds = [rig for rig in rigids if rig.fixed] + [
+        rig for rig in rigids if not rig.fixed
+    ]
+    for seed in seeds:
+        if seed in clustered:
+            continue
+        clustered.add(seed)
+        cluster = [seed]
+        steps = []
+        queue = deque([seed])
+        while queue:
+            rig = queue.popleft()
+            for neighbour in rig.linkedRigids:
+                if neighbour in clustered or neighbour.fixed:
+                    continue
+                if not isRigidPair(rig, neighbour):
+                    continue
+                step = a2p_snapsolver.getSnapPlacement(pairDependencies(neighbour, rig))
+                if step is None:
+                    continue
+                neighbour.applyPlacementStep(step)
+                steps.append((neighbour, step))
+                clustered.add(neighbour)
+                cluster.append(neighbour)
+                queue.append(neighbour)
+        if len(cluster) > 1:
+            clusters.append((cluster, steps))
+    return clusters
+
+
+def isConsistent(solver, doc, cluster):
+    """are all dependencies inside the cluster fulfilled?"""
+    members = solver.graph.createWorkList(cluster)
+    # a collapsed cluster stays rigid up to the last accuracy level
+    posAccuracy, spinAccuracy = min(
+        data[:2] for data in solver.getSolverControlData().values()
+    )
+    consistent = True
+    for rig in cluster:
+        rig.enableDependencies(members)
+    for rig in cluster:
+        rig.calcSpinBasicDataDepsEnabled()
+        rig.collectActiveDependencies()
+        rig.calcMoveData(doc, solver)
+        if not (
+            rig.maxPosError <= posAccuracy
+            and rig.maxAxisError <= spinAccuracy
+            and rig.maxSingleAxisError <= spinAccuracy * 10
+        ):
+            consistent = False
+    for rig in cluster:
+        for dep in rig.dependencies:
+            dep.disable()
+        rig.activeDependencies = None
+        rig.maxPosError = 0.0
+        rig.maxAxisError = 0.0
+        rig.maxSingleAxisError = 0.0
+        rig.calcSpinCenter()
+        rig.calcRefPointsBoundBoxSize()
+    return consistent
+
+
+def collapseClusters(solver, doc):
+    """
+    replace the clusters of the loaded solver by SuperRigids,
+    returns the number of collapsed rigids
+    """
+    superRigids = {}  # root -> SuperRigid
+    collapsed = 0
+    for cluster, steps in findClusters(solver.rigids):
+        if not isConsistent(solver, doc, cluster):
+            for rig, step in reversed(steps):
+                rig.applyPlacementStep(step.inverse())
+            continue
+        superRigids[cluster[0]] = SuperRigid(cluster[0], cluster)
+        collapsed += len(cluster)
+    if len(superRigids) == 0:
+        return 0
+
+    rigids = []
+    for rig in solver.rigids:
+        if rig in superRigids:
+            rigids.append(superRigids[rig])
+        elif rig.superRigid is None:
+            rigids.append(rig)
+    solver.graph.clear()
+    solver.rigids = []
+    for rig in rigids:
+        rig.linkedRigids = []
+        rig.linkedRigidsSet = set()
+        rig.depsPerLinkedRigids = {}
+        rig.dofPOSPerLinkedRigids = {}
+        rig.dofROTPerLinkedRigids = {}
+        solver.addRigid(rig)
+    for rig in rigids:
+        for dep in rig.dependencies:
+            solver.graph.link(rig, dep.dependedRigid)
+    for rig in superRigids.values():
+        for member in rig.members:
+            solver.graph.addAlias(member.objectName, rig)
+        rig.calcSpinCenter()
+        rig.calcRefPointsBoundBoxSize()
+        if rig.fixed:
+            # the members do not move anymore, write them at once
+            rig.applySolution(doc, solver)
+    solver.retrieveDOFInfo()
+    return collapsed
@@ -28,6 +28,7 @@ from PySide import QtGui
 
 from a2p_translateUtils import *
 import a2plib
+import a2p_conflictsearch
 import a2p_solversystem
 
 # ==============================================================================
@@ -35,20 +36,21 @@ import a2p_solversystem
 toolTipMessage = """
 Conflict finder tool:
 
-Resolves conflicting constraints by
-trying to solve them one after another
+Finds the first constraint, which can
+not be solved together with the constraints
+before it, and a minimal set of constraints
+it is conflicting with
 """
 
 
 class a2p_SearchConstraintConflictsCommand:
     """
-    Search conflicting constraints by solving them one after each other.
+    Search conflicting constraints, see a2p_conflictsearch
     """
 
     def Activated(self):
         doc = FreeCAD.activeDocument()
 
-        workList = []
         constraints = [obj for obj in doc.Objects if "ConstraintInfo" in obj.Content]
 
         if len(constraints) == 0:
@@ -61,17 +63,27 @@ class a2p_SearchConstraintConflictsCommand:
             )
             return
 
-        for c in constraints:
-            workList.append(c)
-            solved = a2p_solversystem.solveConstraints(
-                doc, matelist=workList, showFailMessage=False
+        search = a2p_conflictsearch.ConflictSearch(doc, constraints)
+        conflicting = search.run()
+        if len(search.brokenConstraints) > 0:
+            a2p_solversystem.SolverSystem().handleBrokenConstraints(
+                search.brokenConstraints
             )
-            if solved == False:
-                cMirrorName = c.ViewObject.Proxy.mirror_name
-                cmirror = doc.getObject(cMirrorName)
-                ob1 = doc.getObject(c.Object1)
-                ob2 = doc.getObject(c.Object2)
-                message = u"""
+            return
+        if len(conflicting) == 0:
+            return
+        c = search.firstConflictingConstraint
+        cMirrorName = c.ViewObject.Proxy.mirror_name
+        cmirror = doc.getObject(cMirrorName)
+        ob1 = doc.getObject(c.Object1)
+        ob2 = doc.getObject(c.Object2)
+        FreeCADGui.Selection.clearSelection()
+        for conflictingConstraint in conflicting:
+            FreeCADGui.Selection.addSelection(conflictingConstraint)
+        others = u"\n".join(
+            u"    {}".format(other.Label) for other in conflicting if other is not c
+        )
+        message = u"""
 The following constraint-pair is conflicting
 with previously defined constraints:
 
@@ -83,23 +95,24 @@ The constraint-pair belongs to the objects:
 object1: {}
 object2: {}
 
+It is conflicting with these (selected) constraints:
+{}
+
 Do you want to delete this constraint-pair?
 """.format(
-                    c.Label, cmirror.Label, ob1.Label, ob2.Label
-                )
-                flags = (
-                    QtGui.QMessageBox.StandardButton.Yes
-                    | QtGui.QMessageBox.StandardButton.No
-                )
-                response = QtGui.QMessageBox.information(
-                    QtGui.QApplication.activeWindow(),
-                    u"Searching for conflicting constraints",
-                    message,
-                    flags,
-                )
-                if response == QtGui.QMessageBox.Yes:
-                    a2plib.removeConstraint(c)
-                return
+            c.Label, cmirror.Label, ob1.Label, ob2.Label, others
+        )
+        flags = (
+            QtGui.QMessageBox.StandardButton.Yes | QtGui.QMessageBox.StandardButton.No
+        )
+        response = QtGui.QMessageBox.information(
+            QtGui.QApplication.activeWindow(),
+            u"Searching for conflicting constraints",
+            message,
+            flags,
+        )
+        if response == QtGui.QMessageBox.Yes:
+            a2plib.removeConstraint(c)
 
     def IsActive(self):
         if FreeCAD.activeDocument() is None:
@@ -0,0 +1,330 @@
+# ***************************************************************************
+# *                                                                         *
+# *   Copyright (c) 2018 kbwbe                                              *
+# *                                                                         *
+# *   This program is free software; you can redistribute it and/or modify  *
+# *   it under the terms of the GNU Lesser General Public License (LGPL)    *
+# *   as published by the Free Software Foundation; either version 2 of     *
+# *   the License, or (at your option) any later version.                   *
+# *   for detail see the LICENCE text file.                                 *
+# *                                                                         *
+# *   This program is distributed in the hope that it will be useful,       *
+# *   but WITHOUT ANY WARRANTY; without even the implied warranty of        *
+# *   MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the         *
+# *   GNU Library General Public License for more details.                  *
+# *                                                                         *
+# *   You should have received a copy of the GNU Library General Public     *
+# *   License along with this program; if not, write to the Free Software   *
+# *   Foundation, Inc., 59 Temple Place, Suite 330, Boston, MA  02111-1307  *
+# *   USA                                                                   *
+# *                                                                         *
+# ***************************************************************************
+
+
+"""
+Closed form placement of a rigid, which is fully constrained by one
+solved (tempfixed) neighbour.
+
+The rotation aligns the axes and the point patterns of the dependencies
+(Kabsch fit by SVD). If this determines only one direction, the rigid
+is turned onto it by the shortest rotation. The remaining rotation
+angle around it is kept, if the rotation is locked, otherwise it is
+solved together with the translation: the position conditions are
+linear in (cos, sin, translation), the solution is taken on the unit
+circle. Finally the translation is the least squares solution of the
+position conditions after rotating.
+
+getSnapPlacement() returns None if the dependencies do not determine the
+placement, the rigid has to be solved by iteration then.
+"""
+
+import numpy
+import FreeCAD
+from FreeCAD import Base
+
+SNAP_RANK_TOLERANCE = 1.0e-6  # relative to the largest singular value
+
+# dependency types whose refPoints have to coincide
+COINCIDENT_TYPES = ("pointIdentity", "sphereCenterIdent", "circularEdge", "CenterOfMass")
+# dependency types whose axes have to be parallel
+PARALLEL_TYPES = (
+    "circularEdge",
+    "CenterOfMass",
+    "axial",
+    "axisParallel",
+    "planesParallel",
+    "plane",
+    "axisPlaneNormal",
+    "axisPlaneVertical",
+)
+SNAP_TYPES = set(COINCIDENT_TYPES + PARALLEL_TYPES + ("pointOnLine", "pointOnPlane"))
+
+
+# ------------------------------------------------------------------------------
+def toArray(vector):
+    return numpy.array((vector.x, vector.y, vector.z), dtype=float)
+
+
+def axisOf(dep):
+    if dep.refAxisEnd is None:
+        return None
+    axis = toArray(dep.refAxisEnd) - toArray(dep.refPoint)
+    length = numpy.linalg.norm(axis)
+    if length == 0.0:
+        return None
+    return axis / length
+
+
+def perpendiculars(a):
+    helper = numpy.identity(3)[numpy.argmin(numpy.abs(a))]
+    p1 = numpy.cross(a, helper)
+    p1 /= numpy.linalg.norm(p1)
+    return p1, numpy.cross(a, p1)
+
+
+def shortestRotation(a, b):
+    """rotation matrix turning unit vector a onto unit vector b"""
+    v = numpy.cross(a, b)
+    c = numpy.dot(a, b)
+    if c < -1.0 + 1.0e-12:
+        p, _ = perpendiculars(a)
+        return 2.0 * numpy.outer(p, p) - numpy.identity(3)
+    vx = numpy.array(((0.0, -v[2], v[1]), (v[2], 0.0, -v[0]), (-v[1], v[0], 0.0)))
+    return numpy.identity(3) + vx + vx.dot(vx) / (1.0 + c)
+
+
+def matrixToRotation(m):
+    """FreeCAD.Rotation of an orthonormal matrix"""
+    trace = m[0, 0] + m[1, 1] + m[2, 2]
+    if trace > 0.0:
+        s = 2.0 * numpy.sqrt(trace + 1.0)
+        w = 0.25 * s
+        x = (m[2, 1] - m[1, 2]) / s
+        y = (m[0, 2] - m[2, 0]) / s
+        z = (m[1, 0] - m[0, 1]) / s
+    elif m[0, 0] > m[1, 1] and m[0, 0] > m[2, 2]:
+        s = 2.0 * numpy.sqrt(1.0 + m[0, 0] - m[1, 1] - m[2, 2])
+        w = (m[2, 1] - m[1, 2]) / s
+        x = 0.25 * s
+        y = (m[0, 1] + m[1, 0]) / s
+        z = (m[0, 2] + m[2, 0]) / s
+    elif m[1, 1] > m[2, 2]:
+        s = 2.0 * numpy.sqrt(1.0 + m[1, 1] - m[0, 0] - m[2, 2])
+        w = (m[0, 2] - m[2, 0]) / s
+        x = (m[0, 1] + m[1, 0]) / s
+        y = 0.25 * s
+        z = (m[1, 2] + m[2, 1]) / s
+    else:
+        s = 2.0 * numpy.sqrt(1.0 + m[2, 2] - m[0, 0] - m[1, 1])
+        w = (m[1, 0] - m[0, 1]) / s
+        x = (m[0, 2] + m[2, 0]) / s
+        y = (m[1, 2] + m[2, 1]) / s
+        z = 0.25 * s
+    return FreeCAD.Rotation(float(x), float(y), float(z), float(w))
+
+
+# ------------------------------------------------------------------------------
+def fitRotation(dependencies):
+    """
+    rotation matrix of the rigid or None, if not determined.
+    Axis pairs and the point patterns of coincident points are aligned.
+    """
+    sources = []
+    targets = []
+    locked = False
+    points = []
+    for dep in dependencies:
+        foreign = dep.foreignDependency
+        if dep.Type in PARALLEL_TYPES:
+            a = axisOf(dep)
+            b = axisOf(foreign)
+            if a is None or b is None:
+                return None
+            if dep.direction == "none" and numpy.dot(a, b) < 0.0:
+                b = -b
+            sources.append(a)
+            targets.append(b)
+            if dep.lockRotation and dep.Type in ("circularEdge", "axial"):
+                locked = True
+        if dep.Type in COINCIDENT_TYPES:
+            points.append((toArray(dep.refPoint), toArray(foreign.refPoint)))
+
+    if len(points) >= 2:
+        p = numpy.array([pair[0] for pair in points])
+        q = numpy.array([pair[1] for pair in points])
+        p -= p.mean(axis=0)
+        q -= q.mean(axis=0)
+        scale = max(numpy.abs(p).max(), numpy.abs(q).max())
+        if scale > 0.0:
+            sources.extend(p / scale)
+            targets.extend(q / scale)
+    if len(sources) == 0:
+        return None
+
+    H = numpy.zeros((3, 3))
+    for a, b in zip(sources, targets):
+        H += numpy.outer(a, b)
+    U, s, Vt = numpy.linalg.svd(H)
+    if s[0] == 0.0:
+        return None
+    if s[1] > SNAP_RANK_TOLERANCE * s[0]:
+        d = numpy.sign(numpy.linalg.det(Vt.T.dot(U.T)))
+        return Vt.T.dot(numpy.diag((1.0, 1.0, d))).dot(U.T)
+
+    # only one direction is determined
+    axis = Vt[0]
+    alignment = shortestRotation(U[:, 0], axis)
+    if locked:
+        return alignment
+    angle = fitAngle(dependencies, alignment, axis)
+    if angle is None:
+        return None
+    return rotationAround(axis, angle[0], angle[1]).dot(alignment)
+
+
+def rotationAround(axis, c, s):
+    """rotation matrix around unit vector axis, c = cos(angle), s = sin(angle)"""
+    cross = numpy.array(
+        ((0.0, -axis[2], axis[1]), (axis[2], 0.0, -axis[0]), (-axis[1], axis[0], 0.0))
+    )
+    return c * numpy.identity(3) + s * cross + (1.0 - c) * numpy.outer(axis, axis)
+
+
+def fitAngle(dependencies, alignment, axis):
+    """
+    (cos, sin) of the rotation around axis after alignment, which
+    fulfills the position conditions, or None.
+    A point x turned by the angle is c * (x - (axis.x) axis) + s * (axis x x)
+    + (axis.x) axis, so direction.(turned point + t - target) = 0 is
+    linear in u = (c, s, tx, ty, tz).
+    """
+    rows = []
+    values = []
+    for direction, point, target in positionConditions(dependencies, alignment):
+        if direction is None:
+            return None  # direction turns with the rigid, not linear
+        along = numpy.dot(axis, point) * axis
+        rows.append(
+            numpy.concatenate(
+                (
+                    (
+                        numpy.dot(direction, point - along),
+                        numpy.dot(direction, numpy.cross(axis, point)),
+                    ),
+                    direction,
+                )
+            )
+        )
+        values.append(numpy.dot(direction, target - along))
+    if len(rows) < 4:
+        return None
+    A = numpy.array(rows)
+    y = numpy.array(values)
+    u, residuals, rank, sv = numpy.linalg.lstsq(A, y, rcond=None)
+    if rank == 5:
+        length = numpy.hypot(u[0], u[1])
+        if length == 0.0:
+            return None
+        return u[0] / length, u[1] / length
+    if rank < 4:
+        return None
+    # one free parameter: u + k * n, choose k with c^2 + s^2 = 1
+    n = numpy.linalg.svd(A)[2][-1]
+    a = n[0] ** 2 + n[1] ** 2
+    if a < SNAP_RANK_TOLERANCE:
+        return None
+    b = 2.0 * (u[0] * n[0] + u[1] * n[1])
+    c = u[0] ** 2 + u[1] ** 2 - 1.0
+    discriminant = b * b - 4.0 * a * c
+    if discriminant < 0.0:
+        return None
+    roots = [(-b + sign * numpy.sqrt(discriminant)) / (2.0 * a) for sign in (1.0, -1.0)]
+    # the smaller rotation
+    k = max(roots, key=lambda k: u[0] + k * n[0])
+    return u[0] + k * n[0], u[1] + k * n[1]
+
+
+def positionConditions(dependencies, rotation):
+    """
+    (direction, rotated point, target) for each linear position
+    condition direction.(rotated point + translation - target) = 0.
+    direction is None, if it depends on the rotation (plane or line
+    on the moving rigid)
+    """
+    conditions = []
+    for dep in dependencies:
+        foreign = dep.foreignDependency
+        p = rotation.dot(toArray(dep.refPoint))
+        q = toArray(foreign.refPoint)
+        Type = dep.Type
+        if Type in COINCIDENT_TYPES:
+            for direction in numpy.identity(3):
+                conditions.append((direction, p, q))
+        elif Type == "axial":
+            for direction in perpendiculars(axisOf(foreign)):
+                conditions.append((direction, p, q))
+        elif Type == "plane":
+            conditions.append((axisOf(foreign), p, q))
+        elif Type in ("pointOnLine", "pointOnPlane"):
+            if dep.refType == "point":
+                axis = axisOf(foreign)
+            else:
+                axis = rotation.dot(axisOf(dep))
+                conditions.append((None, p, q))
+            if Type == "pointOnLine":
+                for direction in perpendiculars(axis):
+                    conditions.append((direction, p, q))
+            else:
+                conditions.append((axis, p, q))
+    return conditions
+
+
+def fitTranslation(dependencies, rotation):
+    """translation after rotating or None, if not determined"""
+    rows = []
+    values = []
+    for direction, point, target in positionConditions(dependencies, rotation):
+        if direction is None:
+            continue  # the following conditions are valid after rotating
+        rows.append(direction)
+        values.append(numpy.dot(direction, target - point))
+    if len(rows) < 3:
+        return None
+    t, residuals, rank, s = numpy.linalg.lstsq(
+        numpy.array(rows), numpy.array(values), rcond=None
+    )
+    if rank < 3:
+        return None
+    return t
+
+
+def fitPlacement(dependencies):
+    rotation = fitRotation(dependencies)
+    if rotation is None:
+        return None
+    translation = fitTranslation(dependencies, rotation)
+    if translation is None:
+        return None
+    return FreeCAD.Placement(
+        Base.Vector(*(float(v) for v in translation)), matrixToRotation(rotation)
+    )
+
+
+def getSnapPlacement(dependencies):
+    """
+    placement step (applied to the current placement) which fulfills the
+    dependencies of a rigid to a fixed neighbour, or None
+    """
+    if len(dependencies) == 0:
+        return None
+    for dep in dependencies:
+        if dep.Type not in SNAP_TYPES or dep.refPoint is None:
+            return None
+    step = fitPlacement(dependencies)
+    if step is None:
+        # planes or lines on the rigid: move the neighbour onto the rigid
+        # instead, the inverse of this is the step of the rigid
+        step = fitPlacement([dep.foreignDependency for dep in dependencies])
+        if step is not None:
+            step = step.inverse()
+    return step
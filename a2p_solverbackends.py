@@ -0,0 +1,327 @@
+# ***************************************************************************
+# *                                                                         *
+# *   Copyright (c) 2018 kbwbe                                              *
+# *                                                                         *
+# *   This program is free software; you can redistribute it and/or modify  *
+# *   it under the terms of the GNU Lesser General Public License (LGPL)    *
+# *   as published by the Free Software Foundation; either version 2 of     *
+# *   the License, or (at your option) any later version.                   *
+# *   for detail see the LICENCE text file.                                 *
+# *                                                                         *
+# *   This program is distributed in the hope that it will be useful,       *
+# *   but WITHOUT ANY WARRANTY; without even the implied warranty of        *
+# *   MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the         *
+# *   GNU Library General Public License for more details.                  *
+# *                                                                         *
+# *   You should have received a copy of the GNU Library General Public     *
+# *   License along with this program; if not, write to the Free Software   *
+# *   Foundation, Inc., 59 Temple Place, Suite 330, Boston, MA  02111-1307  *
+# *   USA                                                                   *
+# *                                                                         *
+# ***************************************************************************
+
+
+"""
+Exchangeable algorithms used by SolverSystem.calculateWorkList().
+
+A SolverBackend solves the rigids of one worklist. It has to set the
+rigids of a solved worklist tempfixed and apply their solution, the same
+way the attraction solver does. Backends are selected by name in the
+preferences (solverBackend) or per call of solveConstraints().
+"""
+
+import numpy
+import time
+import a2plib
+from a2plib import Msg
+
+try:
+    import scipy.sparse
+    import scipy.sparse.linalg
+except ImportError:
+    scipy = None
+
+LM_INITIAL_DAMPING = 1.0e-3
+LM_MAX_DAMPING = 1.0e10
+LM_MIN_DIAGONAL = 1.0e-9  # damping of unconstrained degrees of freedom
+LM_FD_STEP = 1.0e-6  # finite difference step, mm and degrees
+LM_MAX_ROTATION_STEP = 30.0  # degrees per iteration
+LM_STALL_IMPROVEMENT = 1.0e-6  # relative cost decrease counting as stall
+LM_STALL_ITERATIONS = 10
+LM_MAX_ITERATIONS = 2000
+LM_DENSE_MAX_COLUMNS = 600  # use scipy.sparse above, if available
+
+
+# ------------------------------------------------------------------------------
+class SolverBackend:
+    """interface of a solver backend"""
+
+    name = None
+
+    def solveWorkList(self, solver, doc, workList):
+        """
+        solve the rigids of workList, returns True if the accuracy
+        solver.mySOLVER_POS_ACCURACY/mySOLVER_SPIN_ACCURACY is reached
+        """
+        raise NotImplementedError
+
+
+# ------------------------------------------------------------------------------
+class AttractionBackend(SolverBackend):
+    """
+    the original solver: each rigid is attracted by its constraints,
+    moved by fixed weights step by step
+    """
+
+    name = "attraction"
+
+    def solveWorkList(self, solver, doc, workList):
+        return solver.calculateWorkListAttraction(doc, workList)
+
+
+# ------------------------------------------------------------------------------
+class LevenbergMarquardtBackend(SolverBackend):
+    """
+    Damped least squares over 6 degrees of freedom (rotation vector in
+    degrees around the spin center, translation) per rigid.
+    Residuals are the moveVectors and rotations of the dependencies, as
+    calculated by SolverKernel. The Jacobian is built by finite
+    differences; rigids without a common dependency are perturbed at once.
+    Every iteration counts as one solver step.
+    """
+
+    name = "levenbergMarquardt"
+
+    def solveWorkList(self, solver, doc, workList):
+        reqPosAccuracy = solver.mySOLVER_POS_ACCURACY
+        reqSpinAccuracy = solver.mySOLVER_SPIN_ACCURACY
+
+        # only the active set is moved, see SolverSystem.activateWorkList()
+        activeRigids = solver.activateWorkList(workList)
+        if len(activeRigids) == 0:
+            return True  # nothing to move, all rigids are solved
+        staleErrors = solver.staleErrors(workList)
+        kernel = solver.createKernel(activeRigids, workList)
+        colors = self.colorRigids(kernel)
+        self.damping = LM_INITIAL_DAMPING
+        stallCount = 0
+        iterations = 0
+        telemetry = solver.telemetry
+        while True:
+            solver.stepCount += 1
+            iterations += 1
+            if telemetry.enabled:
+                startTime = time.time()
+            maxPosError, maxAxisError, maxSingleAxisError = kernel.calcMoveData(
+                reqSpinAccuracy
+            )
+            maxPosError = max(maxPosError, staleErrors[0])
+            maxAxisError = max(maxAxisError, staleErrors[1])
+            maxSingleAxisError = max(maxSingleAxisError, staleErrors[2])
+            if telemetry.enabled:
+                telemetry.addTime("calcMoveData", time.time() - startTime)
+                telemetry.recordStep(maxPosError, maxAxisError, maxSingleAxisError)
+            if solver.progress is not None:
+                solver.reportProgress(
+                    step=solver.stepCount, posError=maxPosError, axisError=maxAxisError
+                )
+            if (
+                maxPosError <= reqPosAccuracy
+                and maxAxisError <= reqSpinAccuracy
+                and maxSingleAxisError <= reqSpinAccuracy * 10
+            ) or (a2plib.SOLVER_ONESTEP > 0):
+                kernel.syncToRigids()
+                for r in activeRigids:
+                    r.applySolution(doc, solver)
+                    r.tempfixed = True
+                return True
+
+            if telemetry.enabled:
+                startTime = time.time()
+            improvement = self.iterate(kernel, colors, reqSpinAccuracy)
+            if telemetry.enabled:
+                telemetry.addTime("move", time.time() - startTime)
+            if improvement < LM_STALL_IMPROVEMENT:
+                stallCount += 1
+            else:
+                stallCount = 0
+            if improvement <= 0.0 or stallCount > LM_STALL_ITERATIONS:
+                kernel.syncErrors()
+                unfixedRigids = solver.unfixLinkedRigids(activeRigids)
+                if len(unfixedRigids) > 0:
+                    kernel.syncToRigids()
+                    solver.activateRigids(unfixedRigids, workList)
+                    activeRigids.extend(unfixedRigids)
+                    staleErrors = solver.staleErrors(workList)
+                    kernel = solver.createKernel(activeRigids, workList)
+                    colors = self.colorRigids(kernel)
+                    self.damping = LM_INITIAL_DAMPING
+                    stallCount = 0
+                    continue
+                kernel.syncToRigids()
+                solver.msg("\n")
+                solver.msg("Calculation stopped, no convergency anymore!\n")
+                return False
+
+            if iterations > LM_MAX_ITERATIONS:
+                kernel.syncToRigids()
+                solver.msg("Reached max iteration count ({})\n".format(LM_MAX_ITERATIONS))
+                return False
+
+            if solver.interrupted():
+                kernel.syncToRigids()
+                return False
+
+    def colorRigids(self, kernel):
+        """
+        greedy coloring of the active rigids, rigids of one color
+        do not share a dependency
+        """
+        neighbors = [set() for i in range(kernel.nRigids)]
+        foreignOwner = kernel.owner[kernel.foreign]
+        for a, b in zip(kernel.owner, foreignOwner):
+            neighbors[a].add(b)
+            neighbors[b].add(a)
+        colors = numpy.full(kernel.nRigids, -1, dtype=numpy.intp)
+        for i in numpy.nonzero(kernel.active)[0]:
+            used = set(colors[n] for n in neighbors[i])
+            color = 0
+            while color in used:
+                color += 1
+            colors[i] = color
+        return colors
+
+    def jacobian(self, kernel, colors, residuals, spinAccuracy):
+        """returns (rows, columns, values) of the non zero entries"""
+        rows = numpy.nonzero(kernel.activeDeps)[0]
+        owner = kernel.owner[rows]
+        foreignOwner = kernel.owner[kernel.foreign[rows]]
+        column = numpy.full(kernel.nRigids, -1, dtype=numpy.intp)
+        active = numpy.nonzero(kernel.active)[0]
+        column[active] = numpy.arange(len(active))
+
+        entryRows = []
+        entryColumns = []
+        entryValues = []
+        saved = kernel.saveGeometry()
+        for color in range(colors.max() + 1):
+            moving = colors == color
+            # the perturbed rigid of each residual row, or -1
+            rigid = numpy.where(
+                moving[owner], owner, numpy.where(moving[foreignOwner], foreignOwner, -1)
+            )
+            affected = numpy.nonzero(rigid >= 0)[0]
+            if len(affected) == 0:
+                continue
+            for k in range(6):
+                steps = numpy.zeros((kernel.nRigids, 6))
+                steps[moving, k] = LM_FD_STEP
+                kernel.applyRigidSteps(moving, steps)
+                derivative = (
+                    (kernel.residuals(spinAccuracy) - residuals) / LM_FD_STEP
+                ).reshape(len(rows), 6)
+                kernel.restoreGeometry(saved)
+                for j in range(6):
+                    entryRows.append(affected * 6 + j)
+                    entryColumns.append(column[rigid[affected]] * 6 + k)
+                    entryValues.append(derivative[affected, j])
+        if len(entryRows) == 0:
+            return None
+        return (
+            numpy.concatenate(entryRows),
+            numpy.concatenate(entryColumns),
+            numpy.concatenate(entryValues),
+        )
+
+    def solveNormalEquations(self, jacobian, shape, residuals):
+        """returns a function damping -> step of the damped normal equations"""
+        entryRows, entryColumns, entryValues = jacobian
+        nColumns = shape[1]
+        if scipy is not None and nColumns > LM_DENSE_MAX_COLUMNS:
+            J = scipy.sparse.csr_matrix(
+                (entryValues, (entryRows, entryColumns)), shape=shape
+            )
+            A = J.T.dot(J).tocsc()
+            g = J.T.dot(residuals)
+            diagonal = A.diagonal() + LM_MIN_DIAGONAL
+
+            def step(damping):
+                return scipy.sparse.linalg.spsolve(
+                    A + scipy.sparse.diags(damping * diagonal), -g
+                )
+
+        else:
+            J = numpy.zeros(shape)
+            J[entryRows, entryColumns] = entryValues
+            A = J.T.dot(J)
+            g = J.T.dot(residuals)
+            diagonal = numpy.diag(A) + LM_MIN_DIAGONAL
+
+            def step(damping):
+                return numpy.linalg.solve(A + numpy.diag(damping * diagonal), -g)
+
+        return step
+
+    def iterate(self, kernel, colors, spinAccuracy):
+        """
+        one Levenberg-Marquardt iteration,
+        returns the relative decrease of the cost, 0.0 if none was found
+        """
+        residuals = kernel.residuals(spinAccuracy)
+        cost = residuals.dot(residuals)
+        if cost == 0.0:
+            return 0.0
+        jacobian = self.jacobian(kernel, colors, residuals, spinAccuracy)
+        if jacobian is None:
+            return 0.0
+        active = numpy.nonzero(kernel.active)[0]
+        step = self.solveNormalEquations(
+            jacobian, (len(residuals), len(active) * 6), residuals
+        )
+
+        saved = kernel.saveGeometry()
+        while self.damping < LM_MAX_DAMPING:
+            try:
+                dx = step(self.damping).reshape(len(active), 6)
+            except numpy.linalg.LinAlgError:
+                self.damping *= 4.0
+                continue
+            # limit large rotations, the linearization is not valid there
+            rotation = numpy.sqrt(numpy.einsum("ij,ij->i", dx[:, :3], dx[:, :3]))
+            scale = rotation.max() / LM_MAX_ROTATION_STEP
+            if scale > 1.0:
+                dx /= scale
+            steps = numpy.zeros((kernel.nRigids, 6))
+            steps[active] = dx
+            kernel.applyRigidSteps(kernel.active, steps)
+            newResiduals = kernel.residuals(spinAccuracy)
+            newCost = newResiduals.dot(newResiduals)
+            if newCost < cost:
+                self.damping = max(self.damping / 3.0, 1.0e-12)
+                return (cost - newCost) / cost
+            kernel.restoreGeometry(saved)
+            self.damping *= 4.0
+        return 0.0
+
+
+# ------------------------------------------------------------------------------
+BACKENDS = {
+    AttractionBackend.name: AttractionBackend,
+    LevenbergMarquardtBackend.name: LevenbergMarquardtBackend,
+}
+
+
+def getBackend(backend=None):
+    """
+    returns a SolverBackend instance.
+    backend: None (preference solverBackend), a name or an instance
+    """
+    if isinstance(backend, SolverBackend):
+        return backend
+    if backend is None:
+        backend = a2plib.getSolverBackend()
+    backendClass = BACKENDS.get(backend)
+    if backendClass is None:
+        Msg("Unknown solver backend '{}', using attraction\n".format(backend))
+        backendClass = AttractionBackend
+    return backendClass()
@@ -0,0 +1,616 @@
+# ***************************************************************************
+# *                                                                         *
+# *   Copyright (c) 2018 kbwbe                                              *
+# *                                                                         *
+# *   This program is free software; you can redistribute it and/or modify  *
+# *   it under the terms of the GNU Lesser General Public License (LGPL)    *
+# *   as published by the Free Software Foundation; either version 2 of     *
+# *   the License, or (at your option) any later version.                   *
+# *   for detail see the LICENCE text file.                                 *
+# *                                                                         *
+# *   This program is distributed in the hope that it will be useful,       *
+# *   but WITHOUT ANY WARRANTY; without even the implied warranty of        *
+# *   MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the         *
+# *   GNU Library General Public License for more details.                  *
+# *                                                                         *
+# *   You should have received a copy of the GNU Library General Public     *
+# *   License along with this program; if not, write to the Free Software   *
+# *   Foundation, Inc., 59 Temple Place, Suite 330, Boston, MA  02111-1307  *
+# *   USA                                                                   *
+# *                                                                         *
+# ***************************************************************************
+
+
+"""
+Synthetic assemblies and a benchmark suite for the solver.
+
+A synthetic assembly is a set of boxes connected by constraints in one of
+the topologies chain, tree, grid or loop. The constraints of each link
+are taken from JOINTS, which covers all 14 constraint types. The features
+(points, axes and normals) of the constraints are generated at random
+ground truth placements, so the system always has an exact solution. The
+parts are then moved away from the ground truth and solved again.
+
+The dependencies are built directly from the generated features, like
+Dependency.Create() builds them from the shapes. Run inside FreeCAD or
+FreeCADCmd:
+
+    import a2p_solverbenchmark
+    a2p_solverbenchmark.run(outputPath="/tmp/a2p_benchmark.json")
+
+    results = a2p_solverbenchmark.run(
+        topologies=["chain"],
+        sizes=[10, 100],
+        configurations=[{"name": "attraction"}, {"name": "accelerated", "useAcceleratedSolver": True}],
+        )
+
+For each assembly and configuration the wall time, the solver steps,
+the reached accuracy, the remaining constraint errors and the peak
+python memory (tracemalloc) are recorded. Tracing the memory slows down
+the solver, use trackMemory=False for comparable wall times.
+"""
+
+import json
+import math
+import random
+import sys
+import time
+
+import FreeCAD
+import Part
+from FreeCAD import Base
+
+import a2plib
+from a2plib import Msg
+from a2p_dependencies import (
+    DependencyPointIdentity,
+    DependencyPointOnLine,
+    DependencyPointOnPlane,
+    DependencyCircularEdge,
+    DependencyParallelPlanes,
+    DependencyAngledPlanes,
+    DependencyPlane,
+    DependencyAxial,
+    DependencyAxisParallel,
+    DependencyAxisPlaneParallel,
+    DependencyAxisPlaneAngle,
+    DependencyAxisPlaneNormal,
+    DependencyCenterOfMass,
+)
+from a2p_rigid import Rigid
+from a2p_solversystem import SolverSystem, SOLVER_CONVERGENCY_ERROR_INIT_VALUE
+
+try:
+    import tracemalloc
+except ImportError:
+    tracemalloc = None  # python 2
+
+TOPOLOGIES = ("chain", "tree", "grid", "loop")
+DEFAULT_SIZES = (10, 100, 1000, 5000)
+TREE_BRANCHING = 3
+PART_DISTANCE = 20.0  # distance of neighboured parts at ground truth
+PERTURBATION_POS = 2.0  # mm
+PERTURBATION_SPIN = 10.0  # degrees
+
+# constraints of one link between two parts, used in turn
+JOINTS = (
+    ("axial", "plane"),
+    ("circularEdge",),
+    ("pointIdentity", "pointIdentity", "pointOnPlane"),
+    ("sphereCenterIdent", "axisParallel"),
+    ("pointOnLine", "planesParallel"),
+    ("axial", "angledPlanes"),
+    ("axisPlaneParallel", "pointIdentity"),
+    ("axisPlaneAngle", "sphereCenterIdent"),
+    ("axisPlaneNormal", "pointIdentity"),
+    ("CenterOfMass", "axisParallel"),
+)
+
+# constraint type: (dependency class, refType1, refType2)
+DEPENDENCY_TYPES = {
+    "pointIdentity": (DependencyPointIdentity, "point", "point"),
+    "sphereCenterIdent": (DependencyPointIdentity, "point", "point"),
+    "pointOnLine": (DependencyPointOnLine, "point", "pointAxis"),
+    "pointOnPlane": (DependencyPointOnPlane, "point", "plane"),
+    "circularEdge": (DependencyCircularEdge, "pointAxis", "pointAxis"),
+    "planesParallel": (DependencyParallelPlanes, "pointNormal", "pointNormal"),
+    "angledPlanes": (DependencyAngledPlanes, "pointNormal", "pointNormal"),
+    "plane": (DependencyPlane, "pointNormal", "pointNormal"),
+    "axial": (DependencyAxial, "pointAxis", "pointAxis"),
+    "axisParallel": (DependencyAxisParallel, "pointAxis", "pointAxis"),
+    "axisPlaneParallel": (DependencyAxisPlaneParallel, "pointAxis", "pointNormal"),
+    "axisPlaneAngle": (DependencyAxisPlaneAngle, "pointAxis", "pointNormal"),
+    "axisPlaneNormal": (DependencyAxisPlaneNormal, "pointAxis", "pointNormal"),
+    "CenterOfMass": (DependencyCenterOfMass, "point", "point"),
+}
+
+# constraint types where Dependency.Create() shifts dep2 by the offset
+OFFSET_TYPES = ("circularEdge", "plane", "CenterOfMass")
+
+DEFAULT_CONFIGURATIONS = (
+    {"name": "attraction"},
+    {"name": "vectorized", "useVectorizedSolver": True},
+    {"name": "accelerated", "useAcceleratedSolver": True},
+    {"name": "levenbergMarquardt", "solverBackend": "levenbergMarquardt"},
+)
+
+PREFERENCES_PATH = "User parameter:BaseApp/Preferences/Mod/A2plus"
+
+
+# ------------------------------------------------------------------------------
+def scaled(vector, factor):
+    v = Base.Vector(vector)
+    v.multiply(factor)
+    return v
+
+
+def randomPlacement(rng, base, angle):
+    axis = Base.Vector(rng.uniform(-1, 1), rng.uniform(-1, 1), rng.uniform(-1, 1))
+    if axis.Length < 1e-3:
+        axis = Base.Vector(0, 0, 1)
+    return Base.Placement(
+        base, Base.Rotation(axis, rng.uniform(-angle, angle))
+    )
+
+
+def angleBetween(axis1, axis2):
+    return math.degrees(axis1.getAngle(axis2))
+
+
+def distanceToLine(point, linePoint, lineAxis):
+    return point.distanceToLine(linePoint, lineAxis)
+
+
+# ------------------------------------------------------------------------------
+class SyntheticConstraint:
+    """
+    The properties of an a2p constraint, which are used by the solver
+    """
+
+    def __init__(self, name, Type, object1, object2):
+        self.Name = name
+        self.Label = name
+        self.Type = Type
+        self.Object1 = object1
+        self.Object2 = object2
+        self.SubElement1 = ""
+        self.SubElement2 = ""
+        self.directionConstraint = "aligned"
+        self.offset = 0.0
+        self.angle = FreeCAD.Units.Quantity("0 deg")
+        self.lockRotation = False
+        self.Suppressed = False
+
+
+# ------------------------------------------------------------------------------
+class SyntheticAssembly:
+    """
+    Parts, ground truth and start placements and constraints of a
+    generated assembly. features[constraintName] holds point1, axis1 in
+    coordinates of Object1 and point2, axis2 in coordinates of Object2.
+    """
+
+    def __init__(self, topology, size, seed=0, joints=JOINTS):
+        if topology not in TOPOLOGIES:
+            raise ValueError("Unknown topology {}".format(topology))
+        self.topology = topology
+        self.size = max(2, size)
+        self.seed = seed
+        self.joints = joints
+        self.rng = random.Random(seed)
+        self.partNames = []
+        self.fixedNames = set()
+        self.truePlacements = {}
+        self.startPlacements = {}
+        self.constraints = []
+        self.features = {}
+        self.generate()
+
+    def links(self):
+        """pairs of part indices connected by a joint"""
+        n = self.size
+        if self.topology == "chain":
+            return [(i - 1, i) for i in range(1, n)]
+        if self.topology == "loop":
+            return [(i - 1, i) for i in range(1, n)] + [(n - 1, 0)]
+        if self.topology == "tree":
+            return [((i - 1) // TREE_BRANCHING, i) for i in range(1, n)]
+        columns = int(math.ceil(math.sqrt(n)))
+        result = []
+        for i in range(n):
+            if i % columns > 0:
+                result.append((i - 1, i))
+            if i >= columns:
+                result.append((i - columns, i))
+        return result
+
+    def gridPosition(self, index):
+        if self.topology == "grid":
+            columns = int(math.ceil(math.sqrt(self.size)))
+            return index % columns, index // columns
+        if self.topology == "tree":
+            depth = 0
+            first = 0
+            width = 1
+            while index >= first + width:
+                first += width
+                width *= TREE_BRANCHING
+                depth += 1
+            return index - first, depth
+        if self.topology == "loop":
+            angle = 2.0 * math.pi * index / self.size
+            radius = self.size / (2.0 * math.pi)
+            return radius * math.cos(angle), radius * math.sin(angle)
+        return index, 0
+
+    def generate(self):
+        rng = self.rng
+        for i in range(self.size):
+            name = "Part{}".format(i)
+            self.partNames.append(name)
+            x, y = self.gridPosition(i)
+            base = Base.Vector(x * PART_DISTANCE, y * PART_DISTANCE, 0)
+            truePlacement = randomPlacement(rng, base, 180.0)
+            self.truePlacements[name] = truePlacement
+            if i == 0:
+                self.fixedNames.add(name)
+                self.startPlacements[name] = Base.Placement(truePlacement)
+                continue
+            move = Base.Vector(
+                rng.uniform(-1, 1), rng.uniform(-1, 1), rng.uniform(-1, 1)
+            )
+            move.multiply(PERTURBATION_POS)
+            delta = randomPlacement(rng, move, PERTURBATION_SPIN)
+            self.startPlacements[name] = delta.multiply(truePlacement)
+
+        for number, (index1, index2) in enumerate(self.links()):
+            name1 = self.partNames[index1]
+            name2 = self.partNames[index2]
+            joint = self.joints[number % len(self.joints)]
+            base1 = self.truePlacements[name1].Base
+            base2 = self.truePlacements[name2].Base
+            center = scaled(base1.add(base2), 0.5)
+            frame = randomPlacement(rng, center, 180.0).Rotation
+            for Type in joint:
+                self.addConstraint(Type, name1, name2, center, frame)
+
+    def addConstraint(self, Type, name1, name2, center, frame):
+        """
+        generate features of a constraint, which are satisfied at the
+        ground truth placements
+        """
+        rng = self.rng
+        name = "{}_{:05d}".format(Type, len(self.constraints))
+        c = SyntheticConstraint(name, Type, name1, name2)
+        n = frame.multVec(Base.Vector(0, 0, 1))
+        u = frame.multVec(Base.Vector(1, 0, 0))
+        v = frame.multVec(Base.Vector(0, 1, 0))
+        p = center.add(scaled(u, rng.uniform(-3, 3))).add(
+            scaled(v, rng.uniform(-3, 3))
+        )
+        s = rng.uniform(1.0, 3.0)
+        t = rng.uniform(1.0, 3.0)
+        alpha = rng.choice((15.0, 30.0, 45.0, 60.0))
+
+        if Type in ("pointIdentity", "sphereCenterIdent"):
+            point1, axis1, point2, axis2 = p, None, p, None
+        elif Type == "pointOnLine":
+            point1, axis1, point2, axis2 = p.add(scaled(n, s)), None, p, n
+        elif Type == "pointOnPlane":
+            point1 = p.add(scaled(u, s)).add(scaled(v, t))
+            axis1, point2, axis2 = None, p, n
+        elif Type == "circularEdge":
+            c.offset = rng.choice((0.0, s))
+            point1, axis1 = p, n
+            point2, axis2 = p.sub(scaled(n, c.offset)), n
+        elif Type == "axial":
+            point1, axis1 = p.add(scaled(n, s)), n
+            point2, axis2 = p.sub(scaled(n, t)), n
+        elif Type in ("axisParallel", "planesParallel"):
+            point1, axis1 = p.add(scaled(u, s)), n
+            point2, axis2 = p.add(scaled(v, t)), n
+        elif Type == "plane":
+            c.offset = rng.choice((0.0, s))
+            point1, axis1 = p.add(scaled(u, s)), n
+            point2, axis2 = p.add(scaled(v, t)).sub(scaled(n, c.offset)), n
+        elif Type == "angledPlanes":
+            c.angle = FreeCAD.Units.Quantity("{} deg".format(alpha))
+            a = math.radians(alpha)
+            point1, axis1 = p.add(scaled(u, s)), n
+            point2 = p.add(scaled(v, t))
+            axis2 = scaled(n, math.cos(a)).add(scaled(v, math.sin(a)))
+        elif Type == "axisPlaneParallel":
+            point1, axis1, point2, axis2 = p.add(scaled(v, s)), u, p, n
+        elif Type == "axisPlaneAngle":
+            # angle between axis and normal is 90 degrees + constraint angle
+            c.angle = FreeCAD.Units.Quantity("{} deg".format(alpha))
+            a = math.radians(90.0 + alpha)
+            axis1 = scaled(n, math.cos(a)).add(scaled(v, math.sin(a)))
+            point1, point2, axis2 = p, p.add(scaled(u, s)), n
+        elif Type == "axisPlaneNormal":
+            point1, axis1, point2, axis2 = p.add(scaled(u, s)), n, p, n
+        elif Type == "CenterOfMass":
+            c.offset = rng.choice((0.0, s))
+            point1, axis1 = p, n
+            point2, axis2 = p.sub(scaled(n, c.offset)), n
+        else:
+            raise NotImplementedError(
+                "Constraint type {} was not implemented!".format(Type)
+            )
+
+        inverse1 = self.truePlacements[name1].inverse()
+        inverse2 = self.truePlacements[name2].inverse()
+        self.features[name] = (
+            inverse1.multVec(point1),
+            None if axis1 is None else inverse1.Rotation.multVec(axis1),
+            inverse2.multVec(point2),
+            None if axis2 is None else inverse2.Rotation.multVec(axis2),
+        )
+        self.constraints.append(c)
+
+    def worldFeatures(self, constraint, placement1, placement2):
+        """features of a constraint at the given placements of its parts"""
+        point1, axis1, point2, axis2 = self.features[constraint.Name]
+        return (
+            placement1.multVec(point1),
+            None if axis1 is None else placement1.Rotation.multVec(axis1),
+            placement2.multVec(point2),
+            None if axis2 is None else placement2.Rotation.multVec(axis2),
+        )
+
+    def createDocument(self, name="a2pBenchmark"):
+        """a document with a box for each part, at the start placements"""
+        doc = FreeCAD.newDocument(name)
+        box = Part.makeBox(10, 10, 10, Base.Vector(-5, -5, -5))
+        for partName in self.partNames:
+            ob = doc.addObject("Part::Feature", partName)
+            ob.Shape = box
+            ob.addProperty("App::PropertyBool", "fixedPosition", "importPart")
+            ob.fixedPosition = partName in self.fixedNames
+            ob.Placement = self.startPlacements[partName]
+        return doc
+
+    def createDependencies(self, solver, constraint, rigid1, rigid2):
+        """the same dependencies Dependency.Create() builds from shapes"""
+        c = constraint
+        dependencyClass, refType1, refType2 = DEPENDENCY_TYPES[c.Type]
+        dep1 = dependencyClass(c, refType1)
+        dep2 = dependencyClass(c, refType2)
+        point1, axis1, point2, axis2 = self.worldFeatures(
+            c, rigid1.placement, rigid2.placement
+        )
+        if axis2 is not None and c.directionConstraint == "opposed":
+            axis2.multiply(-1.0)
+        dep1.refPoint = point1
+        dep2.refPoint = point2
+        if axis1 is not None:
+            dep1.refAxisEnd = point1.add(axis1)
+        if axis2 is not None:
+            dep2.refAxisEnd = point2.add(axis2)
+        if c.Type in OFFSET_TYPES:
+            dep2.adjustOffset(axis2, solver)
+
+        dep1.currentRigid = rigid1
+        dep1.dependedRigid = rigid2
+        dep1.foreignDependency = dep2
+
+        dep2.currentRigid = rigid2
+        dep2.dependedRigid = rigid1
+        dep2.foreignDependency = dep1
+
+        rigid1.dependencies.append(dep1)
+        rigid2.dependencies.append(dep2)
+
+        dep1.storeLocalFrame()
+        dep2.storeLocalFrame()
+
+    def constraintErrors(self, placements):
+        """
+        returns the largest position error (mm) and the largest angle
+        error (degrees) of all constraints at the given placements
+        """
+        maxPosError = 0.0
+        maxAngleError = 0.0
+        for c in self.constraints:
+            point1, axis1, point2, axis2 = self.worldFeatures(
+                c, placements[c.Object1], placements[c.Object2]
+            )
+            posError = 0.0
+            angleError = 0.0
+            Type = c.Type
+            if Type in ("pointIdentity", "sphereCenterIdent"):
+                posError = point1.sub(point2).Length
+            elif Type == "pointOnLine":
+                posError = distanceToLine(point1, point2, axis2)
+            elif Type == "pointOnPlane":
+                posError = abs(point1.sub(point2).dot(axis2))
+            elif Type in ("circularEdge", "CenterOfMass"):
+                posError = point2.add(scaled(axis2, c.offset)).sub(point1).Length
+                angleError = angleBetween(axis1, axis2)
+            elif Type == "axial":
+                posError = distanceToLine(point2, point1, axis1)
+                angleError = angleBetween(axis1, axis2)
+            elif Type in ("axisParallel", "planesParallel", "axisPlaneNormal"):
+                angleError = angleBetween(axis1, axis2)
+            elif Type == "plane":
+                shifted = point2.add(scaled(axis2, c.offset))
+                posError = abs(shifted.sub(point1).dot(axis1))
+                angleError = angleBetween(axis1, axis2)
+            elif Type == "angledPlanes":
+                angleError = abs(angleBetween(axis1, axis2) - c.angle.Value)
+            elif Type == "axisPlaneParallel":
+                angleError = abs(angleBetween(axis1, axis2) - 90.0)
+            elif Type == "axisPlaneAngle":
+                angleError = abs(angleBetween(axis1, axis2) - 90.0 - c.angle.Value)
+            maxPosError = max(maxPosError, posError)
+            maxAngleError = max(maxAngleError, angleError)
+        return maxPosError, maxAngleError
+
+
+# ------------------------------------------------------------------------------
+class SyntheticSolverSystem(SolverSystem):
+    """
+    A SolverSystem which loads a SyntheticAssembly instead of the
+    constraint objects of the document
+    """
+
+    def __init__(self, assembly, backend=None):
+        SolverSystem.__init__(self, backend)
+        self.assembly = assembly
+
+    def loadSystem(self, doc, matelist=None):
+        self.clear()
+        self.doc = doc
+        self.status = "loading"
+        self.convergencyCounter = 0
+        self.lastPositionError = SOLVER_CONVERGENCY_ERROR_INIT_VALUE
+        self.lastAxisError = SOLVER_CONVERGENCY_ERROR_INIT_VALUE
+        self.constraints = list(self.assembly.constraints)
+        self.objectNames = list(self.assembly.partNames)
+
+        for o in self.objectNames:
+            ob1 = doc.getObject(o)
+            rig = Rigid(o, ob1.Label, ob1.fixedPosition, ob1.Placement, False)
+            rig.spinCenter = ob1.Shape.BoundBox.Center
+            self.addRigid(rig)
+
+        for c in self.constraints:
+            rigid1 = self.getRigid(c.Object1)
+            rigid2 = self.getRigid(c.Object2)
+            self.graph.link(rigid1, rigid2)
+            self.assembly.createDependencies(self, c, rigid1, rigid2)
+
+        for rig in self.rigids:
+            rig.calcSpinCenter()
+            rig.calcRefPointsBoundBoxSize()
+
+        self.retrieveDOFInfo()
+        self.status = "loaded"
+
+
+# ------------------------------------------------------------------------------
+def setPreferences(values):
+    """set solver preferences, returns the previous values"""
+    preferences = FreeCAD.ParamGet(PREFERENCES_PATH)
+    previous = {}
+    for key, value in values.items():
+        if isinstance(value, bool):
+            previous[key] = preferences.GetBool(key, False)
+            preferences.SetBool(key, value)
+        else:
+            previous[key] = preferences.GetString(key, "")
+            preferences.SetString(key, value)
+    return previous
+
+
+def runCase(assembly, configuration, trackMemory=True):
+    """solve an assembly with one configuration, returns a result dict"""
+    preferences = dict(
+        (key, value) for key, value in configuration.items() if key != "name"
+    )
+    previous = setPreferences(preferences)
+    simulationState = a2plib.SIMULATION_STATE
+    a2plib.SIMULATION_STATE = False
+    doc = assembly.createDocument()
+    trackMemory = trackMemory and tracemalloc is not None
+    try:
+        if trackMemory:
+            tracemalloc.start()
+        startTime = time.time()
+        ss = SyntheticSolverSystem(assembly)
+        ss.setAccuracyLevel(1)
+        ss.loadSystem(doc)
+        ss.collapseRigidClusters(doc)
+        ss.assignParentship(doc)
+        loadTime = time.time() - startTime
+        solved = ss.solveLoadedSystem(doc, loadTime=loadTime)
+        wallTime = time.time() - startTime
+        peakMemory = None
+        if trackMemory:
+            peakMemory = tracemalloc.get_traced_memory()[1]
+            tracemalloc.stop()
+        placements = dict(
+            (name, doc.getObject(name).Placement) for name in assembly.partNames
+        )
+        posError, angleError = assembly.constraintErrors(placements)
+        return {
+            "topology": assembly.topology,
+            "rigids": assembly.size,
+            "constraints": len(assembly.constraints),
+            "seed": assembly.seed,
+            "configuration": configuration.get("name", "default"),
+            "backend": ss.backend.name,
+            "solved": bool(solved),
+            "wallTime": wallTime,
+            "loadTime": loadTime,
+            "steps": sum(level[3] for level in ss.levelStatistics),
+            "levels": [
+                {
+                    "level": level,
+                    "loadTime": levelLoadTime,
+                    "solveTime": solveTime,
+                    "steps": steps,
+                    "rebased": rebased,
+                }
+                for level, levelLoadTime, solveTime, steps, rebased in ss.levelStatistics
+            ],
+            "reachedPosAccuracy": ss.maxPosError,
+            "reachedSpinAccuracy": ss.maxAxisError,
+            "maxConstraintPosError": posError,
+            "maxConstraintAngleError": angleError,
+            "peakMemory": peakMemory,
+        }
+    finally:
+        if trackMemory and tracemalloc.is_tracing():
+            tracemalloc.stop()
+        FreeCAD.closeDocument(doc.Name)
+        a2plib.SIMULATION_STATE = simulationState
+        setPreferences(previous)
+
+
+def run(
+    topologies=TOPOLOGIES,
+    sizes=DEFAULT_SIZES,
+    configurations=DEFAULT_CONFIGURATIONS,
+    seed=0,
+    joints=JOINTS,
+    trackMemory=True,
+    outputPath=None,
+):
+    """
+    solve all combinations of topology, size and configuration.
+    A configuration is a dict with a name and the solver preferences to
+    use, see DEFAULT_CONFIGURATIONS. Returns the list of results and
+    writes them as JSON to outputPath.
+    """
+    results = []
+    for topology in topologies:
+        for size in sizes:
+            assembly = SyntheticAssembly(topology, size, seed, joints)
+            for configuration in configurations:
+                result = runCase(assembly, configuration, trackMemory)
+                Msg(
+                    "BENCHMARK {} {} {}: {}, {:.3f} s, {} steps\n".format(
+                        topology,
+                        size,
+                        result["configuration"],
+                        "solved" if result["solved"] else "not solved",
+                        result["wallTime"],
+                        result["steps"],
+                    )
+                )
+                results.append(result)
+    if outputPath is not None:
+        data = {
+            "created": time.strftime("%Y-%m-%d %H:%M:%S"),
+            "python": sys.version.split()[0],
+            "freecad": ".".join(FreeCAD.Version()[:3]),
+            "results": results,
+        }
+        with open(outputPath, "w") as f:
+            json.dump(data, f, indent=2)
+    return results
+
+
+if __name__ == "__main__":
+    run(outputPath="a2p_benchmark.json")
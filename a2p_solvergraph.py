@@ -0,0 +1,194 @@
+# ***************************************************************************
+# *                                                                         *
+# *   Copyright (c) 2018 kbwbe                                              *
+# *                                                                         *
+# *   This program is free software; you can redistribute it and/or modify  *
+# *   it under the terms of the GNU Lesser General Public License (LGPL)    *
+# *   as published by the Free Software Foundation; either version 2 of     *
+# *   the License, or (at your option) any later version.                   *
+# *   for detail see the LICENCE text file.                                 *
+# *                                                                         *
+# *   This program is distributed in the hope that it will be useful,       *
+# *   but WITHOUT ANY WARRANTY; without even the implied warranty of        *
+# *   MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the         *
+# *   GNU Library General Public License for more details.                  *
+# *                                                                         *
+# *   You should have received a copy of the GNU Library General Public     *
+# *   License along with this program; if not, write to the Free Software   *
+# *   Foundation, Inc., 59 Temple Place, Suite 330, Boston, MA  02111-1307  *
+# *   USA                                                                   *
+# *                                                                         *
+# ***************************************************************************
+
+"""
+Indexed data structures for the constraint graph of the solver.
+
+Each Rigid gets an index (Rigid.index) when it is registered in the
+SolverGraph. Rigids are looked up by objectName through a dict, linked
+rigids are kept in Rigid.linkedRigidsSet and membership in a worklist is
+tested through a bitmap. All lookups are O(1).
+
+Rigids which are not linked over any chain of constraints form
+independent components, which can be solved separately.
+
+The SolverHierarchy orders the rigids by their distance (number of
+constraint links) from the fixed rigids.
+"""
+
+from collections import deque
+
+
+class WorkList(list):
+    """
+    A list of rigids with an additional membership bitmap.
+    "rig in workList" does not scan the list.
+    """
+
+    def __init__(self, size, rigids=()):
+        list.__init__(self)
+        self.member = bytearray(size)
+        self.extend(rigids)
+
+    def __contains__(self, rig):
+        index = getattr(rig, "index", None)
+        if index is None:
+            return False
+        return self.member[index] == 1
+
+    def append(self, rig):
+        if self.member[rig.index]:
+            return
+        self.member[rig.index] = 1
+        list.append(self, rig)
+
+    def extend(self, rigids):
+        for rig in rigids:
+            self.append(rig)
+
+
+class SolverGraph:
+    """
+    name -> Rigid index and set based adjacency of the rigids of a SolverSystem
+    """
+
+    def __init__(self):
+        self.rigids = []
+        self.rigidsByName = {}
+
+    def clear(self):
+        self.rigids = []
+        self.rigidsByName = {}
+
+    def addRigid(self, rig):
+        rig.index = len(self.rigids)
+        self.rigids.append(rig)
+        self.rigidsByName[rig.objectName] = rig
+
+    def getRigid(self, objectName):
+        return self.rigidsByName.get(objectName, None)
+
+    def addAlias(self, objectName, rig):
+        """let getRigid(objectName) find rig, e.g. the SuperRigid of a member"""
+        self.rigidsByName[objectName] = rig
+
+    def link(self, rigid1, rigid2):
+        """create and update list of constrained rigids"""
+        if rigid1 is None or rigid2 is None:
+            return
+        if rigid2 not in rigid1.linkedRigidsSet:
+            rigid1.linkedRigidsSet.add(rigid2)
+            rigid1.linkedRigids.append(rigid2)
+        if rigid1 not in rigid2.linkedRigidsSet:
+            rigid2.linkedRigidsSet.add(rigid1)
+            rigid2.linkedRigids.append(rigid1)
+
+    def createWorkList(self, rigids=()):
+        return WorkList(len(self.rigids), rigids)
+
+    def connectedComponents(self):
+        """
+        returns a list of rigid lists, one for each group of rigids
+        linked by constraints. Order of the rigids is kept.
+        """
+        componentOf = [None] * len(self.rigids)
+        components = []
+        for rig in self.rigids:
+            if componentOf[rig.index] is not None:
+                continue
+            number = len(components)
+            componentOf[rig.index] = number
+            queue = deque([rig])
+            while queue:
+                current = queue.popleft()
+                for linkedRig in current.linkedRigids:
+                    if componentOf[linkedRig.index] is None:
+                        componentOf[linkedRig.index] = number
+                        queue.append(linkedRig)
+            components.append([])
+        for rig in self.rigids:
+            components[componentOf[rig.index]].append(rig)
+        return components
+
+    def buildHierarchy(self):
+        return SolverHierarchy(self.rigids)
+
+
+class SolverHierarchy:
+    """
+    Parent/child hierarchy of rigids, built by one breadth first search
+    starting at all fixed rigids.
+
+    Sets Rigid.disatanceFromFixed, Rigid.parentRigids (the rigid which
+    reached it first) and Rigid.childRigids (linked rigids, whose link is
+    followed from this rigid). levels[distance] holds the rigids of each
+    distance, unreachable the rigids without constraint path to a fixed
+    rigid.
+    """
+
+    def __init__(self, rigids):
+        self.levels = []
+        self.unreachable = []
+        for rig in rigids:
+            rig.disatanceFromFixed = None
+            rig.parentRigids = []
+            rig.childRigids = []
+        processed = set()  # rigids, whose links are assigned
+        queue = deque(rig for rig in rigids if rig.fixed)
+        for rig in queue:
+            rig.disatanceFromFixed = 0
+        while queue:
+            rig = queue.popleft()
+            processed.add(rig)
+            distance = rig.disatanceFromFixed
+            if distance == len(self.levels):
+                self.levels.append([])
+            self.levels[distance].append(rig)
+            for linkedRig in rig.linkedRigids:
+                if linkedRig in processed:
+                    continue  # link assigned from the other side
+                if linkedRig.disatanceFromFixed is None:
+                    linkedRig.disatanceFromFixed = distance + 1
+                    linkedRig.parentRigids.append(rig)
+                    queue.append(linkedRig)
+                rig.childRigids.append(linkedRig)
+        self.unreachable = [rig for rig in rigids if rig.disatanceFromFixed is None]
+
+    def rigids(self):
+        """all rigids, ordered by distance, unreachable rigids at the end"""
+        result = []
+        for level in self.levels:
+            result.extend(level)
+        result.extend(self.unreachable)
+        return result
+
+    def downstream(self, rigids):
+        """rigids and all their children, grandchildren, ..."""
+        result = set(rigids)
+        stack = list(rigids)
+        while stack:
+            rig = stack.pop()
+            for child in rig.childRigids:
+                if child not in result:
+                    result.add(child)
+                    stack.append(child)
+        return result
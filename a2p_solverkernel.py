@@ -0,0 +1,869 @@
+# ***************************************************************************
+# *                                                                         *
+# *   Copyright (c) 2018 kbwbe                                              *
+# *                                                                         *
+# *   This program is free software; you can redistribute it and/or modify  *
+# *   it under the terms of the GNU Lesser General Public License (LGPL)    *
+# *   as published by the Free Software Foundation; either version 2 of     *
+# *   the License, or (at your option) any later version.                   *
+# *   for detail see the LICENCE text file.                                 *
+# *                                                                         *
+# *   This program is distributed in the hope that it will be useful,       *
+# *   but WITHOUT ANY WARRANTY; without even the implied warranty of        *
+# *   MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the         *
+# *   GNU Library General Public License for more details.                  *
+# *                                                                         *
+# *   You should have received a copy of the GNU Library General Public     *
+# *   License along with this program; if not, write to the Free Software   *
+# *   Foundation, Inc., 59 Temple Place, Suite 330, Boston, MA  02111-1307  *
+# *   USA                                                                   *
+# *                                                                         *
+# ***************************************************************************
+
+"""
+Vectorized (structure of arrays) version of the attraction solver step.
+
+SolverKernel packs all enabled dependencies of a worklist into contiguous
+float64 arrays and computes Rigid.calcMoveData() and Rigid.move() for all
+rigids at once. The math follows a2p_dependencies and a2p_rigid exactly,
+so both engines give the same results within solver tolerances.
+
+This module does not import FreeCAD at module level. Results are written
+back to the Rigid/Dependency objects only by syncToRigids().
+"""
+
+import math
+import time
+import numpy
+
+# Weights have to be the same as in a2p_rigid
+SPINSTEP_DIVISOR = 12.0
+WEIGHT_LINEAR_MOVE = 0.5
+WEIGHT_REFPOINT_ROTATION = 8.0
+MAX_SPIN_ANGLE = 15.0
+
+# optional momentum acceleration of move(), see SolverKernel.acceleration
+ACCELERATION_MOMENTUM = 0.5  # part of the last step added to the next one
+ACCELERATION_GAIN_GROWTH = 1.1  # step length increase while error decreases
+ACCELERATION_MAX_GAIN = 2.0
+
+# FreeCAD refuses to normalize vectors shorter than this
+VECTOR_EPSILON = 2.220446049250313e-16
+# FreeCAD's Vector.getAngle() returns this value for null vectors
+ANGLE_OF_NULL_VECTOR = 1.7976931348623157e308
+
+# Movement types, see getMovement() of the Dependency classes
+MOVE_NONE = 0  # refPoint, zero vector
+MOVE_POINT = 1  # foreign refPoint - refPoint
+MOVE_PLANE = 2  # projection onto foreign normal
+MOVE_AXIAL = 3
+MOVE_LINE_POINT = 4  # pointOnLine, refType "point"
+MOVE_LINE_AXIS = 5  # pointOnLine, refType "pointAxis"
+MOVE_PLANE_POINT = 6  # pointOnPlane, refType "point" (same as MOVE_PLANE)
+MOVE_PLANE_PLANE = 7  # pointOnPlane, refType "plane"
+
+# Rotation types, see getRotation() of the Dependency classes
+ROT_NONE = 0
+ROT_AXIS = 1  # Dependency.getRotation()
+ROT_ANGLE = 2  # angledPlanes, axisPlaneParallel, axisPlaneAngle
+
+MOVE_TYPES = {
+    "DependencyPointIdentity": MOVE_POINT,
+    "DependencyCircularEdge": MOVE_POINT,
+    "DependencyCenterOfMass": MOVE_POINT,
+    "DependencyPlane": MOVE_PLANE,
+    "DependencyAxial": MOVE_AXIAL,
+    "DependencyParallelPlanes": MOVE_NONE,
+    "DependencyAngledPlanes": MOVE_NONE,
+    "DependencyAxisParallel": MOVE_NONE,
+    "DependencyAxisPlaneParallel": MOVE_NONE,
+    "DependencyAxisPlaneAngle": MOVE_NONE,
+    "DependencyAxisPlaneNormal": MOVE_NONE,
+}
+
+
+def getMoveType(dep):
+    return moveTypeOf(dep.__class__.__name__, dep.refType)
+
+
+def moveTypeOf(className, refType):
+    if className == "DependencyPointOnLine":
+        if refType == "point":
+            return MOVE_LINE_POINT
+        return MOVE_LINE_AXIS
+    if className == "DependencyPointOnPlane":
+        if refType == "point":
+            return MOVE_PLANE_POINT
+        return MOVE_PLANE_PLANE
+    try:
+        return MOVE_TYPES[className]
+    except KeyError:
+        raise NotImplementedError(
+            "SolverKernel does not support dependency class {}".format(className)
+        )
+
+
+def getRotationType(dep):
+    """returns (rotationType, targetAngle in degrees)"""
+    angle = None
+    if dep.angle is not None:
+        angle = dep.angle.Value
+    return rotationTypeOf(dep.__class__.__name__, angle, dep.axisRotationEnabled)
+
+
+def rotationTypeOf(className, angle, axisRotationEnabled):
+    """angle of the constraint in degrees or None"""
+    if className == "DependencyAngledPlanes":
+        return ROT_ANGLE, abs(angle)
+    if className == "DependencyAxisPlaneParallel":
+        return ROT_ANGLE, 90.0
+    if className == "DependencyAxisPlaneAngle":
+        return ROT_ANGLE, abs(angle) + 90.0
+    if axisRotationEnabled:
+        return ROT_AXIS, 0.0
+    return ROT_NONE, 0.0
+
+
+# ------------------------------------------------------------------------------
+def vecToArray(v):
+    if v is None:
+        return (numpy.nan, numpy.nan, numpy.nan)
+    return (v.x, v.y, v.z)
+
+
+def rowDot(a, b):
+    return numpy.einsum("ij,ij->i", a, b)
+
+
+def rowLength(a):
+    return numpy.sqrt(rowDot(a, a))
+
+
+def rowAngle(a, b):
+    """same as FreeCAD's Vector.getAngle() for each row, in radians"""
+    divid = rowLength(a) * rowLength(b)
+    valid = divid > 1e-10
+    cosAngle = numpy.ones(len(a))
+    cosAngle[valid] = rowDot(a[valid], b[valid]) / divid[valid]
+    angle = numpy.arccos(numpy.clip(cosAngle, -1.0, 1.0))
+    angle[~valid] = ANGLE_OF_NULL_VECTOR
+    return angle
+
+
+def rowNormalize(a, minLength=VECTOR_EPSILON):
+    """returns normalized rows and a mask of rows which could be normalized"""
+    length = rowLength(a)
+    valid = length >= minLength
+    result = numpy.zeros_like(a)
+    result[valid] = a[valid] / length[valid, None]
+    return result, valid
+
+
+def rowPerpendicular(a):
+    """a unit vector perpendicular to each row, always the same for a row"""
+    # cross with the coordinate axis least parallel to the row
+    basis = numpy.zeros_like(a)
+    basis[numpy.arange(len(a)), numpy.argmin(numpy.abs(a), axis=1)] = 1.0
+    result, _ = rowNormalize(numpy.cross(a, basis))
+    return result
+
+
+def rotationMatrices(axes, anglesDeg):
+    """Rodrigues formula for a batch of unit axes, angles in degrees"""
+    angles = numpy.radians(anglesDeg)
+    c = numpy.cos(angles)
+    s = numpy.sin(angles)
+    t = 1.0 - c
+    x, y, z = axes[:, 0], axes[:, 1], axes[:, 2]
+    R = numpy.empty((len(axes), 3, 3))
+    R[:, 0, 0] = t * x * x + c
+    R[:, 0, 1] = t * x * y - s * z
+    R[:, 0, 2] = t * x * z + s * y
+    R[:, 1, 0] = t * x * y + s * z
+    R[:, 1, 1] = t * y * y + c
+    R[:, 1, 2] = t * y * z - s * x
+    R[:, 2, 0] = t * x * z - s * y
+    R[:, 2, 1] = t * y * z + s * x
+    R[:, 2, 2] = t * z * z + c
+    return R
+
+
+def quaternions(axes, anglesDeg):
+    """quaternions (x,y,z,w) for a batch of unit axes, angles in degrees"""
+    half = numpy.radians(anglesDeg) * 0.5
+    q = numpy.empty((len(axes), 4))
+    q[:, :3] = axes * numpy.sin(half)[:, None]
+    q[:, 3] = numpy.cos(half)
+    return q
+
+
+def quaternionProducts(a, b):
+    """row wise quaternion product a*b, quaternions as (x,y,z,w)"""
+    ax, ay, az, aw = a[:, 0], a[:, 1], a[:, 2], a[:, 3]
+    bx, by, bz, bw = b[:, 0], b[:, 1], b[:, 2], b[:, 3]
+    q = numpy.empty_like(a)
+    q[:, 0] = aw * bx + ax * bw + ay * bz - az * by
+    q[:, 1] = aw * by - ax * bz + ay * bw + az * bx
+    q[:, 2] = aw * bz + ax * by - ay * bx + az * bw
+    q[:, 3] = aw * bw - ax * bx - ay * by - az * bz
+    return q
+
+
+# ------------------------------------------------------------------------------
+class SolverKernel:
+    """
+    Structure of arrays for all enabled dependencies of a worklist.
+
+    Per dependency: refPoint, refAxisEnd, index of its foreign dependency,
+    index of the owning rigid and the movement/rotation type.
+    Per rigid: spinCenter, refPointsBoundBoxSize, the accumulated placement
+    step since the last sync and the results of calcMoveData().
+    """
+
+    # arrays needed to rebuild a kernel without rigids, see getState()
+    STATE_ARRAYS = (
+        "refPoint",
+        "refAxisEnd",
+        "owner",
+        "foreign",
+        "moveType",
+        "rotationType",
+        "targetAngle",
+        "directionNone",
+        "useRefPointSpin",
+        "spinCenter",
+        "refPointsBoundBoxSize",
+        "maxPosError",
+        "maxAxisError",
+        "maxSingleAxisError",
+        "active",
+    )
+    # arrays changed by calcMoveData()/move(), see getResult()
+    RESULT_ARRAYS = (
+        "refPoint",
+        "refAxisEnd",
+        "spinCenter",
+        "accRotation",
+        "accBase",
+        "rigidMoved",
+        "moveVectorSum",
+        "spin",
+        "countSpinVectors",
+        "maxPosError",
+        "maxAxisError",
+        "maxSingleAxisError",
+    )
+
+    # arrays changed by move(), see saveGeometry()
+    GEOMETRY_ARRAYS = (
+        "refPoint",
+        "refAxisEnd",
+        "spinCenter",
+        "accRotation",
+        "accBase",
+        "rigidMoved",
+    )
+
+    def __init__(self, workList=None, state=None):
+        """
+        Build the arrays from the rigids of a worklist or, without any
+        rigid or FreeCAD object, from a state returned by getState()
+        """
+        if state is not None:
+            self.rigids = None
+            self.dependencies = None
+            self.depIndex = {}
+            for name in self.STATE_ARRAYS:
+                setattr(self, name, numpy.array(state[name]))
+            self.nRigids = len(self.spinCenter)
+            self.nDeps = len(self.refPoint)
+            self._initArrays()
+            self._setActive(self.active)
+            return
+
+        self.rigids = list(workList)
+        rigidIndex = {}
+        for i, rig in enumerate(self.rigids):
+            rigidIndex[id(rig)] = i
+            rig.moved = True
+
+        self.dependencies = []
+        for rig in self.rigids:
+            for dep in rig.dependencies:
+                if dep.Enabled and id(dep.dependedRigid) in rigidIndex:
+                    self.dependencies.append(dep)
+        depIndex = {}
+        for i, dep in enumerate(self.dependencies):
+            depIndex[id(dep)] = i
+        self.depIndex = depIndex
+
+        nDeps = len(self.dependencies)
+        nRigids = len(self.rigids)
+        self.nDeps = nDeps
+        self.nRigids = nRigids
+
+        self.refPoint = numpy.array(
+            [vecToArray(d.refPoint) for d in self.dependencies], dtype=numpy.float64
+        ).reshape(nDeps, 3)
+        self.refAxisEnd = numpy.array(
+            [vecToArray(d.refAxisEnd) for d in self.dependencies], dtype=numpy.float64
+        ).reshape(nDeps, 3)
+        self.owner = numpy.array(
+            [rigidIndex[id(d.currentRigid)] for d in self.dependencies],
+            dtype=numpy.intp,
+        )
+        self.foreign = numpy.array(
+            [depIndex[id(d.foreignDependency)] for d in self.dependencies],
+            dtype=numpy.intp,
+        )
+        self.moveType = numpy.array(
+            [getMoveType(d) for d in self.dependencies], dtype=numpy.int8
+        )
+        rotationTypes = [getRotationType(d) for d in self.dependencies]
+        self.rotationType = numpy.array(
+            [r[0] for r in rotationTypes], dtype=numpy.int8
+        )
+        self.targetAngle = numpy.array(
+            [r[1] for r in rotationTypes], dtype=numpy.float64
+        )
+        self.directionNone = numpy.array(
+            [d.direction == "none" for d in self.dependencies], dtype=bool
+        )
+        self.useRefPointSpin = numpy.array(
+            [bool(d.useRefPointSpin) for d in self.dependencies], dtype=bool
+        )
+
+        self.spinCenter = numpy.array(
+            [vecToArray(r.spinCenter) for r in self.rigids], dtype=numpy.float64
+        ).reshape(nRigids, 3)
+        self.refPointsBoundBoxSize = numpy.array(
+            [r.refPointsBoundBoxSize for r in self.rigids], dtype=numpy.float64
+        )
+        self.maxPosError = numpy.array([r.maxPosError for r in self.rigids])
+        self.maxAxisError = numpy.array([r.maxAxisError for r in self.rigids])
+        self.maxSingleAxisError = numpy.array(
+            [r.maxSingleAxisError for r in self.rigids]
+        )
+
+        self._initArrays()
+        self.updateActiveSet()
+
+    def _initArrays(self):
+        nRigids = self.nRigids
+        self.depCount = numpy.bincount(self.owner, minlength=nRigids)
+
+        # results of calcMoveData()
+        self.moveVectorSum = numpy.zeros((nRigids, 3))
+        self.spin = numpy.zeros((nRigids, 3))
+        self.countSpinVectors = numpy.zeros(nRigids, dtype=numpy.intp)
+
+        # placement steps accumulated since last sync, quaternion (x,y,z,w) + base
+        self.accRotation = numpy.zeros((nRigids, 4))
+        self.accRotation[:, 3] = 1.0
+        self.accBase = numpy.zeros((nRigids, 3))
+        self.rigidMoved = numpy.zeros(nRigids, dtype=bool)
+
+        # momentum acceleration, steps as (rotation vector in degrees, translation)
+        self.acceleration = False
+        self.velocity = numpy.zeros((nRigids, 6))
+        self.gain = numpy.ones(nRigids)
+        self.lastError = numpy.full(nRigids, numpy.inf)
+
+        self._prepareSpinIndices()
+
+    def _prepareSpinIndices(self):
+        """
+        refPoint spin of a rigid is calculated relative to its first
+        dependency with useRefPointSpin (see Rigid.calcMoveData)
+        """
+        spinDeps = numpy.nonzero(self.useRefPointSpin)[0]
+        spinOwners = self.owner[spinDeps]
+        spinCount = numpy.bincount(spinOwners, minlength=self.nRigids)
+        # dependencies of a rigid are contiguous, so the first index is unique
+        owners, firstPos = numpy.unique(spinOwners, return_index=True)
+        firstSpinDep = numpy.full(self.nRigids, -1, dtype=numpy.intp)
+        firstSpinDep[owners] = spinDeps[firstPos]
+        isFirst = numpy.zeros(self.nDeps, dtype=bool)
+        isFirst[spinDeps[firstPos]] = True
+        # spin is only calculated if there are at least 2 spin deps
+        usable = spinCount[spinOwners] >= 2
+        self.spinDeps = spinDeps[usable & ~isFirst[spinDeps]]
+        self.spinFirst = firstSpinDep[self.owner[self.spinDeps]]
+
+    def updateActiveSet(self):
+        """
+        Has to be called if fixed/tempfixed of a rigid has been changed
+        """
+        self._setActive(
+            numpy.array([not (r.fixed or r.tempfixed) for r in self.rigids], dtype=bool)
+        )
+        self.resetAcceleration()
+
+    def resetAcceleration(self):
+        self.velocity[:] = 0.0
+        self.gain[:] = 1.0
+        self.lastError[:] = numpy.inf
+
+    def _setActive(self, active):
+        self.active = active
+        self.activeDeps = self.active[self.owner]
+        inactive = ~self.active
+        # inactive rigids keep their last errors, as in Rigid.calcMoveData()
+        if inactive.any():
+            self.staleErrors = (
+                self.maxPosError[inactive].max(),
+                self.maxAxisError[inactive].max(),
+                self.maxSingleAxisError[inactive].max(),
+            )
+        else:
+            self.staleErrors = (0.0, 0.0, 0.0)
+
+    def getState(self):
+        """picklable description of the kernel, free of FreeCAD objects"""
+        state = {}
+        for name in self.STATE_ARRAYS:
+            state[name] = getattr(self, name)
+        return state
+
+    def getResult(self):
+        result = {}
+        for name in self.RESULT_ARRAYS:
+            result[name] = getattr(self, name)
+        return result
+
+    def setResult(self, result):
+        """take over the result of a kernel built by getState()"""
+        for name in self.RESULT_ARRAYS:
+            setattr(self, name, numpy.array(result[name]))
+
+    def saveGeometry(self):
+        return tuple(getattr(self, name).copy() for name in self.GEOMETRY_ARRAYS)
+
+    def restoreGeometry(self, saved):
+        for name, array in zip(self.GEOMETRY_ARRAYS, saved):
+            setattr(self, name, array.copy())
+
+    # --------------------------------------------------------------------------
+    def residuals(self, spinAccuracy):
+        """
+        moveVectors and rotations (degrees) of the dependencies of active
+        rigids as one vector, 6 values per dependency. Deterministic, so
+        it can be differentiated numerically.
+        """
+        refPoints, moveVectors = self.calcMovement()
+        rotations, valid = self.calcRotation(spinAccuracy, deterministic=True)
+        rotations[~valid] = 0.0
+        rows = self.activeDeps
+        return numpy.hstack((moveVectors[rows], rotations[rows])).ravel()
+
+    def applyRigidSteps(self, moving, steps):
+        """
+        move rigids in mask moving by steps, rows of
+        (rotation vector in degrees, translation)
+        """
+        spinStep = rowLength(steps[:, :3])
+        spinAxis, ok = rowNormalize(steps[:, :3])
+        spinAxis[~ok] = (0.0, 0.0, 1.0)
+        spinStep[~ok] = 0.0
+        self.applyPlacementSteps(moving, spinAxis, spinStep, steps[:, 3:].copy())
+
+    # --------------------------------------------------------------------------
+    def calcMovement(self):
+        """returns (refPoints, moveVectors) for all dependencies"""
+        P = self.refPoint
+        E = self.refAxisEnd
+        FP = P[self.foreign]
+        FE = E[self.foreign]
+        refPoints = P.copy()
+        moveVectors = numpy.zeros_like(P)
+        vec1 = FP - P
+
+        mask = self.moveType == MOVE_POINT
+        moveVectors[mask] = vec1[mask]
+
+        mask = (self.moveType == MOVE_PLANE) | (self.moveType == MOVE_PLANE_POINT)
+        if mask.any():
+            normal = FE[mask] - FP[mask]
+            moveVectors[mask] = normal * rowDot(vec1[mask], normal)[:, None]
+
+        mask = self.moveType == MOVE_PLANE_PLANE
+        if mask.any():
+            normal = E[mask] - P[mask]
+            mv = normal * rowDot(vec1[mask], normal)[:, None]
+            moveVectors[mask] = mv
+            refPoints[mask] = P[mask] + vec1[mask] - mv
+
+        mask = self.moveType == MOVE_LINE_POINT
+        if mask.any():
+            axis = FE[mask] - FP[mask]
+            moveVectors[mask] = vec1[mask] - axis * rowDot(vec1[mask], axis)[:, None]
+
+        mask = self.moveType == MOVE_LINE_AXIS
+        if mask.any():
+            axis = E[mask] - P[mask]
+            projection = axis * rowDot(vec1[mask], axis)[:, None]
+            refPoints[mask] = P[mask] + projection
+            moveVectors[mask] = vec1[mask] - projection
+
+        mask = self.moveType == MOVE_AXIAL
+        if mask.any():
+            ownAxis = E[mask] - P[mask]
+            dot = rowDot(vec1[mask], ownAxis)
+            ownAxisNormalized, _ = rowNormalize(ownAxis)
+            parallelToAxisVec = ownAxisNormalized * dot[:, None]
+            refPoints[mask] = P[mask] + parallelToAxisVec
+            moveVectors[mask] = vec1[mask] - parallelToAxisVec
+
+        return refPoints, moveVectors
+
+    def calcRotation(self, spinAccuracy, deterministic=False):
+        """
+        returns (rotations, valid) for all dependencies,
+        same as Dependency.getRotation(). With deterministic, degenerated
+        (anti)parallel axes are turned about a fixed perpendicular axis
+        instead of a random one.
+        """
+        nDeps = self.nDeps
+        rotations = numpy.zeros((nDeps, 3))
+        valid = numpy.zeros(nDeps, dtype=bool)
+        P = self.refPoint
+        E = self.refAxisEnd
+
+        mask = (self.rotationType == ROT_AXIS) & self.activeDeps
+        if mask.any():
+            idx = numpy.nonzero(mask)[0]
+            rigAxis = E[idx] - P[idx]
+            fIdx = self.foreign[idx]
+            foreignAxis = E[fIdx] - P[fIdx]
+
+            dirNone = self.directionNone[idx]
+            # direction aligned/opposed: disturb antiparallel axes
+            dot = rowDot(rigAxis, foreignAxis)
+            disturb = (~dirNone) & (numpy.abs(dot + 1.0) < spinAccuracy * 1e-1)
+            if deterministic:
+                turn = disturb
+                disturb = numpy.zeros_like(disturb)
+            if disturb.any():
+                foreignAxis[disturb] += numpy.random.uniform(
+                    -spinAccuracy * 1e-1, spinAccuracy * 1e-1, (disturb.sum(), 3)
+                )
+            # direction none: use the nearer orientation of the foreign axis
+            if dirNone.any():
+                angle1 = numpy.abs(rowAngle(foreignAxis, rigAxis))
+                flip = dirNone & (angle1 > math.pi - angle1)
+                foreignAxis[flip] *= -1.0
+
+            axis = numpy.cross(rigAxis, foreignAxis)
+            axis, ok = rowNormalize(axis * 1.0e6)
+            angle = numpy.degrees(rowAngle(foreignAxis, rigAxis))
+            if deterministic and turn.any():
+                axis[turn] = rowPerpendicular(rigAxis[turn])
+                ok[turn] = True
+            rotations[idx] = axis * angle[:, None]
+            valid[idx] = ok
+
+        mask = (self.rotationType == ROT_ANGLE) & self.activeDeps
+        if mask.any():
+            idx = numpy.nonzero(mask)[0]
+            rigAxis = E[idx] - P[idx]
+            fIdx = self.foreign[idx]
+            foreignAxis = E[fIdx] - P[fIdx]
+            recentAngle = numpy.degrees(rowAngle(foreignAxis, rigAxis))
+            deltaAngle = self.targetAngle[idx] - recentAngle
+            axis, ok = rowNormalize(numpy.cross(rigAxis, foreignAxis))
+            rot = axis * -deltaAngle[:, None]
+            # parallel axes, do a small random rotation
+            nBad = len(idx) - ok.sum()
+            if nBad > 0 and deterministic:
+                rot[~ok] = rowPerpendicular(rigAxis[~ok]) * -deltaAngle[~ok, None]
+            elif nBad > 0:
+                rot[~ok] = numpy.random.uniform(
+                    -spinAccuracy * 1e-1, spinAccuracy * 1e-1, (nBad, 3)
+                )
+            rotations[idx] = rot
+            valid[idx] = True
+
+        return rotations, valid
+
+    def calcMoveData(self, spinAccuracy):
+        """
+        Rigid.calcMoveData() for all active rigids.
+        returns (maxPosError, maxAxisError, maxSingleAxisError) of the worklist
+        """
+        nRigids = self.nRigids
+        active = self.active
+        owner = self.owner
+        activeDeps = self.activeDeps
+
+        refPoints, moveVectors = self.calcMovement()
+        moveLength = rowLength(moveVectors)
+
+        maxPosError = numpy.zeros(nRigids)
+        maxAxisError = numpy.zeros(nRigids)
+        maxSingleAxisError = numpy.zeros(nRigids)
+        countSpinVectors = numpy.zeros(nRigids, dtype=numpy.intp)
+        spin = numpy.zeros((nRigids, 3))
+
+        # linear movement, average of all moveVectors
+        numpy.maximum.at(maxPosError, owner[activeDeps], moveLength[activeDeps])
+        moveVectorSum = numpy.zeros((nRigids, 3))
+        for k in range(3):
+            moveVectorSum[:, k] = numpy.bincount(
+                owner, weights=moveVectors[:, k], minlength=nRigids
+            )
+        hasDeps = self.depCount > 0
+        moveVectorSum[hasDeps] /= self.depCount[hasDeps, None]
+
+        # rotation caused by refPoint attractions
+        spinDeps = self.spinDeps[activeDeps[self.spinDeps]]
+        if len(spinDeps) > 0:
+            first = self.spinFirst[activeDeps[self.spinDeps]]
+            spinOwner = owner[spinDeps]
+            vec1 = refPoints[spinDeps] - refPoints[first]  # 'aka Radius'
+            vec2 = moveVectors[spinDeps] - moveVectors[first]  # 'aka Force'
+            torque = numpy.cross(vec1, vec2)
+            vec1, ok1 = rowNormalize(vec1)
+            vec1 *= self.refPointsBoundBoxSize[spinOwner, None]
+            vec3 = vec1 + vec2
+            with numpy.errstate(over="ignore", invalid="ignore"):
+                beta = numpy.degrees(rowAngle(vec3, vec1))
+            numpy.maximum.at(maxSingleAxisError, spinOwner[ok1], beta[ok1])
+            torque, ok2 = rowNormalize(torque * 1.0e6)
+            ok = ok1 & ok2
+            with numpy.errstate(over="ignore", invalid="ignore"):
+                torque *= (beta * WEIGHT_REFPOINT_ROTATION)[:, None]
+            for k in range(3):
+                spin[:, k] += numpy.bincount(
+                    spinOwner[ok], weights=torque[ok, k], minlength=nRigids
+                )
+            countSpinVectors += numpy.bincount(spinOwner[ok], minlength=nRigids)
+
+        # rotation caused by the axis of the dependencies
+        rotations, valid = self.calcRotation(spinAccuracy)
+        if valid.any():
+            rotOwner = owner[valid]
+            rotations = rotations[valid]
+            for k in range(3):
+                spin[:, k] += numpy.bincount(
+                    rotOwner, weights=rotations[:, k], minlength=nRigids
+                )
+            numpy.maximum.at(maxSingleAxisError, rotOwner, rowLength(rotations))
+            countSpinVectors += numpy.bincount(rotOwner, minlength=nRigids)
+
+        maxAxisError = rowLength(spin)
+
+        self.moveVectorSum[active] = moveVectorSum[active]
+        self.spin[active] = spin[active]
+        self.countSpinVectors[active] = countSpinVectors[active]
+        self.maxPosError[active] = maxPosError[active]
+        self.maxAxisError[active] = maxAxisError[active]
+        self.maxSingleAxisError[active] = maxSingleAxisError[active]
+
+        if active.any():
+            return (
+                max(maxPosError[active].max(), self.staleErrors[0]),
+                max(maxAxisError[active].max(), self.staleErrors[1]),
+                max(maxSingleAxisError[active].max(), self.staleErrors[2]),
+            )
+        return self.staleErrors
+
+    def move(self):
+        """Rigid.move() for all active rigids"""
+        nRigids = self.nRigids
+        moveDist = self.moveVectorSum * WEIGHT_LINEAR_MOVE
+
+        spinLength = rowLength(self.spin)
+        rotate = self.active & (spinLength != 0.0) & (self.countSpinVectors != 0)
+        spinAxis, ok = rowNormalize(self.spin * 1.0e12)
+        rotate &= ok
+        translate = (
+            self.active & ~rotate & (rowLength(moveDist) > 1e-8)
+        )
+        moving = rotate | translate
+        if not moving.any():
+            return
+
+        spinAngle = numpy.zeros(nRigids)
+        spinAngle[rotate] = numpy.minimum(
+            spinLength[rotate] / self.countSpinVectors[rotate], MAX_SPIN_ANGLE
+        )
+        spinStep = spinAngle / SPINSTEP_DIVISOR
+        spinAxis[~rotate] = (0.0, 0.0, 1.0)
+        spinStep[~rotate] = 0.0
+        moveDist[~moving] = 0.0
+
+        if self.acceleration:
+            self.accelerate(moving, spinAxis * spinStep[:, None], moveDist)
+            return
+        self.applyPlacementSteps(moving, spinAxis, spinStep, moveDist)
+
+    def accelerate(self, moving, spinVector, moveDist):
+        """
+        Momentum variant of move(): the plain steps are added to the
+        decayed last steps and lengthened while the error of a rigid
+        decreases. A rigid whose error grows falls back to the plain step.
+        """
+        error = self.maxPosError + self.maxAxisError
+        grown = error > self.lastError
+        self.velocity[grown] = 0.0
+        self.gain[grown] = 1.0
+        self.gain[~grown] = numpy.minimum(
+            self.gain[~grown] * ACCELERATION_GAIN_GROWTH, ACCELERATION_MAX_GAIN
+        )
+        self.lastError = error
+
+        plainSteps = numpy.hstack((spinVector, moveDist))
+        plainSteps[~moving] = 0.0
+        self.velocity = (
+            ACCELERATION_MOMENTUM * self.velocity + self.gain[:, None] * plainSteps
+        )
+        self.velocity[~self.active] = 0.0
+        # keep the spin clamp of the plain step
+        spin = rowLength(self.velocity[:, :3])
+        limit = MAX_SPIN_ANGLE / SPINSTEP_DIVISOR * ACCELERATION_MAX_GAIN
+        tooLarge = spin > limit
+        self.velocity[tooLarge, :3] *= (limit / spin[tooLarge])[:, None]
+
+        accelerated = self.active & (rowLength(self.velocity) > 0.0)
+        self.applyRigidSteps(accelerated, self.velocity)
+
+    def applyPlacementSteps(self, moving, spinAxis, spinStep, moveDist):
+        """
+        Same as FreeCAD.Placement(moveDist, Rotation(spinAxis, spinStep), spinCenter)
+        applied by Rigid.applyPlacementStep() to all rigids in mask moving
+        """
+        R = rotationMatrices(spinAxis, spinStep)
+        center = self.spinCenter
+
+        # move all refPoints/refAxisEnds of moving rigids
+        depMask = moving[self.owner]
+        depOwner = self.owner[depMask]
+        Rd = R[depOwner]
+        cd = center[depOwner]
+        td = moveDist[depOwner]
+        self.refPoint[depMask] = (
+            numpy.einsum("nij,nj->ni", Rd, self.refPoint[depMask] - cd) + cd + td
+        )
+        self.refAxisEnd[depMask] = (
+            numpy.einsum("nij,nj->ni", Rd, self.refAxisEnd[depMask] - cd) + cd + td
+        )
+
+        # accumulate placement: step * accumulated
+        c = center[moving]
+        self.accBase[moving] = (
+            numpy.einsum("nij,nj->ni", R[moving], self.accBase[moving] - c)
+            + c
+            + moveDist[moving]
+        )
+        q = quaternionProducts(
+            quaternions(spinAxis[moving], spinStep[moving]), self.accRotation[moving]
+        )
+        q /= numpy.sqrt(numpy.einsum("ij,ij->i", q, q))[:, None]
+        self.accRotation[moving] = q
+        self.spinCenter[moving] = c + moveDist[moving]
+        self.rigidMoved |= moving
+
+    # --------------------------------------------------------------------------
+    def syncErrors(self):
+        """write the results of calcMoveData() back to the rigids"""
+        for i in numpy.nonzero(self.active)[0]:
+            rig = self.rigids[i]
+            rig.maxPosError = float(self.maxPosError[i])
+            rig.maxAxisError = float(self.maxAxisError[i])
+            rig.maxSingleAxisError = float(self.maxSingleAxisError[i])
+            rig.countSpinVectors = int(self.countSpinVectors[i])
+
+    def syncToRigids(self):
+        """
+        write placements, spinCenters and refPoints back to the rigids
+        and their dependencies
+        """
+        import FreeCAD
+        from FreeCAD import Base
+
+        self.syncErrors()
+        for i in numpy.nonzero(self.active)[0]:
+            rig = self.rigids[i]
+            rig.moveVectorSum = Base.Vector(*self.moveVectorSum[i])
+            rig.spin = Base.Vector(*self.spin[i])
+
+        movedIndices = numpy.nonzero(self.rigidMoved)[0]
+        for i in movedIndices:
+            rig = self.rigids[i]
+            x, y, z, w = self.accRotation[i]
+            step = FreeCAD.Placement(
+                Base.Vector(*self.accBase[i]), FreeCAD.Rotation(x, y, z, w)
+            )
+            rig.placement = step.multiply(rig.placement)
+            rig.spinCenter = Base.Vector(*self.spinCenter[i])
+            # disabled dependencies are not part of the arrays but have to move too
+            for dep in rig.dependencies:
+                if id(dep) not in self.depIndex:
+                    dep.applyPlacement(step)
+        movedDeps = numpy.nonzero(self.rigidMoved[self.owner])[0]
+        for k in movedDeps:
+            dep = self.dependencies[k]
+            dep.refPoint = Base.Vector(*self.refPoint[k])
+            if dep.refAxisEnd is not None:
+                dep.refAxisEnd = Base.Vector(*self.refAxisEnd[k])
+
+        self.accRotation[movedIndices] = (0.0, 0.0, 0.0, 1.0)
+        self.accBase[movedIndices] = 0.0
+        self.rigidMoved[:] = False
+
+
+# ------------------------------------------------------------------------------
+def solveHeadless(
+    state,
+    posAccuracy,
+    spinAccuracy,
+    maxSteps,
+    convergencyCheck,
+    convergencyFactor,
+):
+    """
+    Solve a kernel state completely without rigids and FreeCAD objects,
+    as SolverSystem.calculateWorkList() does for a system without tempfixed
+    rigids. Can be run in a worker process.
+    returns (solved, steps, result), result has to be passed to
+    SolverKernel.setResult() of the kernel which created the state.
+    """
+    kernel = SolverKernel(state=state)
+    lastPositionError = 1.0e20
+    lastAxisError = 1.0e20
+    convergencyCounter = 0
+    steps = 0
+    solved = False
+    while True:
+        steps += 1
+        convergencyCounter += 1
+        maxPosError, maxAxisError, maxSingleAxisError = kernel.calcMoveData(
+            spinAccuracy
+        )
+        kernel.move()
+        if (
+            maxPosError <= posAccuracy
+            and maxAxisError <= spinAccuracy
+            and maxSingleAxisError <= spinAccuracy * 10
+        ):
+            solved = True
+            break
+        if convergencyCounter > convergencyCheck:
+            if (
+                maxPosError >= convergencyFactor * lastPositionError
+                or maxAxisError >= convergencyFactor * lastAxisError
+            ):
+                break
+            lastPositionError = maxPosError
+            lastAxisError = maxAxisError
+            convergencyCounter = 0
+        if steps > maxSteps:
+            break
+    return solved, steps, kernel.getResult()
+
+
+def solveHeadlessTimed(*args):
+    """solveHeadless(*args), returns (seconds, (solved, steps, result))"""
+    startTime = time.time()
+    solution = solveHeadless(*args)
+    return time.time() - startTime, solution
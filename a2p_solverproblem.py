@@ -0,0 +1,233 @@
+# ***************************************************************************
+# *                                                                         *
+# *   Copyright (c) 2018 kbwbe                                              *
+# *                                                                         *
+# *   This program is free software; you can redistribute it and/or modify  *
+# *   it under the terms of the GNU Lesser General Public License (LGPL)    *
+# *   as published by the Free Software Foundation; either version 2 of     *
+# *   the License, or (at your option) any later version.                   *
+# *   for detail see the LICENCE text file.                                 *
+# *                                                                         *
+# *   This program is distributed in the hope that it will be useful,       *
+# *   but WITHOUT ANY WARRANTY; without even the implied warranty of        *
+# *   MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the         *
+# *   GNU Library General Public License for more details.                  *
+# *                                                                         *
+# *   You should have received a copy of the GNU Library General Public     *
+# *   License along with this program; if not, write to the Free Software   *
+# *   Foundation, Inc., 59 Temple Place, Suite 330, Boston, MA  02111-1307  *
+# *   USA                                                                   *
+# *                                                                         *
+# ***************************************************************************
+
+
+"""
+Serialized description of a solver problem, solvable without FreeCAD.
+
+A SolverProblem holds the rigids (name, fixed, placement) and the
+dependencies (type, refPoint, refAxisEnd, direction, offset, angle, ...)
+as plain floats and strings. It can be stored as JSON and solved by
+SolverKernel in any Python process with NumPy; only this module,
+a2p_solverkernel and a2p_mathcore are needed.
+
+FreeCAD is only touched by the adapter functions: fromSolverSystem()
+after loading a SolverSystem and applyToSolverSystem() to write the
+solved placements back.
+"""
+
+import json
+import numpy
+from a2p_mathcore import Vector, Rotation, Placement
+from a2p_solverkernel import solveHeadless, moveTypeOf, rotationTypeOf
+
+# same as in a2p_solversystem, which can not be imported without FreeCAD
+SOLVER_MAXSTEPS = 50000
+SOLVER_STEPS_CONVERGENCY_CHECK = 150
+SOLVER_CONVERGENCY_FACTOR = 0.99
+
+
+def _vectorTuple(v):
+    if v is None:
+        return None
+    return (v.x, v.y, v.z)
+
+
+# ------------------------------------------------------------------------------
+class SolverProblem:
+    def __init__(self, rigids=None, dependencies=None):
+        # rigid: dict(name, label, fixed, placement=(x, y, z, qx, qy, qz, qw))
+        self.rigids = rigids or []
+        # dependency: dict(constraint, className, type, refType, rigid, foreign,
+        # refPoint, refAxisEnd, direction, offset, angle, axisRotationEnabled,
+        # useRefPointSpin), rigid is an index into rigids, foreign an index
+        # into dependencies
+        self.dependencies = dependencies or []
+
+    # --------------------------------------------------------------------------
+    @staticmethod
+    def fromSolverSystem(ss):
+        """FreeCAD adapter: describe the loaded system of a SolverSystem"""
+        rigidIndex = {}
+        rigids = []
+        for i, rig in enumerate(ss.rigids):
+            rigidIndex[id(rig)] = i
+            pl = rig.placement
+            rigids.append(
+                {
+                    "name": rig.objectName,
+                    "label": rig.label,
+                    "fixed": bool(rig.fixed),
+                    "placement": _vectorTuple(pl.Base) + tuple(pl.Rotation.Q),
+                }
+            )
+        deps = [d for rig in ss.rigids for d in rig.dependencies]
+        depIndex = dict((id(d), i) for i, d in enumerate(deps))
+        dependencies = []
+        for d in deps:
+            angle = None
+            if d.angle is not None:
+                angle = d.angle.Value
+            dependencies.append(
+                {
+                    "constraint": d.constraint.Name,
+                    "className": d.__class__.__name__,
+                    "type": d.Type,
+                    "refType": d.refType,
+                    "rigid": rigidIndex[id(d.currentRigid)],
+                    "foreign": depIndex[id(d.foreignDependency)],
+                    "refPoint": _vectorTuple(d.refPoint),
+                    "refAxisEnd": _vectorTuple(d.refAxisEnd),
+                    "direction": d.direction,
+                    "offset": d.offset,
+                    "angle": angle,
+                    "axisRotationEnabled": bool(d.axisRotationEnabled),
+                    "useRefPointSpin": bool(d.useRefPointSpin),
+                }
+            )
+        return SolverProblem(rigids, dependencies)
+
+    def toDict(self):
+        return {"rigids": self.rigids, "dependencies": self.dependencies}
+
+    @staticmethod
+    def fromDict(data):
+        return SolverProblem(data["rigids"], data["dependencies"])
+
+    def toJSON(self, path=None):
+        text = json.dumps(self.toDict())
+        if path is not None:
+            with open(path, "w") as f:
+                f.write(text)
+        return text
+
+    @staticmethod
+    def fromJSON(text=None, path=None):
+        if path is not None:
+            with open(path) as f:
+                text = f.read()
+        return SolverProblem.fromDict(json.loads(text))
+
+    # --------------------------------------------------------------------------
+    def kernelState(self):
+        """SolverKernel state with all dependencies enabled"""
+        deps = self.dependencies
+        nRigids = len(self.rigids)
+        nan = (numpy.nan, numpy.nan, numpy.nan)
+        refPoint = numpy.array(
+            [d["refPoint"] for d in deps], dtype=numpy.float64
+        ).reshape(len(deps), 3)
+        refAxisEnd = numpy.array(
+            [d["refAxisEnd"] if d["refAxisEnd"] is not None else nan for d in deps],
+            dtype=numpy.float64,
+        ).reshape(len(deps), 3)
+        owner = numpy.array([d["rigid"] for d in deps], dtype=numpy.intp)
+        rotationTypes = [
+            rotationTypeOf(d["className"], d["angle"], d["axisRotationEnabled"])
+            for d in deps
+        ]
+
+        # same as Rigid.calcSpinBasicDataDepsEnabled()
+        spinCenter = numpy.array(
+            [r["placement"][:3] for r in self.rigids], dtype=numpy.float64
+        ).reshape(nRigids, 3)
+        refPointsBoundBoxSize = numpy.zeros(nRigids)
+        for i in range(nRigids):
+            points = refPoint[owner == i]
+            if len(points) == 0:
+                continue
+            spinCenter[i] = points.mean(axis=0)
+            vmin = numpy.minimum(points.min(axis=0), 0.0)
+            vmax = numpy.maximum(points.max(axis=0), 0.0)
+            refPointsBoundBoxSize[i] = numpy.sqrt(((vmax - vmin) ** 2).sum())
+
+        return {
+            "refPoint": refPoint,
+            "refAxisEnd": refAxisEnd,
+            "owner": owner,
+            "foreign": numpy.array([d["foreign"] for d in deps], dtype=numpy.intp),
+            "moveType": numpy.array(
+                [moveTypeOf(d["className"], d["refType"]) for d in deps],
+                dtype=numpy.int8,
+            ),
+            "rotationType": numpy.array(
+                [r[0] for r in rotationTypes], dtype=numpy.int8
+            ),
+            "targetAngle": numpy.array([r[1] for r in rotationTypes]),
+            "directionNone": numpy.array(
+                [d["direction"] == "none" for d in deps], dtype=bool
+            ),
+            "useRefPointSpin": numpy.array(
+                [d["useRefPointSpin"] for d in deps], dtype=bool
+            ),
+            "spinCenter": spinCenter,
+            "refPointsBoundBoxSize": refPointsBoundBoxSize,
+            "maxPosError": numpy.zeros(nRigids),
+            "maxAxisError": numpy.zeros(nRigids),
+            "maxSingleAxisError": numpy.zeros(nRigids),
+            "active": numpy.array([not r["fixed"] for r in self.rigids], dtype=bool),
+        }
+
+    def solve(self, posAccuracy=1.0e-5, spinAccuracy=1.0e-5, maxSteps=SOLVER_MAXSTEPS):
+        """
+        solve all rigids at once by the attraction solver.
+        returns (solved, steps, placements), placements is a list of
+        a2p_mathcore.Placement in the order of self.rigids
+        """
+        solved, steps, result = solveHeadless(
+            self.kernelState(),
+            posAccuracy,
+            spinAccuracy,
+            maxSteps,
+            SOLVER_STEPS_CONVERGENCY_CHECK,
+            SOLVER_CONVERGENCY_FACTOR,
+        )
+        placements = []
+        for i, rigid in enumerate(self.rigids):
+            placement = Placement.fromTuple(rigid["placement"])
+            if result["rigidMoved"][i]:
+                step = Placement(
+                    Vector(*result["accBase"][i]), Rotation(*result["accRotation"][i])
+                )
+                placement = step.multiply(placement)
+            placements.append(placement)
+        return solved, steps, placements
+
+    # --------------------------------------------------------------------------
+    def applyToSolverSystem(self, ss, doc, placements):
+        """
+        FreeCAD adapter: write solved placements to the rigids of the
+        SolverSystem the problem was created from, and to the document
+        """
+        import FreeCAD
+
+        for rigid, placement in zip(self.rigids, placements):
+            if rigid["fixed"]:
+                continue
+            rig = ss.getRigid(rigid["name"])
+            rig.placement = FreeCAD.Placement(
+                FreeCAD.Vector(*placement.Base.toTuple()),
+                FreeCAD.Rotation(*placement.Rotation.Q),
+            )
+            for dep in rig.dependencies:
+                dep.rebase(ss)
+            rig.applySolution(doc, ss)
@@ -0,0 +1,323 @@
+# ***************************************************************************
+# *                                                                         *
+# *   Copyright (c) 2018 kbwbe                                              *
+# *                                                                         *
+# *   This program is free software; you can redistribute it and/or modify  *
+# *   it under the terms of the GNU Lesser General Public License (LGPL)    *
+# *   as published by the Free Software Foundation; either version 2 of     *
+# *   the License, or (at your option) any later version.                   *
+# *   for detail see the LICENCE text file.                                 *
+# *                                                                         *
+# *   This program is distributed in the hope that it will be useful,       *
+# *   but WITHOUT ANY WARRANTY; without even the implied warranty of        *
+# *   MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the         *
+# *   GNU Library General Public License for more details.                  *
+# *                                                                         *
+# *   You should have received a copy of the GNU Library General Public     *
+# *   License along with this program; if not, write to the Free Software   *
+# *   Foundation, Inc., 59 Temple Place, Suite 330, Boston, MA  02111-1307  *
+# *   USA                                                                   *
+# *                                                                         *
+# ***************************************************************************
+
+
+"""
+Persistent solver sessions for autosolve.
+
+A SolverSession keeps the loaded SolverSystem of a document between solves.
+The SolverSessionObserver marks rigids and constraints as dirty on document
+changes. The next solve only recreates the dependencies of dirty
+constraints and parts, and solves the rigids downstream of the changes in
+the parent hierarchy. All other rigids are treated as fixed.
+
+Whenever the structure of the assembly changes (constraints created,
+deleted or suppressed, fixed parts changed, undo/redo), or an incremental
+solve fails, the system is loaded again from scratch.
+"""
+
+import time
+import a2plib
+from a2plib import Msg
+from a2p_dependencies import Dependency
+from a2p_rigidcluster import SuperRigid
+from a2p_solversystem import SolverSystem
+
+# changes of these constraint properties only need new dependencies
+CONSTRAINT_VALUE_PROPERTIES = (
+    "offset",
+    "angle",
+    "directionConstraint",
+    "lockRotation",
+)
+
+
+# ------------------------------------------------------------------------------
+class SolverSession:
+    """loaded SolverSystem of one document plus its dirty state"""
+
+    def __init__(self, doc):
+        self.docName = doc.Name
+        self.solverSystem = None
+        self.constraintNames = set()
+        self.busy = False  # ignore document changes done by the solver itself
+        self.invalidate()
+
+    def invalidate(self):
+        """force a complete reload on next solve"""
+        self.structureChanged = True
+        self.dirtyPlacements = set()  # objectNames
+        self.dirtyShapes = set()  # objectNames
+        self.dirtyConstraints = set()  # constraint names
+
+    def isDirty(self):
+        return (
+            self.structureChanged
+            or len(self.dirtyPlacements) > 0
+            or len(self.dirtyShapes) > 0
+            or len(self.dirtyConstraints) > 0
+        )
+
+    def knowsRigid(self, objectName):
+        return (
+            self.solverSystem is not None
+            and self.solverSystem.getRigid(objectName) is not None
+        )
+
+    def isCollapsed(self, objectName):
+        """is objectName solved as member of a SuperRigid?"""
+        return self.knowsRigid(objectName) and isinstance(
+            self.solverSystem.getRigid(objectName), SuperRigid
+        )
+
+    def knowsConstraint(self, constraintName):
+        return self.solverSystem is not None and constraintName in self.constraintNames
+
+    def objectChanged(self, obj, prop):
+        if self.busy or self.structureChanged:
+            return
+        if a2plib.isA2pConstraint(obj):
+            if "ConstraintInfo" not in obj.Content:
+                return  # mirror objects are handled by their constraint
+            if not self.knowsConstraint(obj.Name):
+                # new or unsuppressed constraint
+                if not getattr(obj, "Suppressed", False):
+                    self.structureChanged = True
+            elif self.isCollapsed(obj.Object1) or self.isCollapsed(obj.Object2):
+                # may change the relative placements inside a cluster
+                if (
+                    prop in CONSTRAINT_VALUE_PROPERTIES
+                    or prop in ("Suppressed", "Object1", "Object2", "Type")
+                    or prop.startswith("SubElement")
+                ):
+                    self.structureChanged = True
+            elif prop in CONSTRAINT_VALUE_PROPERTIES:
+                self.dirtyConstraints.add(obj.Name)
+            elif prop in ("Suppressed", "Object1", "Object2", "Type"):
+                self.structureChanged = True
+            elif prop.startswith("SubElement"):
+                self.dirtyConstraints.add(obj.Name)
+        elif self.isCollapsed(obj.Name):
+            # the clusters have to be searched again
+            if prop in ("Placement", "Shape", "fixedPosition"):
+                self.structureChanged = True
+        elif self.knowsRigid(obj.Name):
+            if prop == "Placement":
+                self.dirtyPlacements.add(obj.Name)
+            elif prop == "Shape":
+                self.dirtyShapes.add(obj.Name)
+            elif prop == "fixedPosition":
+                self.structureChanged = True
+
+    def objectDeleted(self, obj):
+        if self.busy:
+            return
+        if self.knowsRigid(obj.Name) or self.knowsConstraint(obj.Name):
+            self.structureChanged = True
+
+    # --------------------------------------------------------------------------
+    def solve(self, doc, showFailMessage=True):
+        """solve the document, incrementally if possible"""
+        self.busy = True
+        try:
+            if not self.structureChanged and self.solverSystem is not None:
+                if not self.isDirty():
+                    return True
+                startTime = time.time()
+                systemSolved, solvedCount = self.solveIncremental(doc)
+                if systemSolved:
+                    if not a2plib.SIMULATION_STATE:
+                        Msg(
+                            "Solved {} of {} parts incrementally in {:.3f} s\n".format(
+                                solvedCount,
+                                len(self.solverSystem.rigids),
+                                time.time() - startTime,
+                            )
+                        )
+                    self.clearDirtyState()
+                    return True
+            return self.solveComplete(doc, showFailMessage)
+        finally:
+            self.busy = False
+
+    def clearDirtyState(self):
+        self.structureChanged = False
+        self.dirtyPlacements = set()
+        self.dirtyShapes = set()
+        self.dirtyConstraints = set()
+
+    def solveComplete(self, doc, showFailMessage=True):
+        ss = SolverSystem()
+        ss.keepSystemLoaded = True
+        systemSolved = ss.solveSystem(doc, None, showFailMessage)
+        if ss.status == "loadingDependencyError" or not systemSolved:
+            self.solverSystem = None
+            self.invalidate()
+            return systemSolved
+        self.solverSystem = ss
+        self.constraintNames = set(c.Name for c in ss.constraints)
+        self.clearDirtyState()
+        return systemSolved
+
+    def solveIncremental(self, doc):
+        """
+        returns (systemSolved, number of solved rigids).
+        Only rigids downstream of the changes are solved.
+        """
+        startTime = time.time()
+        ss = self.solverSystem
+        ss.keepSystemLoaded = True
+        ss.setAccuracyLevel(1)
+
+        # take over moved parts
+        movedRigids = set()
+        for objectName in self.dirtyPlacements | self.dirtyShapes:
+            rig = ss.getRigid(objectName)
+            ob = doc.getObject(objectName)
+            if rig is None or ob is None:
+                return False, 0
+            rig.placement = ob.Placement
+            movedRigids.add(rig)
+
+        # recreate the dependencies of changed constraints and shapes
+        constraintNames = set(self.dirtyConstraints)
+        for objectName in self.dirtyShapes:
+            for dep in ss.getRigid(objectName).dependencies:
+                constraintNames.add(dep.constraint.Name)
+        changedRigids = set()
+        for constraintName in constraintNames:
+            c = doc.getObject(constraintName)
+            if c is None:
+                return False, 0
+            rigid1 = ss.getRigid(c.Object1)
+            rigid2 = ss.getRigid(c.Object2)
+            if rigid1 is None or rigid2 is None:
+                return False, 0
+            for rig in (rigid1, rigid2):
+                rig.dependencies = [
+                    d for d in rig.dependencies if d.constraint.Name != constraintName
+                ]
+            try:
+                Dependency.Create(doc, c, ss, rigid1, rigid2)
+            except:
+                return False, 0
+            changedRigids.update((rigid1, rigid2))
+            movedRigids.update(self.downstreamOfConstraint(rigid1, rigid2))
+        ss.retrieveDOFInfo(changedRigids)
+
+        # only rigids downstream of a change can move
+        affected = self.downstreamRigids(movedRigids)
+        savedFixed = {}
+        for rig in ss.rigids:
+            savedFixed[rig] = rig.fixed
+            if rig not in affected:
+                rig.fixed = True
+        try:
+            for rig in ss.rigids:
+                rig.rebase(ss)
+            systemSolved = ss.solveLoadedSystem(
+                doc, None, time.time() - startTime, True
+            )
+        finally:
+            for rig in ss.rigids:
+                rig.fixed = savedFixed[rig]
+        return systemSolved, len(affected)
+
+    def downstreamOfConstraint(self, rigid1, rigid2):
+        """the rigid(s) of a constraint which are farther from a fixed rigid"""
+        d1 = rigid1.disatanceFromFixed
+        d2 = rigid2.disatanceFromFixed
+        if d1 is None or d2 is None or d1 == d2:
+            return [rigid1, rigid2]
+        if d1 < d2:
+            return [rigid2]
+        return [rigid1]
+
+    def downstreamRigids(self, rigids):
+        """rigids and all their children in the parent hierarchy"""
+        return self.solverSystem.hierarchy.downstream(rigids)
+
+
+# ------------------------------------------------------------------------------
+sessions = {}  # document name -> SolverSession
+
+
+def getSession(doc):
+    session = sessions.get(doc.Name)
+    if session is None:
+        session = SolverSession(doc)
+        sessions[doc.Name] = session
+    return session
+
+
+def clearSessions():
+    """
+    forget all sessions, e.g. when the observer is removed and document
+    changes are not seen anymore
+    """
+    sessions.clear()
+
+
+def solveConstraints(doc, useTransaction=True, showFailMessage=True):
+    """same as a2p_solversystem.solveConstraints, using the session of doc"""
+    if useTransaction:
+        doc.openTransaction("a2p_systemSolving")
+    systemSolved = getSession(doc).solve(doc, showFailMessage)
+    if useTransaction:
+        doc.commitTransaction()
+    a2plib.unTouchA2pObjects()
+    return systemSolved
+
+
+# ------------------------------------------------------------------------------
+class SolverSessionObserver(object):
+    """forwards document changes to the solver sessions"""
+
+    def slotChangedObject(self, obj, prop):
+        doc = getattr(obj, "Document", None)
+        if doc is None:
+            return
+        session = sessions.get(doc.Name)
+        if session is not None:
+            session.objectChanged(obj, prop)
+
+    def slotDeletedObject(self, obj):
+        doc = getattr(obj, "Document", None)
+        if doc is None:
+            return
+        session = sessions.get(doc.Name)
+        if session is not None:
+            session.objectDeleted(obj)
+
+    def slotUndoDocument(self, doc):
+        session = sessions.get(doc.Name)
+        if session is not None:
+            session.invalidate()
+
+    def slotRedoDocument(self, doc):
+        self.slotUndoDocument(doc)
+
+    def slotDeletedDocument(self, doc):
+        sessions.pop(doc.Name, None)
+
+
+solverSessionObserver = SolverSessionObserver()
@@ -34,9 +34,25 @@ from a2plib import (
 )
 from a2p_dependencies import Dependency
 from a2p_rigid import Rigid
+from a2p_solverkernel import SolverKernel, solveHeadlessTimed
+from a2p_solvergraph import SolverGraph
+import a2p_dofengine
+import a2p_snapsolver
+import a2p_rigidcluster
+from a2p_solverbackends import getBackend
+from a2p_solvertelemetry import SolverTelemetry
 import os
+import time
+
+try:
+    import multiprocessing
+    from concurrent.futures import ProcessPoolExecutor
+    from concurrent.futures import wait as waitForFutures
+except ImportError:  # Python2
+    ProcessPoolExecutor = None
 
 SOLVER_MAXSTEPS = 50000
+SOLVER_PROCESSPOOL_POLL_INTERVAL = 0.1  # s, check for cancel while waiting on the pool
 
 # SOLVER_CONTROLDATA has been replaced by SolverSystem.getSolverControlData()
 # SOLVER_CONTROLDATA = {
@@ -54,6 +70,8 @@ SOLVER_SPIN_ACCURACY = 1.0e-1  # gets to smaller values during solving
 SOLVER_STEPS_CONVERGENCY_CHECK = 150  # 200
 SOLVER_CONVERGENCY_FACTOR = 0.99
 SOLVER_CONVERGENCY_ERROR_INIT_VALUE = 1.0e20
+SOLVER_PROCESSPOOL_MIN_RIGIDS = 50  # smaller systems are solved faster in place
+SOLVER_PROGRESS_INTERVAL = 20  # steps between progress reports
 
 # ------------------------------------------------------------------------------
 class SolverSystem:
@@ -63,10 +81,14 @@ class SolverSystem:
     Using "attraction" of parts by constraints
     """
 
-    def __init__(self):
+    def __init__(self, backend=None):
         self.doc = None
+        self.backend = getBackend(backend)  # see a2p_solverbackends
+        self.telemetry = SolverTelemetry(enabled=False)
         self.stepCount = 0
         self.rigids = []  # list of rigid bodies
+        self.graph = SolverGraph()  # indexed access to the rigids
+        self.hierarchy = None  # see assignParentship()
         self.constraints = []
         self.objectNames = []
         self.mySOLVER_SPIN_ACCURACY = SOLVER_SPIN_ACCURACY
@@ -81,13 +103,31 @@ class SolverSystem:
         self.maxPosError = 0.0
         self.maxAxisError = 0.0
         self.maxSingleAxisError = 0.0
-        self.unmovedParts = []
+        self.unmovedPartNames = []  # objectNames, see detectUnmovedParts()
+        self.componentSolveTimes = []  # (number of parts, steps, seconds)
+        self.levelStatistics = []  # (level, load seconds, solve seconds, steps, rebased)
+        self.keepSystemLoaded = False  # rebase between levels, see reloadSystem()
+        self.deadline = None  # time.time() limit of solving, see interrupted()
+        self.deadlineReached = False
+        self.cancelRequested = False  # see cancel()
+        self.allowProcessPool = True  # see useProcessPool(), off in a solver thread
+        self.writePlacements = True  # write solutions to the document objects
+        self.pendingPlacements = {}  # objectName -> Placement, if not writePlacements
+        self.progress = None  # called with a dict, see reportProgress()
+        self.progressInfo = {}
+        self.reportResults = True  # print reached accuracies after solving
+        self.messages = None  # list collecting the output of msg(), if not None
+        self.snapCount = 0  # rigids placed in closed form, see snapRigids()
+        self.collapsedRigids = 0  # rigids merged into SuperRigids, see collapseRigidClusters()
 
     def clear(self):
         for r in self.rigids:
             r.clear()
         self.stepCount = 0
+        self.snapCount = 0
         self.rigids = []
+        self.graph.clear()
+        self.hierarchy = None
         self.constraints = []
         self.objectNames = []
         self.partialSolverCurrentStage = PARTIAL_SOLVE_STAGE1
@@ -112,10 +152,12 @@ class SolverSystem:
 
     def getRigid(self, objectName):
         """get a Rigid by objectName"""
-        rigs = [r for r in self.rigids if r.objectName == objectName]
-        if len(rigs) > 0:
-            return rigs[0]
-        return None
+        return self.graph.getRigid(objectName)
+
+    def addRigid(self, rig):
+        """register a Rigid in the solver and its graph"""
+        self.graph.addRigid(rig)
+        self.rigids.append(rig)
 
     def removeFaultyConstraints(self, doc):
         """
@@ -139,6 +181,26 @@ class SolverSystem:
                 print(u"remove faulty constraint '{}'".format(fc.Label))
                 doc.removeObject(fc.Name)
 
+    def handleBrokenConstraints(self, deleteList):
+        """ask the user, whether the broken constraints shall be deleted"""
+        msg = "The following constraints are broken:\n"
+        for c in deleteList:
+            msg += "{}\n".format(c.Label)
+        msg += "Do you want to delete them ?"
+
+        flags = (
+            QtGui.QMessageBox.StandardButton.Yes | QtGui.QMessageBox.StandardButton.No
+        )
+        response = QtGui.QMessageBox.critical(
+            QtGui.QApplication.activeWindow(),
+            "Delete broken constraints?",
+            msg,
+            flags,
+        )
+        if response == QtGui.QMessageBox.Yes:
+            for c in deleteList:
+                a2plib.removeConstraint(c)
+
     def loadSystem(self, doc, matelist=None):
         self.clear()
         self.doc = doc
@@ -170,10 +232,12 @@ class SolverSystem:
         #
         # Extract all the objectnames which are affected by constraints..
         self.objectNames = []
+        knownNames = set()
         for c in self.constraints:
             for attr in ["Object1", "Object2"]:
                 objectName = getattr(c, attr, None)
-                if objectName != None and not objectName in self.objectNames:
+                if objectName != None and not objectName in knownNames:
+                    knownNames.add(objectName)
                     self.objectNames.append(objectName)
         #
         # create a Rigid() dataStructure for each of these objectnames...
@@ -189,7 +253,7 @@ class SolverSystem:
                 debugMode = False
             rig = Rigid(o, ob1.Label, fx, ob1.Placement, debugMode)
             rig.spinCenter = ob1.Shape.BoundBox.Center
-            self.rigids.append(rig)
+            self.addRigid(rig)
         #
         # link constraints to rigids using dependencies
         deleteList = []  # a list to collect broken constraints
@@ -198,10 +262,7 @@ class SolverSystem:
             rigid2 = self.getRigid(c.Object2)
 
             # create and update list of constrained rigids
-            if rigid2 != None and not rigid2 in rigid1.linkedRigids:
-                rigid1.linkedRigids.append(rigid2)
-            if rigid1 != None and not rigid1 in rigid2.linkedRigids:
-                rigid2.linkedRigids.append(rigid1)
+            self.graph.link(rigid1, rigid2)
 
             try:
                 Dependency.Create(doc, c, self, rigid1, rigid2)
@@ -209,28 +270,8 @@ class SolverSystem:
                 self.status = "loadingDependencyError"
                 deleteList.append(c)
 
-        for rig in self.rigids:
-            rig.hierarchyLinkedRigids.extend(rig.linkedRigids)
-
         if len(deleteList) > 0:
-            msg = "The following constraints are broken:\n"
-            for c in deleteList:
-                msg += "{}\n".format(c.Label)
-            msg += "Do you want to delete them ?"
-
-            flags = (
-                QtGui.QMessageBox.StandardButton.Yes
-                | QtGui.QMessageBox.StandardButton.No
-            )
-            response = QtGui.QMessageBox.critical(
-                QtGui.QApplication.activeWindow(),
-                "Delete broken constraints?",
-                msg,
-                flags,
-            )
-            if response == QtGui.QMessageBox.Yes:
-                for c in deleteList:
-                    a2plib.removeConstraint(c)
+            self.handleBrokenConstraints(deleteList)
 
         if self.status == "loadingDependencyError":
             return
@@ -242,6 +283,29 @@ class SolverSystem:
         self.retrieveDOFInfo()  # function only once used here at this place in whole program
         self.status = "loaded"
 
+    def reloadSystem(self, doc, matelist=None):
+        """
+        Prepare the next accuracy level. Without preference
+        keepSolverSystemLoaded (or self.keepSystemLoaded) the system is loaded again from the document,
+        otherwise the loaded dependencies are rebased on the current
+        placements of the rigids, without any document or shape access.
+        returns True if rebased
+        """
+        if not (self.keepSystemLoaded or a2plib.getKeepSolverSystemLoaded()):
+            self.loadSystem(doc, matelist)
+            self.collapseRigidClusters(doc)
+            return False
+        self.status = "loading"
+        self.stepCount = 0
+        self.convergencyCounter = 0
+        self.lastPositionError = SOLVER_CONVERGENCY_ERROR_INIT_VALUE
+        self.lastAxisError = SOLVER_CONVERGENCY_ERROR_INIT_VALUE
+        self.partialSolverCurrentStage = PARTIAL_SOLVE_STAGE1
+        for rig in self.rigids:
+            rig.rebase(self)
+        self.status = "loaded"
+        return True
+
     def DOF_info_to_console(self):
         doc = FreeCAD.activeDocument()
 
@@ -307,32 +371,48 @@ class SolverSystem:
             numdep += rig.countDependencies()
         Msg("there are {} dependencies\n".format(numdep / 2))
 
-    def retrieveDOFInfo(self):
+    def retrieveDOFInfo(self, rigids=None):
         """
         method used to retrieve all info related to DOF handling
         the method scans each rigid, and on each not tempfixed rigid scans the list of linkedobjects
         then for each linked object compile a dict where each linked object has its dependencies
         then for each linked object compile a dict where each linked object has its dof position
         then for each linked object compile a dict where each linked object has its dof rotation
+        rigids: only update these rigids, default is all rigids
         """
-        for rig in self.rigids:
+        if rigids is None:
+            rigids = self.rigids
+        for rig in rigids:
 
             # if not rig.tempfixed:  #skip already fixed objs
 
+            # group the dependencies by linked rigid in one pass
+            linkedDeps = {}
+            linkedPointDeps = {}
             for linkedRig in rig.linkedRigids:
-                tmplinkedDeps = []
-                tmpLinkedPointDeps = []
-                for dep in rig.dependencies:
-                    if linkedRig == dep.dependedRigid:
-                        # be sure pointconstraints are at the end of the list
-                        if dep.isPointConstraint:
-                            tmpLinkedPointDeps.append(dep)
-                        else:
-                            tmplinkedDeps.append(dep)
+                linkedDeps[linkedRig] = []
+                linkedPointDeps[linkedRig] = []
+            for dep in rig.dependencies:
+                if dep.dependedRigid not in linkedDeps:
+                    continue
+                # be sure pointconstraints are at the end of the list
+                if dep.isPointConstraint:
+                    linkedPointDeps[dep.dependedRigid].append(dep)
+                else:
+                    linkedDeps[dep.dependedRigid].append(dep)
+            for linkedRig in rig.linkedRigids:
+                tmplinkedDeps = linkedDeps[linkedRig]
                 # add at the end the point constraints
-                tmplinkedDeps.extend(tmpLinkedPointDeps)
+                tmplinkedDeps.extend(linkedPointDeps[linkedRig])
                 rig.depsPerLinkedRigids[linkedRig] = tmplinkedDeps
 
+            if a2plib.getUseAnalyticDOF():
+                for linkedRig, deps in rig.depsPerLinkedRigids.items():
+                    info = a2p_dofengine.dependenciesDOF(deps)
+                    rig.dofPOSPerLinkedRigids[linkedRig] = info.freeTranslations
+                    rig.dofROTPerLinkedRigids[linkedRig] = info.freeRotations
+                continue
+
             # dofPOSPerLinkedRigid is a dict where for each
             for linkedRig in rig.depsPerLinkedRigids.keys():
                 linkedRig.pointConstraints = []
@@ -349,18 +429,32 @@ class SolverSystem:
             # so we now know the list of linked objects and which
             # dof rot and pos both limits.
 
-    # TODO: maybe instead of traversing from the root every time, save a list of objects on current distance
-    # and use them to propagate next distance to their children
+    def collapseRigidClusters(self, doc):
+        """
+        with preference useRigidClusters, solve rigidly connected groups
+        of rigids as one, see a2p_rigidcluster
+        """
+        self.collapsedRigids = 0
+        if not a2plib.getUseRigidClusters() or self.status != "loaded":
+            return
+        self.collapsedRigids = a2p_rigidcluster.collapseClusters(self, doc)
+        if self.collapsedRigids > 0 and not a2plib.SIMULATION_STATE:
+            Msg(
+                "{} rigidly connected parts are solved as {} groups\n".format(
+                    self.collapsedRigids,
+                    len(
+                        [
+                            r
+                            for r in self.rigids
+                            if isinstance(r, a2p_rigidcluster.SuperRigid)
+                        ]
+                    ),
+                )
+            )
+
     def assignParentship(self, doc):
-        # Start from fixed parts
-        for rig in self.rigids:
-            if rig.fixed:
-                rig.disatanceFromFixed = 0
-                haveMore = True
-                distance = 0
-                while haveMore:
-                    haveMore = rig.assignParentship(distance)
-                    distance += 1
+        """build self.hierarchy, see a2p_solvergraph.SolverHierarchy"""
+        self.hierarchy = self.graph.buildHierarchy()
 
         if A2P_DEBUG_LEVEL > 0:
             Msg(20 * "=" + "\n")
@@ -395,7 +489,9 @@ class SolverSystem:
         f.write('<div class="mermaid">\n')
 
         f.write("graph TD\n")
-        for rig in self.rigids:
+        if self.hierarchy is None:
+            self.assignParentship(self.doc)
+        for rig in self.hierarchy.rigids():
             rigLabel = a2plib.to_str(rig.label).replace(u" ", u"_")
             # No children, add current rogod as a leaf entry
             if len(rig.childRigids) == 0:
@@ -449,16 +545,23 @@ class SolverSystem:
         self.partialSolverCurrentStage = PARTIAL_SOLVE_STAGE1
 
     def detectUnmovedParts(self):
-        doc = FreeCAD.activeDocument()
-        self.unmovedParts = []
+        """no document access, see checkForUnmovedParts()"""
+        self.unmovedPartNames = []
         for rig in self.rigids:
             if rig.fixed:
                 continue
             if not rig.moved:
-                self.unmovedParts.append(doc.getObject(rig.objectName))
+                self.unmovedPartNames.append(rig.objectName)
 
-    def solveAccuracySteps(self, doc, matelist=None):
-        self.level_of_accuracy = 1
+    def msg(self, text):
+        """Msg(text), or collect it in self.messages (solving in a thread)"""
+        if self.messages is not None:
+            self.messages.append(text)
+        else:
+            Msg(text)
+
+    def setAccuracyLevel(self, level):
+        self.level_of_accuracy = level
         self.mySOLVER_POS_ACCURACY = self.getSolverControlData()[
             self.level_of_accuracy
         ][0]
@@ -466,12 +569,41 @@ class SolverSystem:
             self.level_of_accuracy
         ][1]
 
+    def solveAccuracySteps(self, doc, matelist=None):
+        self.setAccuracyLevel(1)
+
+        startTime = time.time()
         self.loadSystem(doc, matelist)
         if self.status == "loadingDependencyError":
             return
+        self.collapseRigidClusters(doc)
         self.assignParentship(doc)
+        return self.solveLoadedSystem(doc, matelist, time.time() - startTime)
+
+    def solveLoadedSystem(self, doc, matelist=None, loadTime=0.0, rebased=False):
+        """solve all accuracy levels, starting with the loaded system"""
+        self.levelStatistics = []
         while True:
+            self.telemetry.startLevel(
+                self.level_of_accuracy,
+                self.mySOLVER_POS_ACCURACY,
+                self.mySOLVER_SPIN_ACCURACY,
+                loadTime,
+                rebased,
+            )
+            self.reportProgress(level=self.level_of_accuracy)
+            startTime = time.time()
             systemSolved = self.calculateChain(doc)
+            self.telemetry.endLevel(systemSolved, self.rigids)
+            self.levelStatistics.append(
+                (
+                    self.level_of_accuracy,
+                    loadTime,
+                    time.time() - startTime,
+                    sum(c[1] for c in self.componentSolveTimes),
+                    rebased,
+                )
+            )
             if self.level_of_accuracy == 1:
                 self.detectUnmovedParts()  # do only once here. It can fail at higher accuracy levels
                 # where not a final solution is required.
@@ -479,22 +611,18 @@ class SolverSystem:
                 systemSolved = True
                 break
             if systemSolved:
-                self.level_of_accuracy += 1
-                if self.level_of_accuracy > len(self.getSolverControlData()):
+                if self.level_of_accuracy + 1 > len(self.getSolverControlData()):
                     self.solutionToParts(doc)
                     break
-                self.mySOLVER_POS_ACCURACY = self.getSolverControlData()[
-                    self.level_of_accuracy
-                ][0]
-                self.mySOLVER_SPIN_ACCURACY = self.getSolverControlData()[
-                    self.level_of_accuracy
-                ][1]
-                self.loadSystem(doc, matelist)
+                self.setAccuracyLevel(self.level_of_accuracy + 1)
+                startTime = time.time()
+                rebased = self.reloadSystem(doc, matelist)
+                loadTime = time.time() - startTime
             else:
                 completeSolvingRequired = self.getSolverControlData()[
                     self.level_of_accuracy
                 ][2]
-                if not completeSolvingRequired:
+                if not completeSolvingRequired and not self.cancelRequested:
                     systemSolved = True
                 break
         self.maxAxisError = 0.0
@@ -507,12 +635,22 @@ class SolverSystem:
                 self.maxAxisError = rig.maxAxisError
             if rig.maxSingleAxisError > self.maxSingleAxisError:
                 self.maxSingleAxisError = rig.maxSingleAxisError
-        if not a2plib.SIMULATION_STATE:
-            Msg("TARGET   POS-ACCURACY :{}\n".format(self.mySOLVER_POS_ACCURACY))
-            Msg("REACHED  POS-ACCURACY :{}\n".format(self.maxPosError))
-            Msg("TARGET  SPIN-ACCURACY :{}\n".format(self.mySOLVER_SPIN_ACCURACY))
-            Msg("REACHED SPIN-ACCURACY :{}\n".format(self.maxAxisError))
-            Msg("SA SPIN-ACCURACY      :{}\n".format(self.maxSingleAxisError))
+        if self.reportResults and not a2plib.SIMULATION_STATE:
+            self.msg("TARGET   POS-ACCURACY :{}\n".format(self.mySOLVER_POS_ACCURACY))
+            self.msg("REACHED  POS-ACCURACY :{}\n".format(self.maxPosError))
+            self.msg("TARGET  SPIN-ACCURACY :{}\n".format(self.mySOLVER_SPIN_ACCURACY))
+            self.msg("REACHED SPIN-ACCURACY :{}\n".format(self.maxAxisError))
+            self.msg("SA SPIN-ACCURACY      :{}\n".format(self.maxSingleAxisError))
+            for level, loadTime, solveTime, steps, rebased in self.levelStatistics:
+                self.msg(
+                    "LEVEL {} {:8}: load {:.3f} s, solve {:.3f} s, {} steps\n".format(
+                        level,
+                        "rebased" if rebased else "loaded",
+                        loadTime,
+                        solveTime,
+                        steps,
+                    )
+                )
 
         return systemSolved
 
@@ -546,17 +684,21 @@ Please run the conflict finder tool !
                     )
                 return systemSolved
 
-    def checkForUnmovedParts(self):
+    def checkForUnmovedParts(self, doc=None):
         """
         If there are parts, which are constrained but have no
         constraint path to a fixed part, the solver will
         ignore them and they are not moved.
         This function detects this and signals it to the user.
         """
-        if len(self.unmovedParts) != 0:
+        if len(self.unmovedPartNames) != 0:
+            if doc is None:
+                doc = FreeCAD.activeDocument()
             FreeCADGui.Selection.clearSelection()
-            for obj in self.unmovedParts:
-                FreeCADGui.Selection.addSelection(obj)
+            for objectName in self.unmovedPartNames:
+                obj = doc.getObject(objectName)
+                if obj is not None:
+                    FreeCADGui.Selection.addSelection(obj)
             msg = """    
 The highlighted parts were not moved. They are
 not constrained (also over constraint chains)
@@ -573,19 +715,157 @@ to a fixed part!
         Msg("):\n")
 
     def calculateChain(self, doc):
+        """
+        Rigids without any constraint path between them do not influence
+        each other, so every connected component is solved on its own.
+        A failing component does not stop solving of the others.
+        """
+        components = self.graph.connectedComponents()
+        self.componentSolveTimes = []
+        systemSolved = True
+        if self.useProcessPool(components):
+            systemSolved = self.calculateComponentsInPool(doc, components)
+        else:
+            for rigids in components:
+                if self.cancelRequested:
+                    systemSolved = False
+                    break
+                startTime = time.time()
+                if not self.calculateComponentChain(doc, rigids):
+                    systemSolved = False
+                self.componentSolveTimes.append(
+                    (len(rigids), self.stepCount, time.time() - startTime)
+                )
+        self.printComponentSolveTimes()
+        return systemSolved
+
+    def printComponentSolveTimes(self):
+        if a2plib.SIMULATION_STATE or len(self.componentSolveTimes) < 2:
+            return
+        self.msg(
+            "Solved {} independent groups of parts:\n".format(
+                len(self.componentSolveTimes)
+            )
+        )
+        for i, (count, steps, seconds) in enumerate(self.componentSolveTimes):
+            self.msg(
+                "  group {}: {} parts, {} steps, {:.3f} s\n".format(
+                    i + 1, count, steps, seconds
+                )
+            )
+
+    def useProcessPool(self, components):
+        """
+        Components can be solved in worker processes only if solved at once
+        (no partial processing) and by the vectorized kernel, which does
+        not need any FreeCAD objects.
+        """
+        if ProcessPoolExecutor is None or not a2plib.getUseSolverProcessPool():
+            return False
+        if not self.allowProcessPool:
+            return False
+        if not a2plib.getUseVectorizedSolver() or a2plib.SOLVER_ONESTEP > 0:
+            return False
+        if self.backend.name != "attraction":
+            return False
+        if a2plib.PARTIAL_PROCESSING_ENABLED and not a2plib.SIMULATION_STATE:
+            return False
+        if self.deadline is not None:
+            # the workers do not know the deadline, e.g. of a drag frame
+            return False
+        if "fork" not in multiprocessing.get_all_start_methods():
+            # a spawned worker would start a new FreeCAD instance
+            return False
+        large = [c for c in components if len(c) >= SOLVER_PROCESSPOOL_MIN_RIGIDS]
+        if len(large) < 2:
+            return False
+        for rig in self.rigids:
+            if rig.tempfixed and not rig.fixed:
+                return False
+        return True
+
+    def calculateComponentsInPool(self, doc, components):
+        """solve all components at once, each in a worker process"""
+        kernels = []
+        for rigids in components:
+            workList = self.graph.createWorkList(rigids)
+            for rig in workList:
+                rig.enableDependencies(workList)
+            for rig in workList:
+                rig.calcSpinBasicDataDepsEnabled()
+            kernels.append((workList, SolverKernel(workList)))
+
+        context = multiprocessing.get_context("fork")
+        executor = ProcessPoolExecutor(mp_context=context)
+        futures = []
+        try:
+            futures = [
+                executor.submit(
+                    solveHeadlessTimed,
+                    kernel.getState(),
+                    self.mySOLVER_POS_ACCURACY,
+                    self.mySOLVER_SPIN_ACCURACY,
+                    SOLVER_MAXSTEPS,
+                    SOLVER_STEPS_CONVERGENCY_CHECK,
+                    SOLVER_CONVERGENCY_FACTOR,
+                )
+                for workList, kernel in kernels
+            ]
+            pending = futures
+            while len(pending) > 0 and not self.cancelRequested:
+                done, pending = waitForFutures(
+                    pending, timeout=SOLVER_PROCESSPOOL_POLL_INTERVAL
+                )
+        finally:
+            if self.cancelRequested:
+                # do not wait for the workers, which are still running
+                try:
+                    executor.shutdown(wait=False, cancel_futures=True)
+                except TypeError:  # Python < 3.9
+                    for future in futures:
+                        future.cancel()
+                    executor.shutdown(wait=False)
+            else:
+                executor.shutdown()
+        if self.cancelRequested:
+            return False
+        results = [future.result() for future in futures]
+
+        systemSolved = True
+        self.stepCount = 0
+        for (workList, kernel), (seconds, (solved, steps, result)) in zip(
+            kernels, results
+        ):
+            self.telemetry.startStage(len(workList), "attraction (worker process)")
+            self.telemetry.endStage(solved, steps)
+            kernel.setResult(result)
+            kernel.syncToRigids()
+            self.stepCount = max(self.stepCount, steps)
+            self.componentSolveTimes.append((len(workList), steps, seconds))
+            if not solved:
+                self.msg("Calculation stopped, no convergency anymore!\n")
+                systemSolved = False
+                continue
+            for rig in workList:
+                rig.applySolution(doc, self)
+                rig.tempfixed = True
+        return systemSolved
+
+    def calculateComponentChain(self, doc, rigids):
+        """solve the rigids of one connected component"""
         self.stepCount = 0
-        workList = []
+        workList = self.graph.createWorkList()
 
         if a2plib.SIMULATION_STATE == True:
             # Solve complete System at once if simulation is running
-            workList = self.rigids
+            workList.extend(rigids)
             solutionFound = self.calculateWorkList(doc, workList)
             if not solutionFound:
                 return False
             return True
         elif a2plib.PARTIAL_PROCESSING_ENABLED == False:
             # Solve complete System at once
-            workList = self.rigids
+            workList.extend(rigids)
             solutionFound = self.calculateWorkList(doc, workList)
             if not solutionFound:
                 return False
@@ -593,29 +873,43 @@ to a fixed part!
         else:
             # Normal partial solving if no simulation is running
             # load initial worklist with all fixed parts...
-            for rig in self.rigids:
+            for rig in rigids:
                 if rig.fixed:
                     workList.append(rig)
             # self.printList("Initial-Worklist", workList)
 
+            # rigids of the worklist which still have linked rigids outside
+            openRigids = list(workList)
+            useSnapSolver = a2plib.getUseSnapSolver()
             while True:
                 addList = []
+                snapPairs = []  # (rigid, the rigid fully constraining it)
                 newRigFound = False
-                for rig in workList:
+                stillOpen = []
+                for rig in openRigids:
+                    isOpen = False
                     for linkedRig in rig.linkedRigids:
                         if linkedRig in workList:
                             continue
+                        isOpen = True
                         if rig.isFullyConstrainedByRigid(linkedRig):
                             addList.append(linkedRig)
+                            snapPairs.append((linkedRig, rig))
                             newRigFound = True
                             break
+                    if isOpen:
+                        stillOpen.append(rig)
+                openRigids = stillOpen
                 if not newRigFound:
-                    for rig in workList:
+                    for rig in openRigids:
                         addList.extend(rig.getCandidates())
                 addList = set(addList)
                 # self.printList("AddList", addList)
                 if len(addList) > 0:
                     workList.extend(addList)
+                    openRigids.extend(addList)
+                    if useSnapSolver and len(snapPairs) > 0:
+                        self.snapRigids(doc, snapPairs, workList)
                     solutionFound = self.calculateWorkList(doc, workList)
                     if not solutionFound:
                         return False
@@ -627,19 +921,176 @@ to a fixed part!
 
             return True
 
+    def interrupted(self):
+        """
+        True if solving has to stop, because cancel() was called or
+        self.deadline is over
+        """
+        if self.cancelRequested:
+            return True
+        if self.deadline is None or time.time() < self.deadline:
+            return False
+        self.deadlineReached = True
+        return True
+
+    def cancel(self):
+        """stop solving as soon as possible, can be called from another thread"""
+        self.cancelRequested = True
+
+    def reportProgress(self, **info):
+        """
+        pass the state of solving to self.progress: level, stage (number
+        of rigids of the worklist), step, posError and axisError
+        """
+        self.progressInfo.update(info)
+        if self.progress is not None:
+            self.progress(dict(self.progressInfo))
+
+    def writePendingPlacements(self, doc):
+        """write the placements collected while writePlacements was off"""
+        for objectName, placement in self.pendingPlacements.items():
+            ob = doc.getObject(objectName)
+            if ob is not None:
+                ob.Placement = placement
+        self.pendingPlacements = {}
+
     def calculateWorkList(self, doc, workList):
+        """solve the rigids of workList with the selected backend"""
+        self.telemetry.startStage(len(workList), self.backend.name)
+        self.reportProgress(stage=len(workList))
+        solutionFound = self.backend.solveWorkList(self, doc, workList)
+        self.telemetry.endStage(solutionFound)
+        return solutionFound
+
+    def snapRigids(self, doc, snapPairs, workList):
+        """
+        place rigids, which are fully constrained by one tempfixed rigid,
+        in closed form (see a2p_snapsolver) and tempfix them. The others
+        are left to the iterative solver.
+        """
         reqPosAccuracy = self.mySOLVER_POS_ACCURACY
         reqSpinAccuracy = self.mySOLVER_SPIN_ACCURACY
+        solvedRigids = self.graph.createWorkList(r for r in workList if r.tempfixed)
+        for rig, neighbour in snapPairs:
+            if rig.tempfixed or not neighbour.tempfixed:
+                continue
+            step = a2p_snapsolver.getSnapPlacement(
+                [dep for dep in rig.dependencies if dep.dependedRigid is neighbour]
+            )
+            if step is None:
+                continue
+            rig.applyPlacementStep(step)
+            # check all dependencies to solved rigids, as the iteration would
+            rig.enableDependencies(solvedRigids)
+            rig.calcSpinBasicDataDepsEnabled()
+            rig.collectActiveDependencies()
+            rig.calcMoveData(doc, self)
+            if not (
+                rig.maxPosError <= reqPosAccuracy
+                and rig.maxAxisError <= reqSpinAccuracy
+                and rig.maxSingleAxisError <= reqSpinAccuracy * 10
+            ):
+                rig.applyPlacementStep(step.inverse())
+                continue
+            rig.moved = True
+            rig.applySolution(doc, self)
+            rig.tempfixed = True
+            solvedRigids.append(rig)
+            self.snapCount += 1
 
+    def unfixLinkedRigids(self, workList):
+        """
+        unfix the tempfixed rigids linked to unsolved rigids of workList.
+        returns the unfixed rigids
+        """
+        reqPosAccuracy = self.mySOLVER_POS_ACCURACY
+        reqSpinAccuracy = self.mySOLVER_SPIN_ACCURACY
+        unfixedRigids = []
+        # search for unsolved dependencies...
         for rig in workList:
+            if rig.fixed or rig.tempfixed:
+                continue
+            # if rig.maxAxisError >= maxAxisError or rig.maxPosError >= maxPosError:
+            if rig.maxAxisError > reqSpinAccuracy or rig.maxPosError > reqPosAccuracy:
+                for r in rig.linkedRigids:
+                    if r.tempfixed and not r.fixed:
+                        r.tempfixed = False
+                        # Msg("unfixed Rigid {}\n".format(r.label))
+                        unfixedRigids.append(r)
+        if len(unfixedRigids) > 0:
+            self.telemetry.recordUnfix([r.label for r in unfixedRigids])
+        return unfixedRigids
+
+    def activateWorkList(self, workList):
+        """
+        returns the active set of workList, the rigids which are neither
+        fixed nor tempfixed. Only dependencies of active rigids are
+        enabled and evaluated, tempfixed rigids do not move anymore
+        (their dependencies were enabled while they were active).
+        """
+        activeRigids = [rig for rig in workList if not (rig.fixed or rig.tempfixed)]
+        self.activateRigids(activeRigids, workList)
+        return activeRigids
+
+    def activateRigids(self, rigids, workList):
+        for rig in rigids:
+            rig.moved = True
             rig.enableDependencies(workList)
-        for rig in workList:
+        for rig in rigids:
             rig.calcSpinBasicDataDepsEnabled()
+            rig.collectActiveDependencies()
+
+    def staleErrors(self, workList):
+        """
+        largest errors of the inactive rigids of workList, they keep the
+        errors of their last step
+        """
+        maxPosError = 0.0
+        maxAxisError = 0.0
+        maxSingleAxisError = 0.0
+        for rig in workList:
+            if rig.fixed or rig.tempfixed:
+                maxPosError = max(maxPosError, rig.maxPosError)
+                maxAxisError = max(maxAxisError, rig.maxAxisError)
+                maxSingleAxisError = max(maxSingleAxisError, rig.maxSingleAxisError)
+        return maxPosError, maxAxisError, maxSingleAxisError
+
+    def createKernel(self, activeRigids, workList):
+        """
+        SolverKernel of the active rigids and the rigids of workList
+        linked to them, the other rigids are not needed for solving
+        """
+        rigids = self.graph.createWorkList(activeRigids)
+        for rig in activeRigids:
+            for linkedRig in rig.linkedRigids:
+                if linkedRig in workList:
+                    rigids.append(linkedRig)
+        return SolverKernel(rigids)
+
+    def calculateWorkListAttraction(self, doc, workList):
+        """the attraction solver, see a2p_solverbackends.AttractionBackend"""
+        reqPosAccuracy = self.mySOLVER_POS_ACCURACY
+        reqSpinAccuracy = self.mySOLVER_SPIN_ACCURACY
+
+        # only the active set is moved, see activateWorkList()
+        activeRigids = self.activateWorkList(workList)
+        if len(activeRigids) == 0:
+            return True  # nothing to move, all rigids are solved
+        staleErrors = self.staleErrors(workList)
 
         self.lastPositionError = SOLVER_CONVERGENCY_ERROR_INIT_VALUE
         self.lastAxisError = SOLVER_CONVERGENCY_ERROR_INIT_VALUE
         self.convergencyCounter = 0
 
+        # optional structure of arrays engine, see a2p_solverkernel
+        # the momentum acceleration is only implemented there
+        kernel = None
+        accelerated = a2plib.getUseAcceleratedSolver()
+        if a2plib.getUseVectorizedSolver() or accelerated:
+            kernel = self.createKernel(activeRigids, workList)
+            kernel.acceleration = accelerated
+
+        telemetry = self.telemetry
         calcCount = 0
         goodAccuracy = False
         while not goodAccuracy:
@@ -650,20 +1101,42 @@ to a fixed part!
             calcCount += 1
             self.stepCount += 1
             self.convergencyCounter += 1
-            # First calculate all the movement vectors
-            for w in workList:
-                w.moved = True
-                w.calcMoveData(doc, self)
-                if w.maxPosError > maxPosError:
-                    maxPosError = w.maxPosError
-                if w.maxAxisError > maxAxisError:
-                    maxAxisError = w.maxAxisError
-                if w.maxSingleAxisError > maxSingleAxisError:
-                    maxSingleAxisError = w.maxSingleAxisError
-
-            # Perform the move
-            for w in workList:
-                w.move(doc)
+            if telemetry.enabled:
+                startTime = time.time()
+            if kernel is not None:
+                maxPosError, maxAxisError, maxSingleAxisError = kernel.calcMoveData(
+                    self.mySOLVER_SPIN_ACCURACY
+                )
+                if telemetry.enabled:
+                    moveTime = time.time()
+                kernel.move()
+            else:
+                # First calculate all the movement vectors
+                for w in activeRigids:
+                    w.calcMoveData(doc, self)
+                    if w.maxPosError > maxPosError:
+                        maxPosError = w.maxPosError
+                    if w.maxAxisError > maxAxisError:
+                        maxAxisError = w.maxAxisError
+                    if w.maxSingleAxisError > maxSingleAxisError:
+                        maxSingleAxisError = w.maxSingleAxisError
+
+                if telemetry.enabled:
+                    moveTime = time.time()
+                # Perform the move
+                for w in activeRigids:
+                    w.move(doc)
+            maxPosError = max(maxPosError, staleErrors[0])
+            maxAxisError = max(maxAxisError, staleErrors[1])
+            maxSingleAxisError = max(maxSingleAxisError, staleErrors[2])
+            if telemetry.enabled:
+                telemetry.addTime("calcMoveData", moveTime - startTime)
+                telemetry.addTime("move", time.time() - moveTime)
+                telemetry.recordStep(maxPosError, maxAxisError, maxSingleAxisError)
+            if self.progress is not None and calcCount % SOLVER_PROGRESS_INTERVAL == 0:
+                self.reportProgress(
+                    step=self.stepCount, posError=maxPosError, axisError=maxAxisError
+                )
 
             # The accuracy is good, apply the solution to FreeCAD's objects
             if (
@@ -675,41 +1148,45 @@ to a fixed part!
             ) or (a2plib.SOLVER_ONESTEP > 0):
                 # The accuracy is good, we're done here
                 goodAccuracy = True
+                if telemetry.enabled:
+                    startTime = time.time()
+                if kernel is not None:
+                    kernel.syncToRigids()
                 # Mark the rigids as tempfixed and add its constrained rigids to pending list to be processed next
-                for r in workList:
+                for r in activeRigids:
                     r.applySolution(doc, self)
                     r.tempfixed = True
+                if telemetry.enabled:
+                    telemetry.addTime("applySolution", time.time() - startTime)
 
             if self.convergencyCounter > SOLVER_STEPS_CONVERGENCY_CHECK:
                 if (
                     maxPosError >= SOLVER_CONVERGENCY_FACTOR * self.lastPositionError
                     or maxAxisError >= SOLVER_CONVERGENCY_FACTOR * self.lastAxisError
                 ):
-                    foundRigidToUnfix = False
-                    # search for unsolved dependencies...
-                    for rig in workList:
-                        if rig.fixed or rig.tempfixed:
-                            continue
-                        # if rig.maxAxisError >= maxAxisError or rig.maxPosError >= maxPosError:
-                        if (
-                            rig.maxAxisError > reqSpinAccuracy
-                            or rig.maxPosError > reqPosAccuracy
-                        ):
-                            for r in rig.linkedRigids:
-                                if r.tempfixed and not r.fixed:
-                                    r.tempfixed = False
-                                    # Msg("unfixed Rigid {}\n".format(r.label))
-                                    foundRigidToUnfix = True
-
-                    if foundRigidToUnfix:
+                    if kernel is not None:
+                        kernel.syncErrors()
+                    unfixedRigids = self.unfixLinkedRigids(activeRigids)
+
+                    if len(unfixedRigids) > 0:
                         self.lastPositionError = SOLVER_CONVERGENCY_ERROR_INIT_VALUE
                         self.lastAxisError = SOLVER_CONVERGENCY_ERROR_INIT_VALUE
                         self.convergencyCounter = 0
+                        if kernel is not None:
+                            kernel.syncToRigids()
+                        self.activateRigids(unfixedRigids, workList)
+                        activeRigids.extend(unfixedRigids)
+                        staleErrors = self.staleErrors(workList)
+                        if kernel is not None:
+                            kernel = self.createKernel(activeRigids, workList)
+                            kernel.acceleration = accelerated
                         continue
                     else:
-                        Msg("\n")
-                        Msg("convergency-conter: {}\n".format(self.convergencyCounter))
-                        Msg("Calculation stopped, no convergency anymore!\n")
+                        if kernel is not None:
+                            kernel.syncToRigids()
+                        self.msg("\n")
+                        self.msg("convergency-conter: {}\n".format(self.convergencyCounter))
+                        self.msg("Calculation stopped, no convergency anymore!\n")
                         return False
 
                 self.lastPositionError = maxPosError
@@ -718,7 +1195,14 @@ to a fixed part!
                 self.convergencyCounter = 0
 
             if self.stepCount > SOLVER_MAXSTEPS:
-                Msg("Reached max calculations count ({})\n".format(SOLVER_MAXSTEPS))
+                if kernel is not None:
+                    kernel.syncToRigids()
+                self.msg("Reached max calculations count ({})\n".format(SOLVER_MAXSTEPS))
+                return False
+
+            if not goodAccuracy and self.interrupted():
+                if kernel is not None:
+                    kernel.syncToRigids()
                 return False
         return True
 
@@ -729,15 +1213,37 @@ to a fixed part!
 
 # ------------------------------------------------------------------------------
 def solveConstraints(
-    doc, cache=None, useTransaction=True, matelist=None, showFailMessage=True
+    doc,
+    cache=None,
+    useTransaction=True,
+    matelist=None,
+    showFailMessage=True,
+    backend=None,
+    telemetry=None,
 ):
+    """
+    backend: name or instance of a SolverBackend,
+    default is the backend selected in the preferences
+    telemetry: True or a SolverTelemetry to record the solving process,
+    the SolverTelemetry is returned instead of the bool result then
+    """
     if useTransaction:
         doc.openTransaction("a2p_systemSolving")
-    ss = SolverSystem()
+    ss = SolverSystem(backend)
+    if telemetry:
+        if not isinstance(telemetry, SolverTelemetry):
+            telemetry = SolverTelemetry()
+        telemetry.backend = ss.backend.name
+        ss.telemetry = telemetry
+    startTime = time.time()
     systemSolved = ss.solveSystem(doc, matelist, showFailMessage)
     if useTransaction:
         doc.commitTransaction()
     a2plib.unTouchA2pObjects()
+    if ss.telemetry.enabled:
+        ss.telemetry.solved = bool(systemSolved)
+        ss.telemetry.totalTime = time.time() - startTime
+        return ss.telemetry
     return systemSolved
 
 
@@ -754,11 +1260,23 @@ def autoSolveConstraints(
                 )
                )
         """
+    if a2plib.getUseSolverSession():
+        # keep the loaded system between solves, see a2p_solversession
+        import a2p_solversession
+
+        a2p_solversession.solveConstraints(doc, useTransaction=useTransaction)
+        return
     solveConstraints(doc, useTransaction)
 
 
 class a2p_SolverCommand:
     def Activated(self):
+        if a2plib.getUseSolverThread():
+            # solve in background, see a2p_solverthread
+            import a2p_solverthread
+
+            a2p_solverthread.solveConstraintsAsync(FreeCAD.ActiveDocument)
+            return
         solveConstraints(FreeCAD.ActiveDocument)  # the new iterative solver
 
     def GetResources(self):
@@ -0,0 +1,179 @@
+# ***************************************************************************
+# *                                                                         *
+# *   Copyright (c) 2018 kbwbe                                              *
+# *                                                                         *
+# *   This program is free software; you can redistribute it and/or modify  *
+# *   it under the terms of the GNU Lesser General Public License (LGPL)    *
+# *   as published by the Free Software Foundation; either version 2 of     *
+# *   the License, or (at your option) any later version.                   *
+# *   for detail see the LICENCE text file.                                 *
+# *                                                                         *
+# *   This program is distributed in the hope that it will be useful,       *
+# *   but WITHOUT ANY WARRANTY; without even the implied warranty of        *
+# *   MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the         *
+# *   GNU Library General Public License for more details.                  *
+# *                                                                         *
+# *   You should have received a copy of the GNU Library General Public     *
+# *   License along with this program; if not, write to the Free Software   *
+# *   Foundation, Inc., 59 Temple Place, Suite 330, Boston, MA  02111-1307  *
+# *   USA                                                                   *
+# *                                                                         *
+# ***************************************************************************
+
+
+"""
+Convergence telemetry of the SolverSystem.
+
+Records per accuracy level and per partial solve stage (one call of
+SolverSystem.calculateWorkList) the steps, the error trajectory, unfix
+events of the convergence check, the time spent in the solver phases and
+the worst rigids. Disabled telemetry records nothing, the solver only
+tests the enabled flag.
+
+    telemetry = a2p_solversystem.solveConstraints(doc, telemetry=True)
+    telemetry.toJSON("/tmp/solve.json")
+    telemetry.toCSV("/tmp/solve.csv")
+"""
+
+import json
+import csv
+
+WORST_RIGIDS_COUNT = 10
+
+
+class SolverTelemetry:
+    def __init__(self, enabled=True):
+        self.enabled = enabled
+        self.solved = None
+        self.backend = None
+        self.totalTime = 0.0
+        self.levels = []
+        self.currentLevel = None
+        self.currentStage = None
+
+    def __bool__(self):
+        return bool(self.solved)
+
+    __nonzero__ = __bool__  # Python2
+
+    # --------------------------------------------------------------------------
+    def startLevel(self, level, posAccuracy, spinAccuracy, loadTime, rebased):
+        if not self.enabled:
+            return
+        self.currentLevel = {
+            "level": level,
+            "posAccuracy": posAccuracy,
+            "spinAccuracy": spinAccuracy,
+            "rebased": rebased,
+            "solved": None,
+            "steps": 0,
+            "times": {"load": loadTime},
+            "stages": [],
+            "worstRigids": [],
+        }
+        self.levels.append(self.currentLevel)
+
+    def endLevel(self, solved, rigids):
+        if not self.enabled or self.currentLevel is None:
+            return
+        level = self.currentLevel
+        level["solved"] = solved
+        level["steps"] = sum(stage["steps"] for stage in level["stages"])
+        worst = sorted(
+            rigids,
+            key=lambda rig: (rig.maxPosError, rig.maxAxisError),
+            reverse=True,
+        )[:WORST_RIGIDS_COUNT]
+        level["worstRigids"] = [
+            {
+                "label": rig.label,
+                "objectName": rig.objectName,
+                "maxPosError": rig.maxPosError,
+                "maxAxisError": rig.maxAxisError,
+                "maxSingleAxisError": rig.maxSingleAxisError,
+            }
+            for rig in worst
+        ]
+        self.currentLevel = None
+
+    def startStage(self, workListSize, backend):
+        if not self.enabled or self.currentLevel is None:
+            return
+        self.currentStage = {
+            "stage": len(self.currentLevel["stages"]) + 1,
+            "backend": backend,
+            "rigids": workListSize,
+            "solved": None,
+            "steps": 0,
+            "errors": [],  # (step, maxPosError, maxAxisError, maxSingleAxisError)
+            "unfixEvents": [],  # (step, [labels])
+            "times": {},
+        }
+        self.currentLevel["stages"].append(self.currentStage)
+
+    def endStage(self, solved, steps=None):
+        if not self.enabled or self.currentStage is None:
+            return
+        self.currentStage["solved"] = solved
+        if steps is not None:
+            self.currentStage["steps"] = steps
+        self.currentStage = None
+
+    def recordStep(self, maxPosError, maxAxisError, maxSingleAxisError):
+        stage = self.currentStage
+        if stage is None:
+            return
+        stage["steps"] += 1
+        stage["errors"].append(
+            (stage["steps"], maxPosError, maxAxisError, maxSingleAxisError)
+        )
+
+    def recordUnfix(self, labels):
+        if not self.enabled or self.currentStage is None:
+            return
+        self.currentStage["unfixEvents"].append((self.currentStage["steps"], labels))
+
+    def addTime(self, name, seconds):
+        """add seconds to a timer of the current stage or level"""
+        if not self.enabled:
+            return
+        record = self.currentStage or self.currentLevel
+        if record is None:
+            return
+        record["times"][name] = record["times"].get(name, 0.0) + seconds
+
+    # --------------------------------------------------------------------------
+    def toDict(self):
+        return {
+            "solved": self.solved,
+            "backend": self.backend,
+            "totalTime": self.totalTime,
+            "levels": self.levels,
+        }
+
+    def toJSON(self, path=None):
+        """returns the telemetry as JSON string, written to path if given"""
+        text = json.dumps(self.toDict(), indent=1)
+        if path is not None:
+            with open(path, "w") as f:
+                f.write(text)
+        return text
+
+    def toCSV(self, path):
+        """write the error trajectories, one row per step"""
+        with open(path, "w") as f:
+            writer = csv.writer(f)
+            writer.writerow(
+                [
+                    "level",
+                    "stage",
+                    "step",
+                    "maxPosError",
+                    "maxAxisError",
+                    "maxSingleAxisError",
+                ]
+            )
+            for level in self.levels:
+                for stage in level["stages"]:
+                    for error in stage["errors"]:
+                        writer.writerow([level["level"], stage["stage"]] + list(error))
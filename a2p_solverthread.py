@@ -0,0 +1,231 @@
+# ***************************************************************************
+# *                                                                         *
+# *   Copyright (c) 2018 kbwbe                                              *
+# *                                                                         *
+# *   This program is free software; you can redistribute it and/or modify  *
+# *   it under the terms of the GNU Lesser General Public License (LGPL)    *
+# *   as published by the Free Software Foundation; either version 2 of     *
+# *   the License, or (at your option) any later version.                   *
+# *   for detail see the LICENCE text file.                                 *
+# *                                                                         *
+# *   This program is distributed in the hope that it will be useful,       *
+# *   but WITHOUT ANY WARRANTY; without even the implied warranty of        *
+# *   MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the         *
+# *   GNU Library General Public License for more details.                  *
+# *                                                                         *
+# *   You should have received a copy of the GNU Library General Public     *
+# *   License along with this program; if not, write to the Free Software   *
+# *   Foundation, Inc., 59 Temple Place, Suite 330, Boston, MA  02111-1307  *
+# *   USA                                                                   *
+# *                                                                         *
+# ***************************************************************************
+
+
+"""
+Solving in a background thread.
+
+The system is loaded from the document on the main thread. The numeric
+solving of all accuracy levels (SolverSystem.solveLoadedSystem) runs in
+a QThread on this snapshot; between the levels the dependencies are
+rebased, the worker does not access the document. Progress is reported
+by Qt signals, a running solve can be cancelled. The placements are
+written on the main thread at once, when the worker has finished.
+
+    job = a2p_solverthread.solveConstraintsAsync(doc)
+    job.progress.connect(myProgressFunction)  # dict: level, stage, step, posError, axisError
+    job.finished.connect(myFinishedFunction)  # bool: solved
+    job.cancel()
+
+The synchronous a2p_solversystem.solveConstraints() is still used by
+scripts and by the solver command, unless the preference useSolverThread
+is set.
+"""
+
+import time
+import traceback
+
+import FreeCAD
+from PySide import QtGui, QtCore
+
+import a2plib
+from a2plib import Msg
+from a2p_solversystem import SolverSystem
+
+runningJob = None  # only one SolverJob at a time
+
+
+# ------------------------------------------------------------------------------
+class SolverWorker(QtCore.QObject):
+    """runs in the worker thread"""
+
+    progress = QtCore.Signal(object)
+    finished = QtCore.Signal(bool)
+
+    def __init__(self, ss, doc):
+        QtCore.QObject.__init__(self)
+        self.ss = ss
+        self.doc = doc
+
+    def run(self):
+        self.ss.progress = self.progress.emit
+        try:
+            solved = self.ss.solveLoadedSystem(self.doc)
+        except Exception:
+            traceback.print_exc()
+            solved = False
+        self.finished.emit(bool(solved))
+
+
+# ------------------------------------------------------------------------------
+class SolverJob(QtCore.QObject):
+    """one solve of a document, started by start()"""
+
+    progress = QtCore.Signal(object)
+    finished = QtCore.Signal(bool)
+
+    def __init__(self, doc, matelist=None, backend=None, showFailMessage=True):
+        QtCore.QObject.__init__(self)
+        self.doc = doc
+        self.matelist = matelist
+        self.showFailMessage = showFailMessage
+        self.ss = SolverSystem(backend)
+        self.ss.keepSystemLoaded = True  # no document access in the worker
+        self.ss.writePlacements = False
+        self.ss.allowProcessPool = False  # no fork of the GUI process from a QThread
+        self.thread = None
+        self.worker = None
+        self.running = False
+        self.solved = None
+        self.startTime = 0.0
+
+    def start(self):
+        """load the system on the calling (main) thread and start the worker"""
+        global runningJob
+        if runningJob is not None and runningJob.running:
+            runningJob.cancel()
+        runningJob = self
+        self.running = True
+        self.startTime = time.time()
+        ss = self.ss
+        ss.setAccuracyLevel(1)
+        ss.loadSystem(self.doc, self.matelist)
+        if ss.status == "loadingDependencyError":
+            self.running = False
+            self.solved = False
+            runningJob = None
+            self.finished.emit(False)
+            return
+        ss.collapseRigidClusters(self.doc)
+        ss.assignParentship(self.doc)
+        ss.messages = []  # printed by onWorkerFinished()
+
+        self.thread = QtCore.QThread()
+        self.worker = SolverWorker(ss, self.doc)
+        self.worker.moveToThread(self.thread)
+        self.thread.started.connect(self.worker.run)
+        self.worker.progress.connect(self.progress)
+        self.worker.finished.connect(self.onWorkerFinished)
+        self.thread.start()
+
+    def cancel(self):
+        """ask the worker to stop, finished is emitted with False"""
+        self.ss.cancel()
+
+    def isCancelled(self):
+        return self.ss.cancelRequested
+
+    def onWorkerFinished(self, solved):
+        """main thread: write the placements and report the result"""
+        global runningJob
+        if self.thread is not None:
+            self.thread.quit()
+            self.thread.wait()
+        ss = self.ss
+        messages, ss.messages = ss.messages, None
+        for text in messages or []:
+            Msg(text)
+        if ss.cancelRequested:
+            Msg("===== Solving cancelled =====\n")
+            solved = False
+        else:
+            self.doc.openTransaction("a2p_systemSolving")
+            ss.writePendingPlacements(self.doc)
+            self.doc.commitTransaction()
+            a2plib.unTouchA2pObjects()
+            if solved:
+                ss.status = "solved"
+                Msg(
+                    "===== System solved in background in {:.3f} s =====\n".format(
+                        time.time() - self.startTime
+                    )
+                )
+                ss.checkForUnmovedParts(self.doc)
+            else:
+                ss.status = "unsolved"
+                if self.showFailMessage:
+                    Msg("===== Could not solve system ====== \n")
+                    msg = """
+Constraints inconsistent. Cannot solve System.
+Please run the conflict finder tool !
+"""
+                    QtGui.QMessageBox.information(
+                        QtGui.QApplication.activeWindow(), "Constraint mismatch", msg
+                    )
+        self.running = False
+        self.solved = solved
+        if runningJob is self:
+            runningJob = None
+        self.finished.emit(solved)
+
+
+# ------------------------------------------------------------------------------
+class SolverProgressDialog(QtGui.QProgressDialog):
+    """shows the progress of a SolverJob, Cancel cancels it"""
+
+    def __init__(self, job):
+        QtGui.QProgressDialog.__init__(
+            self,
+            "Solving constraints...",
+            "Cancel",
+            0,
+            len(job.ss.getSolverControlData()),
+            QtGui.QApplication.activeWindow(),
+        )
+        self.job = job
+        self.setWindowTitle("A2plus solver")
+        self.setMinimumDuration(500)
+        self.canceled.connect(job.cancel)
+        job.progress.connect(self.onProgress)
+        job.finished.connect(self.onFinished)
+
+    def onProgress(self, info):
+        level = info.get("level", 1)
+        self.setValue(level - 1)
+        self.setLabelText(
+            "Accuracy level {}, {} parts\nstep {}, position error {:.2e}, axis error {:.2e}".format(
+                level,
+                info.get("stage", 0),
+                info.get("step", 0),
+                info.get("posError", 0.0),
+                info.get("axisError", 0.0),
+            )
+        )
+
+    def onFinished(self, solved):
+        self.reset()
+        self.close()
+
+
+# ------------------------------------------------------------------------------
+def solveConstraintsAsync(
+    doc, matelist=None, backend=None, showFailMessage=True, showProgress=True
+):
+    """
+    start solving doc in a background thread, returns the SolverJob.
+    Connect to job.finished for the result.
+    """
+    job = SolverJob(doc, matelist, backend, showFailMessage)
+    if showProgress and FreeCAD.GuiUp:
+        job.progressDialog = SolverProgressDialog(job)
+    job.start()
+    return job
@@ -45,18 +45,24 @@ Working principle:
   This is necessary because normals can flip during build history.
 
 Key-generation:
-    keys for vertexes: "xvalue;yvalue;zvalue"
+    keys are tuples of a tag and the geometric values in units of their
+    tolerance (LENGTH_TOLERANCE, AXIS_TOLERANCE). They are stored in a
+    SpatialHash, which quantizes the values to integer cells and finds a
+    key also in the neighbour cell, if a value is within
+    NEIGHBOUR_TOLERANCE of a cell border. So small numeric drift of the
+    geometry does not change the toponames.
+
+    keys for vertexes: "V", (x, y, z)
 
     keys for edges: (different ones for different edge types)
         straight lines
             2 keys are uses, each consists of:
                 - vertexkey of the endpoint
                 - an axiskey pointing to the other endpoint
+                - marked with "LINE"
         circles:
-            two keys are used for each vertex on the curve
-                - key consisting of center-vertex and positive axis data + radius
-                - key consisting of center-vertex and negative axis data + radius
-                - both marked with "CIRC" at the beginning
+            one key consisting of center-vertex, axis data and radius,
+            marked with "CIRC"
 
         other edge types are put to dict with dummy entries.
 
@@ -90,18 +96,142 @@ parts are been edited.
 """
 
 
+import hashlib
+import itertools
+import math
+
+import numpy
+
 import FreeCAD
 import Part
 from FreeCAD import Base
 from a2p_translateUtils import *
 import a2plib
+import a2p_importcache
+
+LENGTH_TOLERANCE = 1.0e-3  # mm, cell size of positions and radii
+AXIS_TOLERANCE = 1.0e-6  # cell size of the components of unit vectors
+# values closer to a cell border (in cells) are also found in the neighbour cell
+NEIGHBOUR_TOLERANCE = 0.1
+
+
+# ------------------------------------------------------------------------------
+def topoKey(tag, values):
+    """
+    a key of the SpatialHash: (tag, cells, values), values in units of
+    their tolerance, cells the rounded values. Round numbers are in the
+    middle of a cell.
+    """
+    return (tag, tuple([int(math.floor(v + 0.5)) for v in values]), values)
+
+
+# ------------------------------------------------------------------------------
+class SpatialHash(object):
+    """
+    Dict of topo keys (see topoKey) to toponames. An entry is also
+    registered in the neighbour cells of values near to a cell border,
+    and found there by keys which differ from it by NEIGHBOUR_TOLERANCE
+    at most. So each lookup is a single dict access.
+    """
+
+    def __init__(self):
+        self.entries = {}  # (tag, cells): [cells, values, name]
+        self.log = None  # list of changing writes (tag, values, name), if recording
+
+    def __len__(self):
+        return len(self.entries)
+
+    def find(self, key):
+        tag, cells, values = key
+        entry = self.entries.get((tag, cells))
+        if entry is None:
+            return None
+        if entry[0] == cells:
+            return entry
+        # registered as neighbour
+        for a, b in zip(entry[1], values):
+            if abs(a - b) > NEIGHBOUR_TOLERANCE:
+                return None
+        return entry
+
+    def get(self, key, default=None):
+        entry = self.find(key)
+        if entry is None:
+            return default
+        return entry[2]
+
+    def __setitem__(self, key, name):
+        entry = self.find(key)
+        if entry is not None and entry[2] == name:
+            return
+        if self.log is not None:
+            self.log.append((key[0], [float(v) for v in key[2]], name))
+        if entry is not None:
+            entry[2] = name
+            return
+        tag, cells, values = key
+        entry = [cells, values, name]
+        self.entries[(tag, cells)] = entry
+        options = None  # cells per value, if any value is near to a border
+        for i, value in enumerate(values):
+            fraction = value - cells[i]  # -0.5 .. 0.5
+            if abs(fraction) > 0.5 - NEIGHBOUR_TOLERANCE:
+                if options is None:
+                    options = [(cell,) for cell in cells]
+                if fraction < 0.0:
+                    options[i] = (cells[i], cells[i] - 1)
+                else:
+                    options[i] = (cells[i], cells[i] + 1)
+        if options is not None:
+            for neighbour in itertools.product(*options):
+                self.entries.setdefault((tag, neighbour), entry)
+
+
+# ------------------------------------------------------------------------------
+def shapeSignature(shape):
+    """
+    hash of the numbers of vertexes, edges and faces of shape and of its
+    vertex positions (in units of LENGTH_TOLERANCE / 1000), stable
+    between sessions unlike shape.hashCode()
+    """
+    points = numpy.array(
+        [(v.Point.x, v.Point.y, v.Point.z) for v in shape.Vertexes], dtype=float
+    )
+    points = numpy.round(points * (1000.0 / LENGTH_TOLERANCE)).astype(numpy.int64)
+    h = hashlib.sha1(
+        "{};{};{};".format(
+            len(points), len(shape.Edges), len(shape.Faces)
+        ).encode("utf-8")
+    )
+    h.update(points.tobytes())
+    return h.hexdigest()
+
+
+# ------------------------------------------------------------------------------
+def transformPoints(points, pl):
+    """
+    points (list of vectors) transformed by placement pl, as numpy array
+    in units of LENGTH_TOLERANCE
+    """
+    if len(points) == 0:
+        return numpy.zeros((0, 3))
+    rot = pl.Rotation
+    columns = [
+        rot.multVec(Base.Vector(1, 0, 0)),
+        rot.multVec(Base.Vector(0, 1, 0)),
+        rot.multVec(Base.Vector(0, 0, 1)),
+    ]
+    matrix = numpy.array([[c.x, c.y, c.z] for c in columns])
+    coords = numpy.array([(p.x, p.y, p.z) for p in points])
+    base = numpy.array((pl.Base.x, pl.Base.y, pl.Base.z))
+    return (coords.dot(matrix) + base) / LENGTH_TOLERANCE
 
 
 class TopoMapper(object):
     def __init__(self, doc):
         self.doc = doc
         self.fileName = self.doc.FileName
-        self.shapeDict = {}
+        self.shapeDict = SpatialHash()
         self.vertexNames = []
         self.edgeNames = []
         self.faceNames = []
@@ -112,9 +242,11 @@ class TopoMapper(object):
         self.totalNumEdges = 0
         self.totalNumFaces = 0
         self.isPartDesignDocument = False
+        self.topoMemo = None  # a2p_importcache.TopoMemo, if memoizing
+        self.chainKey = ""  # featureKey of the last processed feature
 
     def calcFloatKey(self, val):
-        return "%014.3f;" % val
+        return (val / LENGTH_TOLERANCE,)
 
     def calcVertexKey(self, inOb):
         """
@@ -122,33 +254,35 @@ class TopoMapper(object):
         accepts also vectors as input
         """
         try:
-            coords = (inOb.Point.x, inOb.Point.y, inOb.Point.z)
+            point = inOb.Point
         except:
-            coords = (
-                inOb.x,
-                inOb.y,
-                inOb.z,
-            )
-        key = ""
-        for value in coords:
-            keyPartial = "%014.3f;" % value
-            if keyPartial == "-000000000.000;":
-                keyPartial = "0000000000.000;"
-            key += keyPartial
-        return key
+            point = inOb
+        return topoKey("V", self.calcPointValues(point))
+
+    def calcVertexKeys(self, points, pl):
+        """keys of many vertex points at once, transformed by pl"""
+        values = transformPoints(points, pl)
+        cells = numpy.floor(values + 0.5).astype(int)
+        return [
+            ("V", tuple(c), tuple(v)) for c, v in zip(cells.tolist(), values.tolist())
+        ]
+
+    def calcPointValues(self, point):
+        return (
+            point.x / LENGTH_TOLERANCE,
+            point.y / LENGTH_TOLERANCE,
+            point.z / LENGTH_TOLERANCE,
+        )
 
     def calcAxisKey(self, axis):
         """
         create a unique key defined by axis-direction
         """
-        coords = (axis.x, axis.y, axis.z)
-        key = ""
-        for value in coords:
-            keyPartial = "%012.9f;" % value
-            if keyPartial == "-0.000000000;":
-                keyPartial = "00.000000000;"
-            key += keyPartial
-        return key
+        return (
+            axis.x / AXIS_TOLERANCE,
+            axis.y / AXIS_TOLERANCE,
+            axis.z / AXIS_TOLERANCE,
+        )
 
     def calcEdgeKeys(self, edge, pl):
         keys = []
@@ -169,10 +303,12 @@ class TopoMapper(object):
             axisEnd = pl.multVec(edge.Curve.Center.add(edge.Curve.Axis))
             axis = axisEnd.sub(axisStart)
             keys.append(
-                "CIRC;"
-                + self.calcVertexKey(pl.multVec(edge.Curve.Center))
-                + self.calcAxisKey(axis)
-                + self.calcFloatKey(edge.Curve.Radius)
+                topoKey(
+                    "CIRC",
+                    self.calcPointValues(axisStart)
+                    + self.calcAxisKey(axis)
+                    + self.calcFloatKey(edge.Curve.Radius),
+                )
             )
         else:
             endPoint1 = pl.multVec(edge.Vertexes[0].Point)
@@ -184,8 +320,18 @@ class TopoMapper(object):
                 direction2.normalize()
             except:
                 pass
-            keys.append(self.calcVertexKey(endPoint1) + self.calcAxisKey(direction1))
-            keys.append(self.calcVertexKey(endPoint2) + self.calcAxisKey(direction2))
+            keys.append(
+                topoKey(
+                    "LINE",
+                    self.calcPointValues(endPoint1) + self.calcAxisKey(direction1),
+                )
+            )
+            keys.append(
+                topoKey(
+                    "LINE",
+                    self.calcPointValues(endPoint2) + self.calcAxisKey(direction2),
+                )
+            )
         return keys
 
     def calcFaceKeys(self, face, pl):
@@ -193,9 +339,11 @@ class TopoMapper(object):
         # A sphere...
         if str(face.Surface).startswith("Sphere"):
             keys.append(
-                "SPH;"
-                + self.calcVertexKey(pl.multVec(face.Surface.Center))
-                + self.calcFloatKey(face.Surface.Radius)
+                topoKey(
+                    "SPH",
+                    self.calcPointValues(pl.multVec(face.Surface.Center))
+                    + self.calcFloatKey(face.Surface.Radius),
+                )
             )
         # a cylindric face...
         elif all(hasattr(face.Surface, a) for a in ["Axis", "Center", "Radius"]):
@@ -203,15 +351,14 @@ class TopoMapper(object):
             axisEnd = pl.multVec(face.Surface.Center.add(face.Surface.Axis))
             axis = axisEnd.sub(axisStart)
             axisKey = self.calcAxisKey(axis)
-            negativeAxis = Base.Vector(axis)
-            negativeAxis.multiply(-1.0)
-            negativeAxisKey = self.calcAxisKey(negativeAxis)
+            negativeAxisKey = tuple([-value for value in axisKey])
             radiusKey = self.calcFloatKey(face.Surface.Radius)
             #
-            for v in face.Vertexes:
-                vertexKey = self.calcVertexKey(pl.multVec(v.Point))
-                keys.append("CYL;" + vertexKey + axisKey + radiusKey)
-                keys.append("CYL;" + vertexKey + negativeAxisKey + radiusKey)
+            points = transformPoints([v.Point for v in face.Vertexes], pl)
+            for vertexKey in points.tolist():
+                vertexKey = tuple(vertexKey)
+                keys.append(topoKey("CYL", vertexKey + axisKey + radiusKey))
+                keys.append(topoKey("CYL", vertexKey + negativeAxisKey + radiusKey))
         elif str(face.Surface) == "<Plane object>":
             pt = face.Vertexes[0].Point
             uv = face.Surface.parameter(pt)
@@ -221,16 +368,15 @@ class TopoMapper(object):
             normalStart = pl.multVec(pt)
             normalEnd = pl.multVec(pt.add(normal))
             normal = normalEnd.sub(normalStart)
-            negativeNormal = Base.Vector(normal)
-            negativeNormal.multiply(-1.0)
             normalKey = self.calcAxisKey(normal)
-            negativeNormalKey = self.calcAxisKey(negativeNormal)
-            for vert in face.Vertexes:
-                vertexKey = self.calcVertexKey(pl.multVec(vert.Point))
-                keys.append("PLANE;" + vertexKey + normalKey)
-                keys.append("PLANE;" + vertexKey + negativeNormalKey)
+            negativeNormalKey = tuple([-value for value in normalKey])
+            points = transformPoints([vert.Point for vert in face.Vertexes], pl)
+            for vertexKey in points.tolist():
+                vertexKey = tuple(vertexKey)
+                keys.append(topoKey("PLANE", vertexKey + normalKey))
+                keys.append(topoKey("PLANE", vertexKey + negativeNormalKey))
         else:
-            keys.append("NOTRACE")
+            keys.append(topoKey("NOTRACE", ()))
         return keys  # FIXME
 
     def populateShapeDict(self, objName):
@@ -251,8 +397,8 @@ class TopoMapper(object):
             str(numNewlyCreatedVertexes) + ";"
         )  # only correct for PartDesign, PartWB gives false counts
         i = 1  # do not enumerate the following, count new vertexes !
-        for vertex in vertexes:
-            vertexKey = self.calcVertexKey(pl.multVec(vertex.Point))
+        vertexKeys = self.calcVertexKeys([vertex.Point for vertex in vertexes], pl)
+        for vertexKey in vertexKeys:
             if self.isPartDesignDocument:
                 vertexName = vertexNamePrefix + str(i) + ";" + vertexNameSuffix
             else:
@@ -333,7 +479,68 @@ class TopoMapper(object):
             for ob in outList:
                 self.processTopoData(ob.Name, level)
         if not objName.startswith("Body") and objName not in self.doneObjects:
+            if self.topoMemo is not None:
+                self.populateShapeDictMemoized(objName)
+            else:
+                self.populateShapeDict(objName)
+
+    def featureKey(self, objName):
+        """
+        key of the contribution of feature objName to the shapeDict. It
+        chains the key of the feature processed before, so it changes
+        with any change of the history up to this feature.
+        """
+        ob = self.doc.getObject(objName)
+        if objName.startswith("Link"):
+            pl = ob.Placement
+        else:
+            pl = ob.getGlobalPlacement().multiply(ob.Placement.inverse())
+        key = "\n".join(
+            [
+                self.chainKey,
+                objName,
+                shapeSignature(ob.Shape),
+                str(pl),
+                str(self.isPartDesignDocument),
+                str((self.totalNumVertexes, self.totalNumEdges, self.totalNumFaces)),
+            ]
+        )
+        return hashlib.sha1(key.encode("utf-8")).hexdigest()
+
+    def populateShapeDictMemoized(self, objName):
+        """
+        populateShapeDict, replaying the entries of the last import if
+        neither this feature nor any feature before it has changed
+        """
+        self.chainKey = self.featureKey(objName)
+        contribution = self.topoMemo.get(self.chainKey)
+        if contribution is not None:
+            self.doneObjects.append(objName)
+            for tag, values, name in contribution["writes"]:
+                self.shapeDict[topoKey(tag, tuple(values))] = name
+            (
+                self.totalNumVertexes,
+                self.totalNumEdges,
+                self.totalNumFaces,
+            ) = contribution["totals"]
+            return
+        self.shapeDict.log = []
+        try:
             self.populateShapeDict(objName)
+            writes = self.shapeDict.log
+        finally:
+            self.shapeDict.log = None
+        self.topoMemo.put(
+            self.chainKey,
+            {
+                "writes": writes,
+                "totals": [
+                    self.totalNumVertexes,
+                    self.totalNumEdges,
+                    self.totalNumFaces,
+                ],
+            },
+        )
 
     def makePlacedShape(self, obj):
         """
@@ -555,11 +762,19 @@ class TopoMapper(object):
         # analyse the toplevel shapes
         # -------------------------------------------
         if a2plib.getUseTopoNaming():
+            if a2plib.getUseImportCache() and self.fileName:
+                self.topoMemo = a2p_importcache.TopoMemo(
+                    self.fileName, desiredShapeLabel
+                )
+                self.chainKey = ""
             for n in self.topLevelShapes:
                 self.totalNumVertexes = 0
                 self.totalNumEdges = 0
                 self.totalNumFaces = 0
                 self.processTopoData(n)  # analyse each toplevel object...
+            if self.topoMemo is not None:
+                self.topoMemo.save()
+                self.topoMemo = None
         #
         # -------------------------------------------
         # MUX the toplevel shapes
@@ -664,8 +879,10 @@ class TopoMapper(object):
             # map vertexnames to the MUX
             # -------------------------------------------
             muxInfo.append("[VERTEXES]")
-            for i, v in enumerate(solid.Vertexes):
-                k = self.calcVertexKey(v)
+            vertexKeys = self.calcVertexKeys(
+                [v.Point for v in solid.Vertexes], FreeCAD.Placement()
+            )
+            for i, k in enumerate(vertexKeys):
                 defaultVal = "V;NONAME;{};".format(i)
                 name = self.shapeDict.get(k, defaultVal)
                 muxInfo.append(name)
@@ -0,0 +1,259 @@
+# ***************************************************************************
+# *                                                                         *
+# *   Copyright (c) 2018 kbwbe                                              *
+# *                                                                         *
+# *   This program is free software; you can redistribute it and/or modify  *
+# *   it under the terms of the GNU Lesser General Public License (LGPL)    *
+# *   as published by the Free Software Foundation; either version 2 of     *
+# *   the License, or (at your option) any later version.                   *
+# *   for detail see the LICENCE text file.                                 *
+# *                                                                         *
+# *   This program is distributed in the hope that it will be useful,       *
+# *   but WITHOUT ANY WARRANTY; without even the implied warranty of        *
+# *   MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the         *
+# *   GNU Library General Public License for more details.                  *
+# *                                                                         *
+# *   You should have received a copy of the GNU Library General Public     *
+# *   License along with this program; if not, write to the Free Software   *
+# *   Foundation, Inc., 59 Temple Place, Suite 330, Boston, MA  02111-1307  *
+# *   USA                                                                   *
+# *                                                                         *
+# ***************************************************************************
+
+
+"""
+Parallel regeneration of imported parts.
+
+updateImportedParts() imports every stale source file one after another
+on the GUI thread: open the document, create the topo names, fuse the
+shapes and close the document again. With the preference
+useParallelUpdate, regenerate() does this for all stale
+(source file, sourcePart) pairs at once in headless FreeCAD processes
+(FreeCADCmd with FreeCADGui.setupWithoutGUI(), so that colors and the
+visibility of the shapes are available). The workers hand back the
+shapes as BREP files together with muxInfo and colors, written by
+a2p_importcache.writeEntry(). The GUI thread only assigns them.
+
+Parts which can not be regenerated by a worker are imported serially
+by updateImportedParts() as before.
+"""
+
+import json
+import multiprocessing
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+import traceback
+
+import FreeCAD
+
+import a2plib
+import a2p_importcache
+
+JOB_ENVIRONMENT = "A2P_UPDATE_JOB"  # job file of a worker process
+WORKER_MIN_TASKS = 2  # a single part is imported faster without worker
+WORKER_TIMEOUT = 600.0  # seconds
+WORKER_POLL_INTERVAL = 0.05  # seconds
+
+# preferences which change the result of an import, passed to the workers
+WORKER_PREFERENCES = {
+    "useTopoNaming": a2plib.getUseTopoNaming,
+    "useSolidUnion": a2plib.getUseSolidUnion,
+    "doNotImportInvisibleShapes": a2plib.doNotImportInvisibleShapes,
+    "recalculateImportedParts": a2plib.getRecalculateImportedParts,
+}
+
+
+# ------------------------------------------------------------------------------
+def findFreeCADCmd():
+    """the console executable of this FreeCAD installation or None"""
+    names = ("FreeCADCmd", "freecadcmd", "FreeCADCmd.exe")
+    binDir = os.path.join(FreeCAD.getHomePath(), "bin")
+    for name in names:
+        path = os.path.join(binDir, name)
+        if os.path.isfile(path):
+            return path
+    if hasattr(shutil, "which"):  # Python3
+        for name in names:
+            path = shutil.which(name)
+            if path is not None:
+                return path
+    return None
+
+
+def isEnabled():
+    return a2plib.getUseParallelUpdate() and findFreeCADCmd() is not None
+
+
+def workerCount(taskCount):
+    count = a2plib.getUpdateWorkerCount()
+    if count <= 0:
+        count = multiprocessing.cpu_count()
+    return max(1, min(count, taskCount))
+
+
+# ------------------------------------------------------------------------------
+def regenerate(tasks):
+    """
+    tasks: dict cacheKey: (absPath, sourcePart). Returns a dict
+    cacheKey: a2p_importcache.ImportData of the tasks done by the
+    workers.
+    """
+    tasks = dict(
+        (key, (absPath, sourcePart))
+        for key, (absPath, sourcePart) in tasks.items()
+        if absPath.lower().endswith(".fcstd")
+        and not (
+            a2p_importcache.isUsable(absPath, False)
+            and a2p_importcache.contains(absPath, sourcePart)
+        )
+    )
+    if len(tasks) < WORKER_MIN_TASKS:
+        return {}
+    freecadCmd = findFreeCADCmd()
+    if freecadCmd is None:
+        return {}
+
+    startTime = time.time()
+    workDirectory = tempfile.mkdtemp(prefix="a2p_update")
+    try:
+        keys = {}  # entry name: cacheKey
+        jobs = [[] for i in range(workerCount(len(tasks)))]
+        for i, key in enumerate(sorted(tasks.keys())):
+            absPath, sourcePart = tasks[key]
+            name = "part{}".format(i)
+            keys[name] = key
+            jobs[i % len(jobs)].append(
+                {"name": name, "file": absPath, "sourcePart": sourcePart}
+            )
+        preferences = dict(
+            (name, getter()) for name, getter in WORKER_PREFERENCES.items()
+        )
+        workers = [
+            startWorker(freecadCmd, workDirectory, i, job, preferences)
+            for i, job in enumerate(jobs)
+        ]
+        waitForWorkers(workers)
+
+        results = {}
+        for name, key in keys.items():
+            entry = os.path.join(workDirectory, name)
+            if not os.path.exists(os.path.join(entry, a2p_importcache.INFO_FILE)):
+                continue  # imported serially by updateImportedParts()
+            try:
+                results[key] = a2p_importcache.readEntry(entry)
+            except Exception as e:
+                FreeCAD.Console.PrintWarning(
+                    "A2plus: unreadable result of {}: {}\n".format(tasks[key][0], e)
+                )
+        failed = len(tasks) - len(results)
+        a2plib.Msg(
+            "Regenerated {} parts in {} worker processes in {:.2f}s\n".format(
+                len(results), len(workers), time.time() - startTime
+            )
+        )
+        if failed > 0:
+            for process, logPath in workers:
+                with open(logPath, "r") as f:
+                    FreeCAD.Console.PrintWarning(f.read())
+            FreeCAD.Console.PrintWarning(
+                "A2plus: {} parts are imported without worker\n".format(failed)
+            )
+        return results
+    finally:
+        shutil.rmtree(workDirectory, ignore_errors=True)
+
+
+def startWorker(freecadCmd, workDirectory, index, tasks, preferences):
+    """returns (process, path of its log file)"""
+    jobPath = os.path.join(workDirectory, "job{}.json".format(index))
+    with open(jobPath, "w") as f:
+        json.dump(
+            {
+                "outputDirectory": workDirectory,
+                "preferences": preferences,
+                "tasks": tasks,
+            },
+            f,
+        )
+    logPath = os.path.join(workDirectory, "worker{}.log".format(index))
+    environment = dict(os.environ)
+    environment[JOB_ENVIRONMENT] = jobPath
+    with open(logPath, "w") as log:
+        process = subprocess.Popen(
+            [
+                freecadCmd,
+                # a private configuration, the user's one is not touched
+                "--user-cfg",
+                os.path.join(workDirectory, "user{}.cfg".format(index)),
+                os.path.splitext(os.path.abspath(__file__))[0] + ".py",
+            ],
+            env=environment,
+            stdout=log,
+            stderr=subprocess.STDOUT,
+        )
+    return process, logPath
+
+
+def waitForWorkers(workers):
+    """wait for all workers, the GUI keeps responding meanwhile"""
+    deadline = time.time() + WORKER_TIMEOUT
+    running = [process for process, logPath in workers]
+    while len(running) > 0:
+        running = [process for process in running if process.poll() is None]
+        if time.time() > deadline:
+            for process in running:
+                process.kill()
+            FreeCAD.Console.PrintWarning(
+                "A2plus: update worker processes did not finish in time\n"
+            )
+            break
+        if FreeCAD.GuiUp:
+            from PySide import QtGui
+
+            QtGui.QApplication.processEvents()
+        time.sleep(WORKER_POLL_INTERVAL)
+
+
+# ------------------------------------------------------------------------------
+def runWorker(jobPath):
+    """regenerate the parts of a job file, runs within FreeCADCmd"""
+    with open(jobPath, "r") as f:
+        job = json.load(f)
+    preferences = FreeCAD.ParamGet("User parameter:BaseApp/Preferences/Mod/A2plus")
+    for name, value in job["preferences"].items():
+        preferences.SetBool(name, value)
+
+    import FreeCADGui
+
+    FreeCADGui.setupWithoutGUI()  # view providers for colors and visibility
+    import a2p_importpart
+
+    for task in job["tasks"]:
+        importDoc = None
+        try:
+            importDoc = FreeCAD.openDocument(task["file"])
+            dc = a2p_importpart.DataContainer()
+            dc.tx = task["sourcePart"]
+            data = a2p_importpart.importDataFromDocument(
+                importDoc, dc.tx is not None, dc, interactive=False
+            )
+            if data is not None:
+                a2p_importcache.writeEntry(job["outputDirectory"], task["name"], data)
+        except Exception:
+            print("Regeneration of {} failed:".format(task["file"]))
+            traceback.print_exc(file=sys.stdout)
+        finally:
+            if importDoc is not None:
+                FreeCAD.closeDocument(importDoc.Name)
+
+
+if __name__ == "__main__" and JOB_ENVIRONMENT in os.environ:
+    try:
+        runWorker(os.environ[JOB_ENVIRONMENT])
+    finally:
+        sys.stdout.flush()
+        os._exit(0)  # do not enter FreeCADCmd's console
@@ -289,6 +289,98 @@ def getUseSolidUnion():
     return preferences.GetBool("useSolidUnion", False)
 
 
+# ------------------------------------------------------------------------------
+def getUseVectorizedSolver():
+    preferences = FreeCAD.ParamGet("User parameter:BaseApp/Preferences/Mod/A2plus")
+    return preferences.GetBool("useVectorizedSolver", False)
+
+
+# ------------------------------------------------------------------------------
+def getUseSolverProcessPool():
+    preferences = FreeCAD.ParamGet("User parameter:BaseApp/Preferences/Mod/A2plus")
+    return preferences.GetBool("useSolverProcessPool", False)
+
+
+# ------------------------------------------------------------------------------
+def getKeepSolverSystemLoaded():
+    preferences = FreeCAD.ParamGet("User parameter:BaseApp/Preferences/Mod/A2plus")
+    return preferences.GetBool("keepSolverSystemLoaded", False)
+
+
+# ------------------------------------------------------------------------------
+def getUseSolverSession():
+    preferences = FreeCAD.ParamGet("User parameter:BaseApp/Preferences/Mod/A2plus")
+    return preferences.GetBool("useSolverSession", False)
+
+
+# ------------------------------------------------------------------------------
+def getSolverBackend():
+    preferences = FreeCAD.ParamGet("User parameter:BaseApp/Preferences/Mod/A2plus")
+    return preferences.GetString("solverBackend", "attraction")
+
+
+# ------------------------------------------------------------------------------
+def getUseAcceleratedSolver():
+    preferences = FreeCAD.ParamGet("User parameter:BaseApp/Preferences/Mod/A2plus")
+    return preferences.GetBool("useAcceleratedSolver", False)
+
+
+# ------------------------------------------------------------------------------
+def getUseSolverThread():
+    preferences = FreeCAD.ParamGet("User parameter:BaseApp/Preferences/Mod/A2plus")
+    return preferences.GetBool("useSolverThread", False)
+
+
+# ------------------------------------------------------------------------------
+def getUseGeometryCache():
+    preferences = FreeCAD.ParamGet("User parameter:BaseApp/Preferences/Mod/A2plus")
+    return preferences.GetBool("useGeometryCache", False)
+
+
+# ------------------------------------------------------------------------------
+def getUseAnalyticDOF():
+    preferences = FreeCAD.ParamGet("User parameter:BaseApp/Preferences/Mod/A2plus")
+    return preferences.GetBool("useAnalyticDOF", False)
+
+
+# ------------------------------------------------------------------------------
+def getUseSnapSolver():
+    preferences = FreeCAD.ParamGet("User parameter:BaseApp/Preferences/Mod/A2plus")
+    return preferences.GetBool("useSnapSolver", False)
+
+
+# ------------------------------------------------------------------------------
+def getUseRigidClusters():
+    preferences = FreeCAD.ParamGet("User parameter:BaseApp/Preferences/Mod/A2plus")
+    return preferences.GetBool("useRigidClusters", False)
+
+
+# ------------------------------------------------------------------------------
+def getUseImportCache():
+    preferences = FreeCAD.ParamGet("User parameter:BaseApp/Preferences/Mod/A2plus")
+    return preferences.GetBool("useImportCache", False)
+
+
+# ------------------------------------------------------------------------------
+def getImportCacheSize():
+    """size limit of the import cache in MB"""
+    preferences = FreeCAD.ParamGet("User parameter:BaseApp/Preferences/Mod/A2plus")
+    return preferences.GetInt("importCacheSize", 500)
+
+
+# ------------------------------------------------------------------------------
+def getUseParallelUpdate():
+    preferences = FreeCAD.ParamGet("User parameter:BaseApp/Preferences/Mod/A2plus")
+    return preferences.GetBool("useParallelUpdate", False)
+
+
+# ------------------------------------------------------------------------------
+def getUpdateWorkerCount():
+    """number of worker processes of updateImportedParts, 0: one per CPU"""
+    preferences = FreeCAD.ParamGet("User parameter:BaseApp/Preferences/Mod/A2plus")
+    return preferences.GetInt("updateWorkerCount", 0)
+
+
 # ------------------------------------------------------------------------------
 def getConstraintEditorRef():
     global CONSTRAINT_EDITOR__REF
@@ -495,92 +587,131 @@ def numpyVecToFC(nv):
 
 
 # ------------------------------------------------------------------------------
-def fit_rotation_axis_to_surface1(surface, n_u=3, n_v=3):
-    "should work for cylinders and possibly cones (depending on the u,v mapping)"
-    uv = sum(
-        [
-            [(u, v) for u in numpy.linspace(0, 1, n_u)]
-            for v in numpy.linspace(0, 1, n_v)
-        ],
-        [],
-    )
-    P = [numpy.array(surface.value(u, v)) for u, v in uv]  # positions at u,v points
-    N = [numpy.cross(*surface.tangent(u, v)) for u, v in uv]
-    intersections = []
-    for i in range(len(N) - 1):
-        for j in range(i + 1, len(N)):
-            # based on the distance_between_axes( p1, u1, p2, u2) function,
-            if 1 - abs(numpy.dot(N[i], N[j])) < 10 ** -6:
-                continue  # ignore parallel case
-            p1_x, p1_y, p1_z = P[i]
-            u1_x, u1_y, u1_z = N[i]
-            p2_x, p2_y, p2_z = P[j]
-            u2_x, u2_y, u2_z = N[j]
-            t1_t1_coef = u1_x ** 2 + u1_y ** 2 + u1_z ** 2  # should equal 1
-            t1_t2_coef = (
-                -2 * u1_x * u2_x - 2 * u1_y * u2_y - 2 * u1_z * u2_z
-            )  # collect( expand(d_sqrd), [t1*t2] )
-            t2_t2_coef = u2_x ** 2 + u2_y ** 2 + u2_z ** 2  # should equal 1 too
-            t1_coef = (
-                2 * p1_x * u1_x
-                + 2 * p1_y * u1_y
-                + 2 * p1_z * u1_z
-                - 2 * p2_x * u1_x
-                - 2 * p2_y * u1_y
-                - 2 * p2_z * u1_z
-            )
-            t2_coef = (
-                -2 * p1_x * u2_x
-                - 2 * p1_y * u2_y
-                - 2 * p1_z * u2_z
-                + 2 * p2_x * u2_x
-                + 2 * p2_y * u2_y
-                + 2 * p2_z * u2_z
-            )
-            A = numpy.array(
-                [[2 * t1_t1_coef, t1_t2_coef], [t1_t2_coef, 2 * t2_t2_coef]]
-            )
-            b = numpy.array([t1_coef, t2_coef])
-            try:
-                t1, t2 = numpy.linalg.solve(A, -b)
-            except numpy.linalg.LinAlgError:
-                continue  # print('distance_between_axes, failed to solve problem due to LinAlgError, using numerical solver instead')
-            pos_t1 = P[i] + numpy.array(N[i]) * t1
-            pos_t2 = P[j] + N[j] * t2
-            intersections.append(pos_t1)
-            intersections.append(pos_t2)
-    if len(intersections) < 2:
+def sample_surface(surface, n_u=3, n_v=3):
+    "positions and normals (cross product of the tangents) at n_u x n_v points"
+    P = []
+    N = []
+    for v in numpy.linspace(0, 1, n_v):
+        for u in numpy.linspace(0, 1, n_u):
+            P.append(tuple(surface.value(u, v)))
+            N.append(numpy.cross(*surface.tangent(u, v)))
+    return numpy.array(P, dtype=float), numpy.array(N, dtype=float)
+
+
+# ------------------------------------------------------------------------------
+def fit_rotation_axis_to_samples(P, N):
+    """
+    For all pairs of sampled normals the points of closest approach of
+    both normal lines are calculated at once (least squares of
+    distance_between_axes). The axis is fitted to these points.
+    """
+    i, j = numpy.triu_indices(len(N), 1)
+    dots = numpy.einsum("ij,ij->i", N[i], N[j])
+    notParallel = 1 - numpy.abs(dots) >= 10 ** -6  # ignore parallel case
+    i = i[notParallel]
+    j = j[notParallel]
+    u1 = N[i]
+    u2 = N[j]
+    d = P[i] - P[j]
+    # A = [[2*t1_t1_coef, t1_t2_coef], [t1_t2_coef, 2*t2_t2_coef]], A*(t1,t2) = -b
+    a00 = 2 * numpy.einsum("ij,ij->i", u1, u1)
+    a01 = -2 * dots[notParallel]
+    a11 = 2 * numpy.einsum("ij,ij->i", u2, u2)
+    r0 = -2 * numpy.einsum("ij,ij->i", d, u1)
+    r1 = 2 * numpy.einsum("ij,ij->i", d, u2)
+    det = a00 * a11 - a01 * a01
+    solvable = det != 0.0
+    if not numpy.all(solvable):
+        a00, a01, a11 = a00[solvable], a01[solvable], a11[solvable]
+        r0, r1, det = r0[solvable], r1[solvable], det[solvable]
+        i, j, u1, u2 = i[solvable], j[solvable], u1[solvable], u2[solvable]
+    t1 = (r0 * a11 - a01 * r1) / det
+    t2 = (a00 * r1 - a01 * r0) / det
+    if len(t1) == 0:
         error = numpy.inf
         return None, None, error
-    else:  # fit vector to intersection points; http://mathforum.org/library/drmath/view/69103.html
-        X = numpy.array(intersections)
-        centroid = numpy.mean(X, axis=0)
-        M = numpy.array([i - centroid for i in intersections])
-        A = numpy.dot(M.transpose(), M)
-        U, s, V = numpy.linalg.svd(
-            A
-        )  # numpy docs: s : (..., K) The singular values for every matrix, sorted in descending order.
-        axis_pos = centroid
-        axis_dir = V[0]
-        error = s[1]  # dont know if this will work
-        return numpyVecToFC(axis_dir), numpyVecToFC(axis_pos), error
+    # fit vector to intersection points; http://mathforum.org/library/drmath/view/69103.html
+    X = numpy.empty((2 * len(t1), 3))
+    X[0::2] = P[i] + u1 * t1[:, numpy.newaxis]
+    X[1::2] = P[j] + u2 * t2[:, numpy.newaxis]
+    centroid = numpy.mean(X, axis=0)
+    M = X - centroid
+    A = numpy.dot(M.transpose(), M)
+    U, s, V = numpy.linalg.svd(
+        A
+    )  # numpy docs: s : (..., K) The singular values for every matrix, sorted in descending order.
+    axis_pos = centroid
+    axis_dir = V[0]
+    error = s[1]  # dont know if this will work
+    return numpyVecToFC(axis_dir), numpyVecToFC(axis_pos), error
+
+
+# ------------------------------------------------------------------------------
+def fit_plane_to_samples(P, N):
+    plane_norm = numpy.mean(N, axis=0)  # planes normal, averaging done to reduce error
+    plane_pos = P[0]
+    error = numpy.sum(numpy.abs(numpy.dot(P - plane_pos, plane_norm)))
+    return numpyVecToFC(plane_norm), numpyVecToFC(plane_pos), error
+
+
+# ------------------------------------------------------------------------------
+def fit_rotation_axis_to_surface1(surface, n_u=3, n_v=3):
+    "should work for cylinders and possibly cones (depending on the u,v mapping)"
+    P, N = sample_surface(surface, n_u, n_v)
+    return fit_rotation_axis_to_samples(P, N)
 
 
 # ------------------------------------------------------------------------------
 def fit_plane_to_surface1(surface, n_u=3, n_v=3):
-    uv = sum(
-        [
-            [(u, v) for u in numpy.linspace(0, 1, n_u)]
-            for v in numpy.linspace(0, 1, n_v)
-        ],
-        [],
-    )
-    P = [surface.value(u, v) for u, v in uv]  # positions at u,v points
-    N = [numpy.cross(*surface.tangent(u, v)) for u, v in uv]
-    plane_norm = sum(N) / len(N)  # planes normal, averaging done to reduce error
-    plane_pos = P[0]
-    error = sum([abs(numpy.dot(p - plane_pos, plane_norm)) for p in P])
-    return numpyVecToFC(plane_norm), numpyVecToFC(plane_pos), error
+    P, N = sample_surface(surface, n_u, n_v)
+    return fit_plane_to_samples(P, N)
+
+
+# ------------------------------------------------------------------------------
+class SurfaceFit:
+    """
+    plane and rotation axis fitted to the same samples of a face.
+    Returns copies, the callers modify the vectors.
+    """
+
+    def __init__(self, surface):
+        P, N = sample_surface(surface)
+        self.plane = fit_plane_to_samples(P, N)
+        self.rotationAxis = fit_rotation_axis_to_samples(P, N)
+
+    def getPlane(self):
+        normal, pos, error = self.plane
+        return Base.Vector(normal), Base.Vector(pos), error
+
+    def getRotationAxis(self):
+        axis, center, error = self.rotationAxis
+        if axis is None:
+            return None, None, error
+        return Base.Vector(axis), Base.Vector(center), error
+
+
+SURFACE_FIT_CACHE_SIZE = 4096
+surfaceFitCache = {}  # face.hashCode() -> (face, SurfaceFit)
+
+
+def fit_face(face):
+    """
+    memoized SurfaceFit of a face. The hashCode of a face changes with
+    its shape, so each version of a surface is analyzed once. The face is
+    kept in the cache, so its hashCode cannot be reused by another shape.
+    """
+    key = face.hashCode()
+    entry = surfaceFitCache.get(key, None)
+    if entry is None:
+        if len(surfaceFitCache) >= SURFACE_FIT_CACHE_SIZE:
+            surfaceFitCache.clear()
+        entry = (face, SurfaceFit(face.Surface))
+        surfaceFitCache[key] = entry
+    return entry[1]
+
+
+def clear_surface_fit_cache():
+    surfaceFitCache.clear()
 
 
 # ------------------------------------------------------------------------------
@@ -964,7 +1095,7 @@ def AxisOfPlaneSelected(
             if str(face.Surface) == "<Plane object>":
                 return True
             else:
-                axis, center, error = fit_rotation_axis_to_surface1(face.Surface)
+                axis, center, error = fit_face(face).getRotationAxis()
                 error_normalized = error / face.BoundBox.DiagonalLength
                 if error_normalized < 10 ** -6:
                     return True
@@ -998,7 +1129,7 @@ def planeSelected(selection):
             if str(face.Surface) == "<Plane object>":
                 return True
             elif str(face.Surface) == "<BSplineSurface object>":
-                normal, pos, error = fit_plane_to_surface1(face.Surface)
+                normal, pos, error = fit_face(face).getPlane()
                 if abs(error) < 1e-9:
                     return True
     return False
@@ -1022,7 +1153,7 @@ def cylindricalFaceSelected(selection):
             elif str(face.Surface).startswith("<SurfaceOfRevolution"):
                 return True
             else:
-                axis, center, error = fit_rotation_axis_to_surface1(face.Surface)
+                axis, center, error = fit_face(face).getRotationAxis()
                 error_normalized = error / face.BoundBox.DiagonalLength
                 if error_normalized < 10 ** -6:
                     return True
@@ -1096,11 +1227,12 @@ def getPos(obj, subElementName):
         elif str(surface).startswith("<SurfaceOfRevolution"):
             pos = getObjectFaceFromName(obj, subElementName).Edges[0].Curve.Center
         elif str(surface).startswith("<BSplineSurface"):
-            axis, pos1, error = fit_plane_to_surface1(surface)
+            fit = fit_face(face)
+            axis, pos1, error = fit.getPlane()
             error_normalized = error / face.BoundBox.DiagonalLength
             if error_normalized < 10 ** -6:  # then good plane fit
                 pos = pos1
-            axis, center, error = fit_rotation_axis_to_surface1(face.Surface)
+            axis, center, error = fit.getRotationAxis()
             if axis != None:
                 error_normalized = error / face.BoundBox.DiagonalLength
                 if error_normalized < 10 ** -6:  # then good rotation_axis fix
@@ -1136,12 +1268,16 @@ def getPos(obj, subElementName):
 
 
 # ------------------------------------------------------------------------------
-def getPlaneNormal(surface):
+def getPlaneNormal(surface, face=None):
+    "pass the face of the surface to share the fit of BSpline surfaces"
     axis = None
     if hasattr(surface, "Axis"):
         axis = surface.Axis
     elif str(surface).startswith("<BSplineSurface"):
-        axis, pos, error = fit_plane_to_surface1(surface)
+        if face is not None:
+            axis, pos, error = fit_face(face).getPlane()
+        else:
+            axis, pos, error = fit_plane_to_surface1(surface)
     return axis  # may be none!
 
 
@@ -1156,11 +1292,12 @@ def getAxis(obj, subElementName):
         elif str(surface).startswith("<SurfaceOfRevolution"):
             axis = face.Edges[0].Curve.Axis
         elif str(surface).startswith("<BSplineSurface"):
-            axis1, pos, error = fit_plane_to_surface1(surface)
+            fit = fit_face(face)
+            axis1, pos, error = fit.getPlane()
             error_normalized = error / face.BoundBox.DiagonalLength
             if error_normalized < 10 ** -6:  # then good plane fit
                 axis = axis1
-            axis_fitted, center, error = fit_rotation_axis_to_surface1(face.Surface)
+            axis_fitted, center, error = fit.getRotationAxis()
             if axis_fitted is not None:
                 error_normalized = error / face.BoundBox.DiagonalLength
                 if error_normalized < 10 ** -6:  # then good rotation_axis fix